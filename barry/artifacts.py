@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import inspect
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+
+from barry.config import get_config
+
+
+def get_hash(config):
+    """ Returns a short, stable hash of a configuration dictionary.
+
+    Floats are serialised with full precision, so unlike the old truncated integer filenames,
+    two configurations only share a hash if they are actually identical.
+
+    Parameters
+    ----------
+    config : dict
+        A JSON serialisable dictionary describing everything that determines an artifacts contents.
+
+    Returns
+    -------
+    key : str
+        The hex digest used to address the artifact.
+    """
+    serialised = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialised.encode("utf-8")).hexdigest()[:24]
+
+
+@contextmanager
+def _file_lock(lock_path):
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ArtifactStore(object):
+    """ A content-addressed store of generated files, such as CAMB grids and model pregen data.
+
+    Each artifact is keyed on a hash of its full configuration, and a manifest in the store directory
+    records that configuration, when the artifact was created, and which other artifacts it was made
+    from. This lets us detect artifacts that are missing, stale (a dependency has been regenerated since)
+    or colliding (the manifest holds a different configuration under the same key).
+    """
+
+    MISSING = "missing"
+    STALE = "stale"
+    VALID = "valid"
+
+    def __init__(self, root):
+        self.logger = logging.getLogger("barry")
+        self.root = os.path.abspath(root)
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        self.lock_path = os.path.join(self.root, "manifest.lock")
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_path(self, key, prefix, extension):
+        """ Returns the location of an artifact in the store """
+        return os.path.join(self.root, f"{prefix}_{key}{extension}")
+
+    def _lock(self):
+        return _file_lock(self.lock_path)
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        tmp = self.manifest_path + f".{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def register(self, key, filename, config, dependencies=()):
+        """ Records a freshly generated artifact in the manifest.
+
+        Parameters
+        ----------
+        key : str
+            The artifact key, from `get_hash(config)`
+        filename : str
+            Where the artifact was written
+        config : dict
+            The configuration the artifact was generated from
+        dependencies : list[str], optional
+            The keys of the artifacts this one was generated from
+        """
+        with self._lock():
+            manifest = self.load_manifest()
+            missing = [d for d in dependencies if d not in manifest]
+            assert not missing, f"Cannot register {key}, its dependencies {missing} are not in the manifest"
+            manifest[key] = {
+                "filename": os.path.basename(filename),
+                "config": json.loads(json.dumps(config, default=str)),
+                "created": time.time(),
+                "dependencies": {d: manifest[d]["created"] for d in dependencies},
+            }
+            self._save_manifest(manifest)
+        self.logger.debug(f"Registered artifact {key} at {filename}")
+
+    def get_status(self, key, config):
+        """ Determines whether the artifact for a configuration is missing, stale or valid.
+
+        Raises
+        ------
+        ValueError
+            If the manifest has a different configuration recorded under this key.
+        """
+        manifest = self.load_manifest()
+        entry = manifest.get(key)
+        if entry is None or not os.path.exists(os.path.join(self.root, entry["filename"])):
+            return self.MISSING
+        if entry["config"] != json.loads(json.dumps(config, default=str)):
+            raise ValueError(f"Artifact {key} collides with a different configuration: {entry['config']} vs {config}")
+        for dependency, created in entry["dependencies"].items():
+            dep = manifest.get(dependency)
+            if dep is None or dep["created"] != created:
+                self.logger.warning(f"Artifact {key} is stale, as dependency {dependency} has changed since it was made")
+                return self.STALE
+        return self.VALID
+
+
+@lru_cache(maxsize=4)
+def get_artifact_store(root=None):
+    """ Returns the store for generated files, by default the `barry/generated` directory """
+    if root is None:
+        root = os.path.normpath(os.path.dirname(inspect.stack()[0][1]) + "/generated/")
+    return ArtifactStore(root)
+
+
+def get_cache_root():
+    """ Returns the node-local cache directory from `config.yml`, with environment variables expanded, or None if not set """
+    cache_root = get_config().get("cache_root")
+    if not cache_root:
+        return None
+    cache_root = os.path.expandvars(cache_root)
+    if "$" in cache_root:
+        logging.getLogger("barry").warning(f"Could not expand all variables in cache root {cache_root}, not staging files")
+        return None
+    return cache_root
+
+
+def stage_file(path, cache_root=None):
+    """ Returns a node-local copy of a (shared filesystem) file to read from.
+
+    The first process on a node to ask for a file copies (or hard links, if possible) it into the cache root,
+    whilst holding a lock so that every other process on the node waits and then reuses that copy. If the original
+    changes size or modification time, it is staged again. If no cache root is configured, the original path is returned.
+
+    Parameters
+    ----------
+    path : str
+        The file to read
+    cache_root : str, optional
+        The node-local directory to stage into. Defaults to `cache_root` in `config.yml`.
+
+    Returns
+    -------
+    path : str
+        The location to read the file from
+    """
+    if cache_root is None:
+        cache_root = get_cache_root()
+    if cache_root is None or not os.path.exists(path):
+        return path
+
+    path = os.path.abspath(path)
+    directory = os.path.join(cache_root, hashlib.sha256(os.path.dirname(path).encode("utf-8")).hexdigest()[:12])
+    os.makedirs(directory, exist_ok=True)
+    staged = os.path.join(directory, os.path.basename(path))
+
+    source = os.stat(path)
+    with _file_lock(staged + ".lock"):
+        if os.path.exists(staged):
+            existing = os.stat(staged)
+            if existing.st_size == source.st_size and existing.st_mtime == source.st_mtime:
+                return staged
+        tmp = staged + f".{os.getpid()}.tmp"
+        try:
+            os.link(path, tmp)
+        except OSError:
+            shutil.copy2(path, tmp)
+        os.replace(tmp, staged)
+        logging.getLogger("barry").info(f"Staged {path} to {staged}")
+    return staged
@@ -0,0 +1,87 @@
+import logging
+
+import numpy as np
+
+
+class MockCampaign(object):
+    """ Evaluates the posterior of one model for many realisations of a dataset at once.
+
+    The model prediction only depends on the parameters, and on the parts of the data every realisation shares
+    (like the binning, window function and covariance), so it is computed once per parameter point rather than
+    once per realisation. Each data vector is whitened with the Cholesky factor of the inverse covariance up front,
+    so the chi2 of every realisation at every point in a batch comes from a single matrix product against the
+    stacked data, rather than a loop over realisations.
+
+    Requires the model to implement `get_data_vector` and `get_model_vector`, and the likelihood to be the
+    (corrected) chi2 between them, as for the power spectrum and correlation function models.
+    """
+
+    def __init__(self, model, data):
+        """
+
+        Parameters
+        ----------
+        model : `barry.models.Model`
+            The model to fit
+        data : list[list[dict]]
+            The output of the datasets `get_data` for each realisation
+        """
+        self.logger = logging.getLogger("barry")
+        self.model = model
+        self.data = data
+        first = data[0]
+        for realisation in data[1:]:
+            assert len(realisation) == len(first), "Every realisation needs the same number of data entries"
+            for d, f in zip(realisation, first):
+                if d["icov"] is not f["icov"] and not np.array_equal(d["icov"], f["icov"]):
+                    raise ValueError(f"Realisations of {f['name']} have different covariances, so cannot be fit as one campaign")
+        model.set_data(first)
+
+        # For each data entry, the Cholesky factor L of the inverse covariance, the whitened data of every
+        # realisation, and their squared norms, so that chi2 = |dL|^2 - 2 (dL).(mL) + |mL|^2
+        self.whitened = []
+        for i, d in enumerate(first):
+            cholesky = np.linalg.cholesky(d["icov"])
+            white = np.array([model.get_data_vector(r[i]) for r in data], dtype=np.float64) @ cholesky
+            self.whitened.append((cholesky, white, np.sum(white ** 2, axis=1)))
+        self.logger.info(f"Set up a campaign over {len(data)} realisations with {len(first)} data entries each")
+
+    def get_num_realisations(self):
+        return len(self.data)
+
+    def get_chi2_batch(self, params):
+        """ Returns the chi2 of each data entry, at each point and for each realisation.
+
+        Parameters
+        ----------
+        params : np.ndarray
+            The active parameters of each point, of shape `(num_points, num_dim)`
+
+        Returns
+        -------
+        chi2 : list[np.ndarray]
+            For each data entry, an array of shape `(num_points, num_realisations)`
+        """
+        param_dicts = [self.model.get_param_dict(p) for p in params]
+        chi2s = []
+        for d, (cholesky, white, norms) in zip(self.model.data, self.whitened):
+            models = np.array([self.model.get_model_vector(p, d) for p in param_dicts], dtype=np.float64).reshape((len(param_dicts), -1)) @ cholesky
+            chi2 = np.sum(models ** 2, axis=1)[:, None] - 2 * models @ white.T + norms[None, :]
+            # Expanding the square can leave tiny negative values from rounding
+            chi2s.append(np.maximum(chi2, 0))
+        return chi2s
+
+    def get_posterior_batch(self, params):
+        """ Returns the log posterior at each point for each realisation, of shape `(num_points, num_realisations)` """
+        params = np.atleast_2d(params)
+        priors = np.array([self.model.get_prior(self.model.get_param_dict(p)) for p in params], dtype=np.float64)
+        posteriors = np.full((params.shape[0], self.get_num_realisations()), -np.inf)
+        inside = np.isfinite(priors)
+        if not inside.any():
+            return posteriors
+        num_params = len(self.model.get_active_params())
+        log_likelihood = 0
+        for d, chi2 in zip(self.model.data, self.get_chi2_batch(params[inside])):
+            log_likelihood = log_likelihood + self.model.get_corrected_likelihood(chi2, d["icov"].shape[0], num_mocks=d.get("num_mocks"), num_params=num_params)
+        posteriors[inside] = priors[inside, None] + log_likelihood
+        return posteriors
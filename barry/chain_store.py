@@ -0,0 +1,218 @@
+import os
+import json
+import logging
+
+import numpy as np
+
+from barry.artifacts import _file_lock
+
+QUANTILES = [0.025, 0.16, 0.5, 0.84, 0.975]
+
+
+def get_weighted_quantiles(values, weights, quantiles):
+    """ Returns the weighted quantiles of a set of samples """
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    cumulative = (cumulative - 0.5 * weights[order]) / cumulative[-1]
+    return np.interp(quantiles, cumulative, values[order])
+
+
+def get_summary(data, columns, wall_time=None):
+    """ Summarises the chain of a fit, so that common statistics are available without loading it.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        The results array from a fit, with the log posterior, weight and evidence followed by each parameter
+    columns : list[str]
+        The name of each column in `data`
+    wall_time : float, optional
+        How many seconds the fit took
+
+    Returns
+    -------
+    summary : dict
+        The weighted mean, standard deviation, quantiles and best fit value of each parameter, along with the
+        maximum log posterior, the log evidence (NaN for samplers that do not compute it), the sum of weights,
+        and the Kish effective sample size of the weights (which does not account for autocorrelation).
+    """
+    data = np.asarray(data, dtype=np.float64)
+    posterior, weights, evidence = data[:, 0], data[:, 1], data[:, 2]
+    best = np.argmax(posterior)
+    params = {}
+    for name, values in zip(columns[3:], data[:, 3:].T):
+        mean = np.average(values, weights=weights)
+        params[name] = {
+            "mean": mean,
+            "std": np.sqrt(np.average((values - mean) ** 2, weights=weights)),
+            "quantiles": list(get_weighted_quantiles(values, weights, QUANTILES)),
+            "best": values[best],
+        }
+    return {
+        "max_posterior": posterior[best],
+        "logz": np.nanmax(evidence) if np.any(np.isfinite(evidence)) else np.nan,
+        "weight_sum": weights.sum(),
+        "ess": weights.sum() ** 2 / (weights ** 2).sum(),
+        "num_samples": data.shape[0],
+        "wall_time": wall_time,
+        "params": params,
+    }
+
+
+def _trim_partial_line(path):
+    """ Truncates a file of lines to its last complete, newline terminated, line.
+
+    A crash part way through an append can leave a partial line at the end, which the next append would be written
+    straight after, corrupting that line too.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        end = f.read().rfind(b"\n") + 1
+        f.truncate(end)
+    logging.getLogger("barry").warning(f"Truncated a partially written line at the end of {path}")
+
+
+def _to_json(x):
+    if isinstance(x, np.generic):
+        return x.item()
+    return str(x)
+
+
+class ChainStore(object):
+    """ A consolidated store of the chains from many fits.
+
+    Instead of one file per fit, chains are appended to a small number of shard files, and an append only
+    index records where each chain lives, along with its model index, walker index, column names and any
+    extra metadata. Many processes can write to the same store at once, as appends are done under a lock.
+
+    Reading the index is cheap, and chains are memory mapped, so fits can be selected or iterated over
+    without reading every chain into memory.
+    """
+
+    def __init__(self, directory, num_shards=16, dtype=np.float64):
+        """
+
+        Parameters
+        ----------
+        directory : str
+            The directory to keep the shards and index in
+        num_shards : int, optional
+            How many files to spread the chains over, which limits lock contention between writers
+        dtype : np.dtype, optional
+            The type chains are stored as. Defaults to float64, so no precision is lost. Passing float32 halves
+            the size of the store, at the cost of rounding the posteriors, weights and parameters.
+        """
+        self.logger = logging.getLogger("barry")
+        self.directory = directory
+        self.num_shards = num_shards
+        self.dtype = np.dtype(dtype)
+        self.index_path = os.path.join(directory, "index.jsonl")
+        os.makedirs(directory, exist_ok=True)
+        with _file_lock(self.index_path + ".lock"):
+            _trim_partial_line(self.index_path)
+
+    def _get_shard_path(self, shard):
+        return os.path.join(self.directory, f"shard_{shard}.bin")
+
+    def write(self, model_index, walker_index, data, columns, extra=None, summary=None):
+        """ Appends the chain from a fit to the store.
+
+        If the same fit is written twice, the latest write is used.
+
+        Parameters
+        ----------
+        model_index : int
+            The index of the model-dataset pair
+        walker_index : int
+            The index of the walker
+        data : np.ndarray
+            A 2D array of shape `(num_samples, len(columns))`
+        columns : list[str]
+            The name of each column
+        extra : dict, optional
+            Any (JSON serialisable) metadata to keep with the chain
+        summary : dict, optional
+            A summary of the chain, from `get_summary`
+        """
+        data = np.ascontiguousarray(data, dtype=self.dtype)
+        assert data.ndim == 2 and data.shape[1] == len(columns), f"Data of shape {data.shape} does not match columns {columns}"
+        os.makedirs(self.directory, exist_ok=True)
+        shard = (model_index + walker_index) % self.num_shards
+        shard_path = self._get_shard_path(shard)
+        with _file_lock(shard_path + ".lock"):
+            with open(shard_path, "ab") as f:
+                offset = f.tell()
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        # The chain is written before its index entry, so a crash can never leave an entry pointing at missing data
+        record = {
+            "model_index": model_index,
+            "walker_index": walker_index,
+            "shard": shard,
+            "offset": offset,
+            "shape": list(data.shape),
+            "dtype": data.dtype.str,
+            "columns": list(columns),
+            "extra": extra or {},
+            "summary": summary,
+        }
+        with _file_lock(self.index_path + ".lock"):
+            # Another writer may have died part way through its append since this store was opened
+            _trim_partial_line(self.index_path)
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(record, default=_to_json) + "\n")
+
+    def get_index(self):
+        """ Reads the index of the store.
+
+        Returns
+        -------
+        index : dict
+            Maps `(model_index, walker_index)` to the record for that fit
+        """
+        index = {}
+        if not os.path.exists(self.index_path):
+            return index
+        with open(self.index_path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    self.logger.warning(f"Skipping a partially written entry in {self.index_path}")
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    self.logger.warning(f"Skipping a partially written entry in {self.index_path}")
+                    continue
+                index[(record["model_index"], record["walker_index"])] = record
+        return index
+
+    def read(self, record):
+        """ Returns the (memory mapped) chain for an index record """
+        if record["shape"][0] == 0:
+            return np.zeros(record["shape"], dtype=record["dtype"])
+        path = self._get_shard_path(record["shard"])
+        return np.memmap(path, dtype=record["dtype"], mode="r", offset=record["offset"], shape=tuple(record["shape"]))
+
+    def iterate(self, model_indexes=None):
+        """ Lazily yields the record and chain of each fit, ordered by model and then walker index.
+
+        Parameters
+        ----------
+        model_indexes : list[int], optional
+            Only yield fits for these model-dataset pairs. Defaults to all of them.
+        """
+        index = self.get_index()
+        for key in sorted(index.keys()):
+            if model_indexes is not None and key[0] not in model_indexes:
+                continue
+            yield index[key], self.read(index[key])
@@ -3,8 +3,11 @@ from functools import lru_cache
 import numpy as np
 import inspect
 import os
+import shutil
 import logging
 
+from barry.artifacts import get_artifact_store, get_hash, stage_file
+
 
 # TODO: Add options for mnu, h0 default, omega_b, etc
 
@@ -50,6 +53,9 @@ class CambGenerator(object):
     Useful because computing them in a likelihood step is insanely slow.
     """
 
+    # Increment this whenever a change to _generate_data would change its output
+    version = 1
+
     def __init__(self, redshift=0.61, om_resolution=101, h0_resolution=1, h0=0.676, ob=0.04814, ns=0.97, recon_smoothing_scale=21.21):
         """ 
         Precomputes CAMB for efficiency. Access ks via self.ks, and use get_data for an array
@@ -61,10 +67,12 @@ class CambGenerator(object):
         self.h0 = h0
         self.redshift = redshift
 
-        self.data_dir = os.path.normpath(os.path.dirname(inspect.stack()[0][1]) + "/../generated/")
+        self.store = get_artifact_store()
+        self.data_dir = self.store.root
         hh = int(h0 * 10000)
-        self.filename_unique = f"{int(self.redshift * 1000)}_{self.om_resolution}_{self.h0_resolution}_{hh}_{int(ob * 10000)}_{int(ns * 1000)}"
-        self.filename = self.data_dir + f"/camb_{self.filename_unique}.npy"
+        # Generated files used to be named after this, rather than the hash of their configuration
+        self.legacy_name = f"{int(self.redshift * 1000)}_{self.om_resolution}_{self.h0_resolution}_{hh}_{int(ob * 10000)}_{int(ns * 1000)}"
+        self.legacy_filename = self.data_dir + f"/camb_{self.legacy_name}.npy"
 
         self.k_min = 1e-4
         self.k_max = 5
@@ -81,11 +89,43 @@ class CambGenerator(object):
         else:
             self.h0s = np.linspace(0.6, 0.8, self.h0_resolution)
 
+        # The smoothing scale is deliberately not included, as it does not change the CAMB output
+        self.config = {
+            "type": "camb",
+            "version": self.version,
+            "redshift": float(redshift),
+            "om_resolution": int(om_resolution),
+            "h0_resolution": int(h0_resolution),
+            "h0": float(h0),
+            "ob": float(ob),
+            "ns": float(ns),
+            "k_min": self.k_min,
+            "k_max": self.k_max,
+            "k_num": self.k_num,
+            "omch2s": [float(self.omch2s[0]), float(self.omch2s[-1])],
+            "h0s": [float(self.h0s[0]), float(self.h0s[-1])],
+        }
+        self.key = get_hash(self.config)
+        self.filename_unique = self.key
+        self.filename = self.store.get_path(self.key, "camb", ".npy")
+
         self.data = None
         self.logger.info(f"Creating CAMB data with {self.om_resolution} x {self.h0_resolution}")
 
+    def get_status(self):
+        """ Returns whether the CAMB data for this configuration is missing, stale or valid in the artifact store """
+        return self.store.get_status(self.key, self.config)
+
+    def adopt_legacy_data(self):
+        """ Registers CAMB data saved under the old style filename in the artifact store, if it is not there already """
+        if self.get_status() == self.store.MISSING and os.path.exists(self.legacy_filename):
+            self.logger.warning(f"Adopting CAMB data from the old style filename {self.legacy_filename}")
+            shutil.copyfile(self.legacy_filename, self.filename)
+            self.store.register(self.key, self.filename, self.config)
+
     def load_data(self, can_generate=False):
-        if not os.path.exists(self.filename):
+        self.adopt_legacy_data()
+        if self.get_status() == self.store.MISSING:
             if not can_generate:
                 msg = "Data does not exist and this isn't the time to generate it!"
                 self.logger.error(msg)
@@ -93,7 +133,7 @@ class CambGenerator(object):
             else:
                 self.data = self._generate_data()
         else:
-            self.data = np.load(self.filename)
+            self.data = np.load(stage_file(self.filename))
             self.logger.info("Loading existing CAMB data")
 
     @lru_cache(maxsize=512)
@@ -151,6 +191,7 @@ class CambGenerator(object):
                 data[i, j, 1 + self.k_num :] = pk_nonlin.flatten()
         self.logger.info(f"Saving to {self.filename}")
         np.save(self.filename, data)
+        self.store.register(self.key, self.filename, self.config)
         return data
 
     def interpolate(self, om, h0, data=None):
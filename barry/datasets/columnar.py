@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+import logging
+
+import numpy as np
+
+MAGIC = b"BARRYCOL"
+VERSION = 1
+ALIGNMENT = 64
+EXTENSION = ".col"
+
+
+def get_columnar_filename(filename):
+    """ Returns the location of the columnar version of a pickled data file """
+    return os.path.splitext(filename)[0] + EXTENSION
+
+
+def get_columns(dataframes):
+    """ Converts a list of per realisation DataFrames into a dictionary of `(num_realisations, num_rows)` arrays, one per column """
+    return {c: np.array([df[c].values for df in dataframes]) for c in dataframes[0].columns}
+
+
+def _is_dataframe(x):
+    return hasattr(x, "columns") and hasattr(x, "values")
+
+
+def _align(n):
+    return n + (-n % ALIGNMENT)
+
+
+class _Encoder(object):
+    """ Splits a nested data object into a JSON serialisable tree and a list of named arrays """
+
+    def __init__(self):
+        self.arrays = {}
+
+    def add(self, name, array):
+        self.arrays[name] = np.ascontiguousarray(array)
+        return {"__array__": name}
+
+    def encode(self, obj, name):
+        if isinstance(obj, dict):
+            if all(isinstance(k, str) for k in obj.keys()):
+                return {k: self.encode(v, f"{name}/{k}") for k, v in obj.items()}
+            # Non string keys (such as the integer step sizes in winfit) need to keep their type
+            return {"__items__": [[k, self.encode(v, f"{name}/{k}")] for k, v in obj.items()]}
+        if isinstance(obj, (list, tuple)) and len(obj) and _is_dataframe(obj[0]):
+            return {"__columns__": {c: self.add(f"{name}/{c}", v) for c, v in get_columns(obj).items()}}
+        if isinstance(obj, (list, tuple)) and len(obj) and isinstance(obj[0], np.ndarray):
+            return self.add(name, np.stack(obj))
+        if isinstance(obj, np.ndarray):
+            return self.add(name, obj)
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return obj
+
+
+def write_columnar(data_obj, filename):
+    """ Writes a data object, as found in the `barry/data` pickles, to the columnar binary format.
+
+    The file starts with the magic bytes, the length of the JSON header and then the header itself.
+    The header holds all of the small metadata (name, cosmology, scalars) and the dtype, shape and offset of
+    every array. Each array (one per field and recon state) is stored contiguously and aligned, so that it can be
+    memory mapped and only the parts actually used are read from disk. Lists of DataFrames are stored
+    column by column, as a `(num_realisations, num_rows)` array for each column.
+
+    Parameters
+    ----------
+    data_obj : dict
+        The data to write
+    filename : str
+        Where to write the data to
+    """
+    encoder = _Encoder()
+    tree = encoder.encode(data_obj, "")
+
+    hasher = hashlib.sha256()
+    layout, offset = {}, 0
+    for name, array in encoder.arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        hasher.update(name.encode("utf-8"))
+        hasher.update(array.tobytes())
+        offset = _align(offset + array.nbytes)
+
+    header = {"version": VERSION, "hash": hasher.hexdigest()[:24], "tree": tree, "arrays": layout}
+    header_bytes = json.dumps(header).encode("utf-8")
+    start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp = filename + f".{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, array in encoder.arrays.items():
+            f.seek(start + layout[name]["offset"])
+            f.write(array.tobytes())
+    os.replace(tmp, filename)
+
+
+def read_header(filename):
+    """ Reads just the JSON header of a columnar file, returning the header and the offset the array data starts at """
+    with open(filename, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a columnar data file")
+        length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(length).decode("utf-8"))
+    if header["version"] != VERSION:
+        raise ValueError(f"{filename} has version {header['version']}, but only version {VERSION} can be read")
+    return header, _align(len(MAGIC) + 8 + length)
+
+
+def load_columnar(filename):
+    """ Loads a columnar data file, memory mapping every array.
+
+    Returns
+    -------
+    data_obj : dict
+        The same structure as the pickled data, except lists of DataFrames are returned as a dictionary of
+        `(num_realisations, num_rows)` arrays, one per column, and lists of arrays as a single stacked array.
+    data_hash : str
+        A hash of the array contents, recorded when the file was written
+    """
+    header, start = read_header(filename)
+    arrays = {}
+    if header["arrays"]:
+        mm = np.memmap(filename, dtype=np.uint8, mode="r")
+        for name, info in header["arrays"].items():
+            dtype = np.dtype(info["dtype"])
+            size = int(np.prod(info["shape"])) * dtype.itemsize
+            offset = start + info["offset"]
+            arrays[name] = mm[offset : offset + size].view(dtype).reshape(info["shape"])
+
+    def decode(node):
+        if isinstance(node, dict):
+            if "__array__" in node:
+                return arrays[node["__array__"]]
+            if "__items__" in node:
+                return {k: decode(v) for k, v in node["__items__"]}
+            if "__columns__" in node:
+                return {k: decode(v) for k, v in node["__columns__"].items()}
+            return {k: decode(v) for k, v in node.items()}
+        return node
+
+    return decode(header["tree"]), header["hash"]
+
+
+def convert(filename, output=None):
+    """ Converts a pickled data file to the columnar format, returning the output location """
+    import pickle
+
+    output = output or get_columnar_filename(filename)
+    with open(filename, "rb") as f:
+        data_obj = pickle.load(f)
+    write_columnar(data_obj, output)
+    logging.getLogger("barry").info(f"Converted {filename} to {output}")
+    return output
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)7s |%(funcName)20s]   %(message)s")
+    files = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "*.pkl")))
+    for file in files:
+        convert(file)
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class CovarianceAccumulator(object):
+    """ Estimates a covariance matrix from blocks of realisations, without holding them all in memory.
+
+    Each block is reduced to its mean and co-moment matrix, which are merged into the running totals using the
+    pairwise update of Chan, Golub and LeVeque. This is as stable as computing the covariance in one go, and
+    all accumulation happens in float64, so float32 mocks can be streamed straight from disk.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.comoment = None
+
+    def add(self, block):
+        """ Adds a block of realisations.
+
+        Parameters
+        ----------
+        block : np.ndarray
+            An array of shape `(num_realisations, num_elements)`
+        """
+        block = np.asarray(block, dtype=np.float64)
+        n_b = block.shape[0]
+        if n_b == 0:
+            return
+        mean_b = block.mean(axis=0)
+        diff = block - mean_b
+        comoment_b = diff.T @ diff
+
+        if self.n == 0:
+            self.n, self.mean, self.comoment = n_b, mean_b, comoment_b
+            return
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.comoment += comoment_b + np.outer(delta, delta) * (self.n * n_b / n)
+        self.mean += delta * (n_b / n)
+        self.n = n
+
+    def get_cov(self, ddof=1, shrinkage=0.0):
+        """ Returns the covariance of every realisation added so far.
+
+        Parameters
+        ----------
+        ddof : int, optional
+            The delta degrees of freedom. The default of 1 gives the unbiased estimator, as per `np.cov`.
+        shrinkage : float, optional
+            The fraction in [0, 1] to shrink the off diagonal elements towards zero by. This is useful when the
+            data vector is long compared to the number of realisations.
+
+        Returns
+        -------
+        cov : np.ndarray
+            The covariance matrix
+        """
+        assert self.n > ddof, f"Need more than {ddof} realisations to compute a covariance, have {self.n}"
+        assert 0 <= shrinkage <= 1, f"Shrinkage should be between 0 and 1, not {shrinkage}"
+        cov = self.comoment / (self.n - ddof)
+        if shrinkage:
+            cov = (1 - shrinkage) * cov + shrinkage * np.diag(np.diag(cov))
+        return cov
+
+
+def compute_cov(realisations, block_size=500, shrinkage=0.0, transform=None):
+    """ Computes the covariance of a (potentially memory mapped) array of realisations block by block.
+
+    Parameters
+    ----------
+    realisations : np.ndarray
+        An array whose first axis is the realisation
+    block_size : int, optional
+        How many realisations to read in at once
+    shrinkage : float, optional
+        Passed to `CovarianceAccumulator.get_cov`
+    transform : function, optional
+        Applied to each block to extract the data vector, returning an array of shape `(num_realisations, num_elements)`
+
+    Returns
+    -------
+    cov : np.ndarray
+        The covariance matrix
+    """
+    accumulator = CovarianceAccumulator()
+    for start in range(0, len(realisations), block_size):
+        block = realisations[start : start + block_size]
+        accumulator.add(block if transform is None else transform(block))
+    return accumulator.get_cov(shrinkage=shrinkage)
@@ -1,5 +1,13 @@
-from abc import ABC
+import os
+import pickle
+import hashlib
 import logging
+from abc import ABC
+
+import numpy as np
+
+from barry.artifacts import get_artifact_store, get_hash, stage_file
+from barry.datasets.columnar import get_columnar_filename, load_columnar
 
 
 class Dataset(ABC):
@@ -21,10 +29,61 @@ class Dataset(ABC):
     def __init__(self, name):
         self.name = name
         self.logger = logging.getLogger("barry")
+        self.data_hash = getattr(self, "data_hash", None)
 
     def get_name(self):
         return self.name
 
+    def load_data_file(self, path):
+        """ Loads a data file, recording a hash of its contents in `data_hash`.
+
+        If a columnar version of the pickled file exists alongside it, that is memory mapped instead.
+        """
+        columnar = get_columnar_filename(path)
+        if os.path.exists(columnar):
+            logging.getLogger("barry").info(f"Loading columnar data from {columnar}")
+            data_obj, self.data_hash = load_columnar(stage_file(columnar))
+            return data_obj
+        with open(stage_file(path), "rb") as f:
+            raw = f.read()
+        self.data_hash = hashlib.sha256(raw).hexdigest()[:24]
+        return pickle.loads(raw)
+
+    def get_cov_config(self):
+        """ Everything that determines the covariance of this dataset, used to cache it on disk. None disables caching. """
+        return None
+
+    def _set_cov_cached(self, compute):
+        """ Sets the `cov`, `icov`, `corr` and `cov_chol` attributes from the on-disk cache if possible.
+
+        Parameters
+        ----------
+        compute : function
+            Called to compute and set the attributes if they have not been cached yet
+        """
+        config = self.get_cov_config()
+        if config is None:
+            compute()
+            return
+        key = get_hash(config)
+        store = get_artifact_store()
+        filename = store.get_path(key, "cov", ".npz")
+        if store.get_status(key, config) == store.VALID:
+            with np.load(stage_file(filename)) as f:
+                for attr in ["cov", "icov", "corr", "cov_chol"]:
+                    setattr(self, attr, f[attr] if attr in f else None)
+            self.logger.info(f"Loaded cached covariance from {filename}")
+            return
+
+        compute()
+        arrays = {attr: getattr(self, attr) for attr in ["cov", "icov", "corr", "cov_chol"] if getattr(self, attr, None) is not None}
+        tmp = filename + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, filename)
+        store.register(key, filename, config)
+        self.logger.info(f"Cached covariance to {filename}")
+
     def get_data(self):
         """ Return a list of data dictionaries
 
@@ -6,7 +6,7 @@ from barry.datasets.dataset_correlation_function_abc import CorrelationFunction
 class CorrelationFunction_SDSS_DR12_Z061_NGC(CorrelationFunction):
     """ Correlation function for SDSS BOSS DR12 sample for the NGC with mean redshift z = 0.61    """
 
-    def __init__(self, name=None, min_dist=30, max_dist=200, recon=True, reduce_cov_factor=1, realisation=None):
+    def __init__(self, name=None, min_dist=30, max_dist=200, recon=True, reduce_cov_factor=1, realisation=None, shrinkage=0.0):
         super().__init__(
             "sdss_dr12_z061_corr_ngc.pkl",
             name=name,
@@ -15,6 +15,7 @@ class CorrelationFunction_SDSS_DR12_Z061_NGC(CorrelationFunction):
             recon=recon,
             reduce_cov_factor=reduce_cov_factor,
             realisation=realisation,
+            shrinkage=shrinkage,
         )
 
 
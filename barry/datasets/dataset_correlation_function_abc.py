@@ -1,24 +1,24 @@
 import os
-import pickle
 import logging
 import inspect
 from abc import ABC
 
 import numpy as np
 
+from barry.datasets.covariance import compute_cov
 from barry.datasets.dataset import Dataset
 
 
 class CorrelationFunction(Dataset, ABC):
-    def __init__(self, filename, name=None, min_dist=30, max_dist=200, recon=True, reduce_cov_factor=1, realisation=None):
+    def __init__(self, filename, name=None, min_dist=30, max_dist=200, recon=True, reduce_cov_factor=1, realisation=None, shrinkage=0.0):
         current_file = os.path.dirname(inspect.stack()[0][1])
         self.data_location = os.path.normpath(current_file + f"/../data/{filename}")
         self.min_dist = min_dist
         self.max_dist = max_dist
         self.recon = recon
+        self.shrinkage = shrinkage
 
-        with open(self.data_location, "rb") as f:
-            self.data_obj = pickle.load(f)
+        self.data_obj = self.load_data_file(self.data_location)
         name = name or self.data_obj["name"] + " Recon" if recon else " Prerecon"
         super().__init__(name)
 
@@ -31,7 +31,7 @@ class CorrelationFunction(Dataset, ABC):
 
         self.cov, self.icov, self.data, self.mask = None, None, None, None
         self.set_realisation(realisation)
-        self._compute_cov()
+        self._set_cov_cached(self._compute_cov)
 
     def set_realisation(self, realisation):
         if realisation is None:
@@ -44,15 +44,31 @@ class CorrelationFunction(Dataset, ABC):
     def set_cov(self, cov):
         self.cov = cov / self.reduce_cov_factor
         self.icov = np.linalg.inv(self.cov)
+        d = np.sqrt(np.diag(self.cov))
+        self.corr = self.cov / (d * np.atleast_2d(d).T)
+        try:
+            self.cov_chol = np.linalg.cholesky(self.cov)
+        except np.linalg.LinAlgError:
+            self.logger.error("Covariance is not positive definite, cannot compute its Cholesky factor")
+            self.cov_chol = None
+
+    def get_cov_config(self):
+        return {
+            "type": "cov",
+            "dataset": self.data_hash,
+            "class": self.__class__.__name__,
+            "recon": self.recon,
+            "min_dist": self.min_dist,
+            "max_dist": self.max_dist,
+            "reduce_cov_factor": self.reduce_cov_factor,
+            "shrinkage": self.shrinkage,
+        }
 
     def _compute_cov(self):
         # TODO: Generalise for other multipoles poles
-        ad = np.array(self.all_data)
-        if ad.shape[2] > 2:
-            x0 = ad[:, self.mask, 2]
-        else:
-            x0 = ad[:, self.mask, 1]
-        cov = np.cov(x0.T)
+        # Stream the mocks through in blocks, so that large (memory mapped) suites are never fully loaded
+        column = 2 if self.all_data[0].shape[1] > 2 else 1
+        cov = compute_cov(self.all_data, transform=lambda block: np.asarray(block)[:, self.mask, column], shrinkage=self.shrinkage)
         self.set_cov(cov)
 
     def get_data(self):
@@ -1,11 +1,13 @@
 import os
+import copy
 import logging
 import inspect
-import pickle
 from abc import ABC
 
 import numpy as np
 
+from barry.datasets.columnar import get_columns
+from barry.datasets.covariance import CovarianceAccumulator
 from barry.datasets.dataset import Dataset, MultiDataset
 
 
@@ -23,13 +25,13 @@ class PowerSpectrum(Dataset, ABC):
         postprocess=None,
         apply_correction=None,
         fake_diag=False,
+        shrinkage=0.0,
     ):
         current_file = os.path.dirname(inspect.stack()[0][1])
         self.data_location = os.path.normpath(current_file + f"/../data/{filename}")
         self.apply_correction = apply_correction
 
-        with open(self.data_location, "rb") as f:
-            self.data_obj = pickle.load(f)
+        self.data_obj = self.load_data_file(self.data_location)
         name = name or self.data_obj["name"] + " Recon" if recon else " Prerecon"
         super().__init__(name)
 
@@ -39,35 +41,93 @@ class PowerSpectrum(Dataset, ABC):
         self.recon = recon
         self.realisation = realisation
         self.postprocess = postprocess
+        self.fake_diag = fake_diag
+        self.shrinkage = shrinkage
 
         self.cosmology = self.data_obj["cosmology"]
         self.all_data = self.data_obj["post-recon"] if recon else self.data_obj["pre-recon"]
+        if isinstance(self.all_data, list):  # Pickled data has a DataFrame per realisation
+            self.all_data = get_columns(self.all_data)
+        self.num_mocks = self.all_data["pk"].shape[0]
         self.reduce_cov_factor = reduce_cov_factor
         if self.reduce_cov_factor == -1:
-            self.reduce_cov_factor = len(self.all_data)
+            self.reduce_cov_factor = self.num_mocks
             self.logger.info(f"Setting reduce_cov_factor to {self.reduce_cov_factor}")
 
         if step_size is None:
             self.step_size = self.data_obj["winfit"].keys()[0]
 
-        self.rebinned = [self._rebin_data(df) for df in self.all_data]
-        self.ks = self.rebinned[0][0]
-        self.pks_all = [x[1] for x in self.rebinned]
+        # The covariance over the full k range, keyed by step size. Shared with any views.
+        self._full_covs = {}
+        self._set_up_data()
+
+    def _set_up_data(self):
+        # Only the realisation being fit is rebinned here. The rest are streamed through in blocks when needed.
+        k_rebinned = self._get_k_rebinned()
+        self.mask = (k_rebinned >= self.min_k) & (k_rebinned <= self.max_k)
+        self.ks = k_rebinned[self.mask]
 
         if self.realisation is None:
             self.logger.info(f"Loading data average")
             self.data = self._get_data_avg()
         else:
-            self.logger.info(f"Loading realisation {realisation}")
-            self.data = self.pks_all[realisation]
+            self.logger.info(f"Loading realisation {self.realisation}")
+            self.data = self.get_realisations(self.realisation, self.realisation + 1)[0]
 
         self._load_winfit()
         self._load_winpk_file()
-        self.logger.debug(f"Computing cov")
-        self.set_cov(self._compute_cov(), fake_diag=fake_diag)
+        self._set_cov_cached(lambda: self.set_cov(self._compute_cov(), fake_diag=self.fake_diag))
+
+    def view(self, min_k=None, max_k=None, step_size=None, postprocess=False, name=None):
+        """ Returns a copy of this dataset with a different k range, binning or postprocessing.
+
+        The view shares the loaded data with this dataset, and only rebins the realisations it needs.
+        Without postprocessing, the covariance of the view is a subset of the covariance over the full k range,
+        so it is only computed once per step size.
+
+        Parameters
+        ----------
+        min_k : float, optional
+            The minimum k value to use. Defaults to that of this dataset.
+        max_k : float, optional
+            The maximum k value to use. Defaults to that of this dataset.
+        step_size : int, optional
+            The number of k bins to combine. Defaults to that of this dataset.
+        postprocess : `barry.postprocessing.PkPostProcess`, optional
+            The postprocessor to apply. Pass None to remove it. Defaults to that of this dataset.
+        name : str, optional
+            The name of the view. Defaults to the name of this dataset.
+
+        Returns
+        -------
+        view : PowerSpectrum
+            The derived dataset
+        """
+        view = copy.copy(self)
+        view.min_k = self.min_k if min_k is None else min_k
+        view.max_k = self.max_k if max_k is None else max_k
+        view.step_size = self.step_size if step_size is None else step_size
+        view.postprocess = self.postprocess if postprocess is False else postprocess
+        view.name = self.name if name is None else name
+        view._set_up_data()
+        return view
 
     def set_realisation(self, index):
-        self.data = self.pks_all[index]
+        self.realisation = index
+        self.data = self.get_realisations(index, index + 1)[0]
+
+    def get_realisations(self, start=0, stop=None):
+        """ Returns the rebinned (and postprocessed) power of realisations `start` to `stop`.
+
+        Each call rebins the requested realisations from scratch, so iterate over large mock suites in blocks.
+
+        Returns
+        -------
+        pks : np.ndarray
+            An array of shape `(num_realisations, num_ks)`
+        """
+        stop = self.num_mocks if stop is None else stop
+        return self._process(self._rebin_block(start, stop))
 
     def set_cov(self, cov, apply_correction=None, fake_diag=False):
         self.logger.info(f"Computed cov {cov.shape}")
@@ -77,55 +137,92 @@ class PowerSpectrum(Dataset, ABC):
         if fake_diag:
             cov = np.diag(np.diag(cov))
         self.cov = cov
+        self.icov = np.linalg.inv(self.cov)
 
-        v = np.diag(cov @ np.linalg.inv(cov))
+        v = np.diag(cov @ self.icov)
         if not np.all(np.isclose(v, 1)):
             self.logger.error("ERROR, setting an inappropriate covariance matrix that is almost singular!!!!")
             self.logger.error(f"These should all be 1: {v}")
         d = np.sqrt(np.diag(self.cov))
         self.corr = self.cov / (d * np.atleast_2d(d).T)
-        self.icov = np.linalg.inv(self.cov)
+        try:
+            self.cov_chol = np.linalg.cholesky(self.cov)
+        except np.linalg.LinAlgError:
+            self.logger.error("Covariance is not positive definite, cannot compute its Cholesky factor")
+            self.cov_chol = None
 
-    def _compute_cov(self):
-        pks = np.array(self.pks_all)
-        cov = np.cov(pks.T)
-        return cov
+    def get_cov_config(self):
+        return {
+            "type": "cov",
+            "dataset": self.data_hash,
+            "class": self.__class__.__name__,
+            "recon": self.recon,
+            "min_k": self.min_k,
+            "max_k": self.max_k,
+            "step_size": self.step_size,
+            "reduce_cov_factor": self.reduce_cov_factor,
+            "fake_diag": self.fake_diag,
+            "shrinkage": self.shrinkage,
+            "postprocess": None if self.postprocess is None else self.postprocess.get_config(),
+        }
 
-    def _get_data_avg(self):
-        return np.array(self.pks_all).mean(axis=0)
+    def _compute_cov(self, block_size=500):
+        # The covariance of a subset of k bins is just the subset of the full covariance
+        if self.postprocess is None and self.step_size in self._full_covs:
+            return self._full_covs[self.step_size][np.ix_(self.mask, self.mask)]
 
-    def _agg_data(self, dataframe):
+        # Stream the mocks through in blocks, so that large (memory mapped) suites are never fully loaded
+        accumulator = CovarianceAccumulator()
+        for start in range(0, self.num_mocks, block_size):
+            pk_rebinned = self._rebin_block(start, start + block_size)
+            if self.postprocess is not None:
+                pk_rebinned = self._process(pk_rebinned)
+            accumulator.add(pk_rebinned)
+        cov = accumulator.get_cov(shrinkage=self.shrinkage)
+        if self.postprocess is not None:
+            return cov
+        self._full_covs[self.step_size] = cov
+        return cov[np.ix_(self.mask, self.mask)]
 
-        k = dataframe["k"].values
-        pk = dataframe["pk"].values
+    def _get_data_avg(self, block_size=500):
+        total = 0
+        for start in range(0, self.num_mocks, block_size):
+            total = total + self.get_realisations(start, start + block_size).sum(axis=0)
+        return total / self.num_mocks
+
+    def _rebin(self, values, weights=None):
+        """ Rebins the last axis of `values` by averaging every group of `step_size` elements.
+
+        If the last group is incomplete, it is padded with the final value (and zero weight).
+        Without weights, the padded values are included in the average.
+        """
         if self.step_size == 1:
-            k_rebinned = k
-            pk_rebinned = pk
-        else:
-            add = k.size % self.step_size
-            weight = dataframe["nk"].values
-            if add:
-                to_add = self.step_size - add
-                k = np.concatenate((k, [k[-1]] * to_add))
-                pk = np.concatenate((pk, [pk[-1]] * to_add))
-                weight = np.concatenate((weight, [0] * to_add))
-            k = k.reshape((-1, self.step_size))
-            pk = pk.reshape((-1, self.step_size))
-            weight = weight.reshape((-1, self.step_size))
-            # Take the average of every group of step_size rows to rebin
-            k_rebinned = np.average(k, axis=1)
-            pk_rebinned = np.average(pk, axis=1, weights=weight)
-
-        mask = (k_rebinned >= self.min_k) & (k_rebinned <= self.max_k)
-        return k_rebinned, pk_rebinned, mask
-
-    def _rebin_data(self, dataframe):
-        k_rebinned, pk_rebinned, mask = self._agg_data(dataframe)
+            return values
+        to_add = -values.shape[-1] % self.step_size
+        pad = [(0, 0)] * (values.ndim - 1) + [(0, to_add)]
+        values = np.pad(values, pad, mode="edge")
+        shape = values.shape[:-1] + (-1, self.step_size)
+        if weights is None:
+            return values.reshape(shape).mean(axis=-1)
+        weights = np.pad(weights, pad, mode="constant")
+        return np.average(values.reshape(shape), axis=-1, weights=weights.reshape(shape))
+
+    def _rebin_block(self, start, stop):
+        """ Returns the rebinned power of realisations `start` to `stop` over the full k range """
+        pk = np.asarray(self.all_data["pk"][start:stop])
+        if self.step_size == 1:
+            return pk
+        return self._rebin(pk, np.asarray(self.all_data["nk"][start:stop]))
+
+    def _get_k_rebinned(self):
+        """ Returns the rebinned ks over the full k range. The k values of the first realisation are used for every realisation. """
+        return self._rebin(np.array(self.all_data["k"][0]))
+
+    def _process(self, pk_rebinned):
+        """ Postprocesses, or masks, a block of realisations rebinned over the full k range """
         if self.postprocess is not None:
-            pk_rebinned = self.postprocess(ks=k_rebinned, pk=pk_rebinned, mask=mask)
-        else:
-            pk_rebinned = pk_rebinned[mask]
-        return k_rebinned[mask], pk_rebinned
+            return self.postprocess(ks=self._get_k_rebinned(), pk=pk_rebinned, mask=self.mask)
+        return pk_rebinned[:, self.mask]
 
     def _load_winfit(self):
         self.w_ks_input = self.data_obj["winfit"][self.step_size]["w_ks_input"]
@@ -138,22 +235,7 @@ class PowerSpectrum(Dataset, ABC):
     def _load_winpk_file(self):
         # data files contain (index, k, pk, nk)
         data = self.data_obj["winpk"]
-        if self.step_size == 1:
-            self.w_pk = data[:, 2]
-        else:
-            pk = data[:, 2]
-            weight = data[:, 3]
-
-            add = pk.size % self.step_size
-            if add:
-                to_add = self.step_size - add
-                pk = np.concatenate((pk, [pk[-1]] * to_add))
-                weight = np.concatenate((weight, [0] * to_add))
-            pk = pk.reshape((-1, self.step_size))
-            weight = weight.reshape((-1, self.step_size))
-
-            # Take the average of every group of step_size rows to rebin
-            self.w_pk = np.average(pk, axis=1, weights=weight)
+        self.w_pk = self._rebin(data[:, 2], data[:, 3])
         self.logger.info(f"Loaded winpk with shape {self.w_pk.shape}")
 
     def get_data(self):
@@ -172,7 +254,7 @@ class PowerSpectrum(Dataset, ABC):
                 "corr": self.corr,
                 "name": self.name,
                 "cosmology": self.cosmology,
-                "num_mocks": len(self.all_data),
+                "num_mocks": self.num_mocks,
             }
         ]
 
@@ -1,13 +1,37 @@
+import glob
 import logging
 import os
 import shutil
 import socket
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
 import numpy as np
 
+from barry.campaign import MockCampaign
+from barry.chain_store import ChainStore, get_summary, QUANTILES
 from barry.config import get_config
+from barry.datasets.dataset import Dataset
 from barry.doJob import write_jobscript_slurm
-from barry.samplers import DynestySampler
+from barry.models.model import Model
+from barry.reweight import reweight_chain
+from barry.samplers import DynestySampler, GridSampler
+from barry.warm_start import WarmStartCache
+
+
+_worker_fitter = None
+
+
+def _init_worker(fitter):
+    global _worker_fitter
+    _worker_fitter = fitter
+
+
+def _run_job(index, return_result):
+    result = _worker_fitter._run_fit(*_worker_fitter._get_indexes_from_index(index))
+    return index, result if return_result else None
 
 
 class Fitter(object):
@@ -41,31 +65,75 @@ class Fitter(object):
         """
         self.logger = logging.getLogger("barry")
         self.model_datasets = []
+        self._models = {}
         self.num_walkers = 10
         self.num_concurrent = None
+        self.num_fits_per_task = 1
+        self.strided = False
+        self.run_locally = False
+        self.num_local_processes = None
         self.temp_dir = temp_dir
         self.sampler = None
+        self.warm_start_cache = None
         self.save_dims = save_dims
         self.remove_output = remove_output
         os.makedirs(temp_dir, exist_ok=True)
+        self.chain_store = ChainStore(os.path.join(temp_dir, "chains"))
         if not remove_output:
             self.logger.warning("OUTPUT IS NOT BEING REMOVED, BE WARNED IF THIS IS SUPPOSED TO BE A FRESH RUN")
 
     def add_model_and_dataset(self, model, dataset, **extra_args):
         """ Adds a model-dataset pair to fit.
 
+        When adding thousands of pairs (such as one per mock realisation), the model and dataset can be
+        given lazily, so that they are only created when that specific pair is fit or loaded.
+
         Parameters
         ----------
-        model : `barry.models.Model`
-            The model class to fit.
-        dataset : `barry.datasets.Dataset`
-            The dataset to fit.
+        model : `barry.models.Model` or callable
+            The model class to fit, or a function returning it. A function is only called once per process,
+            so the same function can be shared between many pairs.
+        dataset : `barry.datasets.Dataset`, tuple or callable
+            The dataset to fit. Can also be a `(dataset, realisation)` tuple, in which case the realisation is only
+            selected when needed, or a function returning the dataset (or the output of its `get_data`).
         extra_args : kwargs, optional
             Any extra information you want returned with the chains from model fitting.
             I often use this to name my pairs to make it convenient to load into `ChainConsumer`.
 
         """
-        self.model_datasets.append((model, dataset.get_data(), extra_args))
+        if isinstance(dataset, Dataset):
+            dataset = dataset.get_data()
+        self.model_datasets.append((model, dataset, extra_args))
+
+    def get_model_and_data(self, model_index):
+        """ Returns the model, data and extra arguments for a model-dataset pair, creating them if they were added lazily.
+
+        Parameters
+        ----------
+        model_index : int
+            The index of the pair, in the order they were added
+
+        Returns
+        -------
+        model : `barry.models.Model`
+        data : list
+            The output of the datasets `get_data`
+        extra : dict
+        """
+        model, data, extra = self.model_datasets[model_index]
+        if not isinstance(model, Model):
+            if model not in self._models:
+                self._models[model] = model()
+            model = self._models[model]
+        if isinstance(data, tuple):
+            dataset, realisation = data
+            dataset.set_realisation(realisation)
+            data = dataset.get_data()
+        elif callable(data):
+            data = data()
+            if isinstance(data, Dataset):
+                data = data.get_data()
+        return model, data, extra
 
     def set_num_concurrent(self, num_concurrent=None):
         """ Set the number of jobs allowed to run in the job array at once.
@@ -86,8 +154,54 @@ class Fitter(object):
         num_concurrent : int
         """
         if self.num_concurrent is None:
-            return len(self.model_datasets) * self.num_walkers
-        return self.num_concurrent
+            return self.get_num_tasks()
+        return min(self.num_concurrent, self.get_num_tasks())
+
+    def set_num_fits_per_task(self, num_fits_per_task, strided=False):
+        """ Sets how many fits each job array task runs.
+
+        Running many fits in one task means interpreter start up, data loading and model pregen loading are
+        only paid once per task instead of once per fit. If the job asks for more than one cpu per task
+        (`job_cpus_per_task` in the config), the fits in a task are spread over a process pool.
+
+        Parameters
+        ----------
+        num_fits_per_task : int
+            The number of fits each task should run
+        strided : bool, optional
+            If false (the default), each task runs a contiguous block of fits. If true, task `t` out of `n`
+            runs fits `t`, `t + n`, `t + 2n`..., which spreads any expensive models over all the tasks.
+        """
+        assert num_fits_per_task >= 1, "Each task needs to run at least one fit"
+        self.num_fits_per_task = num_fits_per_task
+        self.strided = strided
+
+    def get_num_tasks(self):
+        """ Gets the number of job array tasks needed to run all the fits.
+
+        Returns
+        -------
+        num_tasks : int
+        """
+        return int(np.ceil(self.get_num_jobs() / self.num_fits_per_task))
+
+    def get_task_indexes(self, task_index):
+        """ Gets the job indexes run by a given job array task.
+
+        Parameters
+        ----------
+        task_index : int
+            The (zero-indexed) job array task
+
+        Returns
+        -------
+        indexes : list[int]
+        """
+        num_jobs = self.get_num_jobs()
+        if self.strided:
+            return list(range(task_index, num_jobs, self.get_num_tasks()))
+        start = task_index * self.num_fits_per_task
+        return list(range(start, min(start + self.num_fits_per_task, num_jobs)))
 
     def set_num_walkers(self, num_walkers):
         """ Sets the number of walks for each model-dataset pair.
@@ -117,6 +231,108 @@ class Fitter(object):
         walker_index = index % self.num_walkers
         return model_index, walker_index
 
+    def is_complete(self, index):
+        """ Returns whether the fit for a job index has already finished """
+        return self._get_indexes_from_index(index) in self.chain_store.get_index()
+
+    def _run_jobs(self, indexes, num_processes=1, return_results=False):
+        """ Runs a set of fits, one after the other or using a process pool, reusing models and data between them.
+
+        Fits which have already completed are skipped.
+
+        Returns
+        -------
+        results : dict
+            If `return_results` is set, maps each job index that was run to the output of the sampler
+        """
+        results = {}
+        completed = self.chain_store.get_index()
+        todo = [i for i in indexes if self._get_indexes_from_index(i) not in completed]
+        if len(todo) < len(indexes):
+            self.logger.info(f"Skipping {len(indexes) - len(todo)} fits which have already completed")
+        if not todo:
+            return results
+
+        start = time.time()
+
+        def report(n):
+            elapsed = time.time() - start
+            remaining = elapsed * (len(todo) - n) / n
+            self.logger.info(f"Finished {n} of {len(todo)} fits, {elapsed:0.0f}s elapsed, roughly {remaining:0.0f}s remaining")
+
+        if num_processes == 1 or len(todo) == 1:
+            for n, index in enumerate(todo):
+                result = self._run_fit(*self._get_indexes_from_index(index))
+                if return_results:
+                    results[index] = result
+                report(n + 1)
+            return results
+
+        with ProcessPoolExecutor(max_workers=num_processes, initializer=_init_worker, initargs=(self,)) as executor:
+            futures = [executor.submit(_run_job, index, return_results) for index in todo]
+            for n, future in enumerate(as_completed(futures)):
+                index, result = future.result()
+                if return_results:
+                    results[index] = result
+                report(n + 1)
+        return results
+
+    def set_run_locally(self, run_locally=True, num_processes=None):
+        """ Sets whether to run every fit when running on a local computer, rather than just the first as a test.
+
+        Parameters
+        ----------
+        run_locally : bool, optional
+            Whether to run all the fits locally
+        num_processes : int, optional
+            The number of fits to run at once. Defaults to the number of cores, limited by `set_num_concurrent`.
+        """
+        self.run_locally = run_locally
+        self.num_local_processes = num_processes
+
+    def run_local(self, num_processes=None, return_results=False):
+        """ Runs all the fits on this computer using a process pool.
+
+        Chains are saved to the temporary directory just like on a cluster, so `load` works as usual. Fits which
+        have already completed are skipped, so an interrupted run can simply be restarted.
+
+        Parameters
+        ----------
+        num_processes : int, optional
+            The number of fits to run at once. Defaults to the number of cores, limited by `set_num_concurrent`.
+        return_results : bool, optional
+            Whether to also return the output of the sampler for each fit that was run. Only do this for small runs.
+
+        Returns
+        -------
+        results : dict
+            If `return_results` is set, maps `(model_index, walker_index)` to the sampler output for each fit that was run
+        """
+        if num_processes is None:
+            num_processes = os.cpu_count()
+        if self.num_concurrent is not None:
+            num_processes = min(num_processes, self.num_concurrent)
+        self.logger.info(f"Running {self.get_num_jobs()} fits locally using {num_processes} processes")
+        results = self._run_jobs(list(range(self.get_num_jobs())), num_processes=num_processes, return_results=return_results)
+        return {self._get_indexes_from_index(i): r for i, r in results.items()}
+
+    def set_warm_start(self, warm_start=True, burn_fraction=0.1):
+        """ Sets whether fits should start from what earlier fits of the same model to similar data learnt.
+
+        Useful when fitting many realisations of the same dataset, such as mocks, as the posteriors all have
+        nearly the same shape. Each finished fit adds its best fit and covariance to a cache in the temporary
+        directory, and later fits use them to start close to the posterior with a tuned proposal, so they
+        only need a fraction of the usual burn in.
+
+        Parameters
+        ----------
+        warm_start : bool, optional
+            Whether to warm start fits
+        burn_fraction : float, optional
+            The fraction of the samplers burn in to run for warm started fits
+        """
+        self.warm_start_cache = WarmStartCache(os.path.join(self.temp_dir, "warm_start"), burn_fraction) if warm_start else None
+
     def set_sampler(self, sampler):
         """ Sets the sampler
 
@@ -140,19 +356,105 @@ class Fitter(object):
 
     def _run_fit(self, model_index, walker_index):
 
-        model = self.model_datasets[model_index][0]
-        data = self.model_datasets[model_index][1]
+        model, data, extra = self.get_model_and_data(model_index)
 
         model.set_data(data)
         uid = f"chain_{model_index}_{walker_index}"
 
         sampler = self.get_sampler()
 
+        self.logger.info("Running model_dataset %d, walker number %d" % (model_index, walker_index))
         self.logger.info("Running fitting job, saving to %s" % self.temp_dir)
         self.logger.info(f"\tModel is {model}")
-        self.logger.info(f"\tData is {' '.join([d['name'] for d in self.model_datasets[model_index][1]])}")
-        sampler.fit(model.get_posterior, model.get_start, model.get_num_dim(), model.unscale, uid=uid, save_dims=self.save_dims)
+        self.logger.info(f"\tData is {' '.join([d['name'] for d in data])}")
+        warm_start = None if self.warm_start_cache is None else self.warm_start_cache.get(model, data)
+        get_start = model.get_start if warm_start is None else partial(model.get_start, warm_start=warm_start)
+        start = time.time()
+        result = sampler.fit(model.get_posterior, get_start, model.get_num_dim(), model.unscale, uid=uid, save_dims=self.save_dims, warm_start=warm_start)
         self.logger.info("Finished sampling")
+        if self.warm_start_cache is not None:
+            self.warm_start_cache.update(model, data, result["chain"], result.get("weights"), result.get("posterior"))
+        self._store_chain(model, model_index, walker_index, uid, result, extra, time.time() - start)
+        return result
+
+    def _store_chain(self, model, model_index, walker_index, uid, result, extra, wall_time, sampler=None):
+        """ Moves the output of a finished fit into the chain store, removing the samplers own files """
+        sampler = self.get_sampler() if sampler is None else sampler
+        directory = getattr(sampler, "temp_dir", None)
+        files = [] if directory is None else sorted(glob.glob(os.path.join(directory, f"{uid}_*")))
+        chain_files = [f for f in files if f.endswith(("chain.npy", "chain.bin"))]
+        # Prefer what the sampler saved, as that is exactly what it would load back
+        output = sampler.load_file(chain_files[0]) if chain_files else result
+        data = self._get_result_array(output)
+        if self.save_dims is not None:
+            data = data[:, : 3 + self.save_dims]
+        columns = ["posterior", "weight", "evidence"] + model.get_names()[: data.shape[1] - 3]
+        summary = get_summary(data, columns, wall_time=wall_time)
+        if output.get("diagnostics") is not None:
+            summary["diagnostics"] = output["diagnostics"]
+        self.chain_store.write(model_index, walker_index, data, columns, extra=extra, summary=summary)
+        for f in files:
+            os.remove(f)
+
+    def run_mock_campaign(self, model, dataset, realisations, sampler=None, **extra_args):
+        """ Fits many realisations of a dataset with the same model in one go, rather than as one job each.
+
+        A model-dataset pair is added for each realisation, as with `add_model_and_dataset`, so the results can
+        be loaded and summarised as usual. The pairs are then fit together with a `barry.campaign.MockCampaign`,
+        which computes the model once per parameter point and the chi2 of every realisation at once, using a
+        sampler that can fit many posteriors together (by default a `GridSampler`). Each realisation gets a single
+        fit, as walker 0, so use `set_num_walkers(1)`. Realisations which have already been fit are skipped, and
+        calling this again with the same model and dataset reuses the pairs added the first time.
+
+        Parameters
+        ----------
+        model : `barry.models.Model` or callable
+            The model to fit, or a function returning it. Needs to implement `get_data_vector` and `get_model_vector`.
+        dataset : `barry.datasets.Dataset`
+            The dataset, which must have `set_realisation`
+        realisations : list[int]
+            The realisations to fit
+        sampler : `barry.samplers.GridSampler`, optional
+            The sampler to use. Needs a `fit_batch` method.
+        extra_args : kwargs, optional
+            Any extra information you want returned with the chains, along with the realisation
+
+        Returns
+        -------
+        model_indexes : list[int]
+            The index of the pair added for each realisation
+        """
+        sampler = GridSampler() if sampler is None else sampler
+        # Pairs added by an earlier call for the same model, dataset and realisation are reused, so rerunning a
+        # campaign does not add (and refit) them again
+        existing = {}
+        for i, (m, d, extra) in enumerate(self.model_datasets):
+            if m is model and isinstance(d, tuple) and d[0] is dataset:
+                existing.setdefault(d[1], []).append((i, extra))
+        model_indexes = []
+        for realisation in realisations:
+            extra = {"realisation": realisation, **extra_args}
+            matches = [i for i, e in existing.get(realisation, []) if e == extra]
+            if not matches:
+                self.add_model_and_dataset(model, (dataset, realisation), **extra)
+                matches = [len(self.model_datasets) - 1]
+            model_indexes.append(matches[0])
+
+        completed = self.chain_store.get_index()
+        todo = [i for i in model_indexes if (i, 0) not in completed]
+        if not todo:
+            self.logger.info("Every realisation in the campaign has already been fit")
+            return model_indexes
+        model = self.get_model_and_data(todo[0])[0]
+        campaign = MockCampaign(model, [self.get_model_and_data(i)[1] for i in todo])
+
+        self.logger.info(f"Fitting {len(todo)} realisations together")
+        start = time.time()
+        results = sampler.fit_batch(campaign.get_posterior_batch, model.get_num_dim(), model.unscale, save_dims=self.save_dims)
+        wall_time = (time.time() - start) / len(todo)
+        for i, result in zip(todo, results):
+            self._store_chain(model, i, 0, f"chain_{i}_0", result, self.model_datasets[i][2], wall_time, sampler=sampler)
+        return model_indexes
 
     def is_local(self):
         return shutil.which(get_config()["hpc_determining_command"]) is None
@@ -166,13 +468,17 @@ class Fitter(object):
         num_concurrent = self.get_num_concurrent()
 
         num_jobs = self.get_num_jobs()
+        num_tasks = self.get_num_tasks()
         num_models = len(self.model_datasets)
-        self.logger.info(f"With {num_models} models+datasets and {self.num_walkers} walkers, " f"have {num_jobs} jobs")
+        self.logger.info(f"With {num_models} models+datasets and {self.num_walkers} walkers, " f"have {num_jobs} jobs over {num_tasks} tasks")
 
         if self.is_local():
-            # Only do the first model+dataset on a local computer as a test
-            self.logger.info("Running locally on the 0th index.")
-            self._run_fit(0, 0)
+            if self.run_locally:
+                self.run_local(num_processes=self.num_local_processes)
+            else:
+                # Only do the first model+dataset on a local computer as a test
+                self.logger.info("Running locally on the 0th index.")
+                self._run_fit(0, 0)
         else:
             if len(sys.argv) == 1:
                 # if launching the job for the first time
@@ -180,7 +486,7 @@ class Fitter(object):
                     if self.remove_output:
                         self.logger.info("Deleting %s" % self.temp_dir)
                         shutil.rmtree(self.temp_dir)
-                filename = write_jobscript_slurm(file, name=os.path.basename(file), num_tasks=self.get_num_jobs(), num_concurrent=num_concurrent, delete=False)
+                filename = write_jobscript_slurm(file, name=os.path.basename(file), num_tasks=num_tasks, num_concurrent=num_concurrent, delete=False)
                 self.logger.info("Running batch job at %s" % filename)
                 config = get_config()
                 os.system(f"{config['hpc_submit_command']} {filename}")
@@ -191,12 +497,11 @@ class Fitter(object):
                 else:
                     index = -1
                 if index != -1:
-                    mi, wi = self._get_indexes_from_index(index)
-                    self.logger.info("Running model_dataset %d, walker number %d" % (mi, wi))
-                    self._run_fit(mi, wi)
+                    indexes = self.get_task_indexes(index)
+                    self.logger.info(f"Running task {index}, which has jobs {indexes}")
+                    self._run_jobs(indexes, num_processes=get_config().get("job_cpus_per_task", 1))
 
-    def _load_file(self, file):
-        d = self.get_sampler().load_file(file)
+    def _get_result_array(self, d):
         chain = d["chain"]
         weights = d.get("weights")
         evidence = d.get("evidence")
@@ -216,7 +521,26 @@ class Fitter(object):
         result = np.hstack((posterior, weights, evidence, chain))
         return result
 
-    def load(self, split_models=True, split_walkers=False):
+    def _load_file(self, file):
+        return self._get_result_array(self.get_sampler().load_file(file))
+
+    def _iterate_chains(self, model_indexes=None):
+        """ Yields the model index, walker index and results array of each fit, in order """
+        index = self.chain_store.get_index()
+        if index:
+            for record, chain in self.chain_store.iterate(model_indexes=model_indexes):
+                yield record["model_index"], record["walker_index"], chain
+            return
+
+        # Fall back to the individual files written before the chain store existed
+        files = [f for f in os.listdir(self.temp_dir) if f.endswith("chain.npy")]
+        files.sort(key=lambda s: [int(s.split("_")[1]), int(s.split("_")[2])])
+        for f in files:
+            mi, wi = int(f.split("_")[1]), int(f.split("_")[2])
+            if model_indexes is None or mi in model_indexes:
+                yield mi, wi, self._load_file(self.temp_dir + "/" + f)
+
+    def load(self, split_models=True, split_walkers=False, model_indexes=None, lazy=False):
         """ Load in all the chains and fitting results
 
         Parameters
@@ -226,6 +550,10 @@ class Fitter(object):
             case for this, think hard if you feel like you want to set it to `False`).
         split_walkers : bool, optional
             Split up each walker to make things like convergence diagnostics easier. Defaults to `False`
+        model_indexes : list[int], optional
+            Only load the results for these model-dataset pairs. Defaults to all of them.
+        lazy : bool, optional
+            Return a generator which loads each fit as it is needed, rather than a list of every fit.
 
         Returns
         -------
@@ -240,45 +568,124 @@ class Fitter(object):
                     - dict containing any `extra` information passed in.
         """
         self.logger.info("Loading chains")
-        files = [f for f in os.listdir(self.temp_dir) if f.endswith("chain.npy")]
-        files.sort(key=lambda s: [int(s.split("_")[1]), int(s.split("_")[2])])
-        filenames = [self.temp_dir + "/" + f for f in files]
-        model_indexes = [int(f.split("_")[1]) for f in files]
-        walker_indexes = [int(f.split("_")[2]) for f in files]
-        chains = [self._load_file(f) for f in filenames]
-
-        results = []
-        results_models = []
-        prev_model, prev_walkers = 0, 0
-        stacked = None
-
-        to_sort = np.array(model_indexes) + 0.0001 * np.array(walker_indexes)
-        sorted_indexes = np.argsort(to_sort)
-
-        for index in sorted_indexes:
-            c, mi, wi = chains[index], model_indexes[index], walker_indexes[index]
-            if (prev_walkers != wi and split_walkers) or (prev_model != mi and split_models):
-                if stacked is not None:
-                    results.append(stacked)
-                    results_models.append(self.model_datasets[prev_model])
-                stacked = None
-                prev_model = mi
-                prev_walkers = wi
-            if stacked is None:
-                stacked = c
-            else:
-                stacked = np.vstack((stacked, c))
-        results_models.append(self.model_datasets[mi])
-        results.append(stacked)
-
-        finals = []
-        for result, model in zip(results, results_models):
-            posterior = result[:, 0]
-            weight = result[:, 1]
-            evidence = result[:, 2]
-            chain = result[:, 3:]
-            finals.append((posterior, weight, chain, evidence, model[0], model[1], model[2]))
+        finals = self._load(split_models, split_walkers, model_indexes)
+        if lazy:
+            return finals
+        finals = list(finals)
         self.logger.info(f"Loaded {len(finals)} chains")
         if len(finals) == 1:
             self.logger.info(f"Chain has shape {finals[0][2].shape}")
         return finals
+
+    def summarise(self):
+        """ Returns a table summarising every fit, without needing to load the chains.
+
+        Each row is one fit (one model-dataset pair and walker), and has the model and walker index, any extra
+        information passed in with the pair, the maximum log posterior, log evidence, effective sample size,
+        total weight, number of samples and wall time. For each parameter, it has the weighted mean, standard
+        deviation and best fit value (`alpha_mean`, `alpha_std`, `alpha_best`) and weighted quantiles (`alpha_q16`).
+        Any diagnostics recorded by the sampler are also included, such as the autocorrelation time and effective
+        sample size of each parameter from an adaptive `EnsembleSampler` (`alpha_tau`, `alpha_ess`).
+
+        Returns
+        -------
+        summary : pd.DataFrame
+        """
+        import pandas as pd
+
+        rows = []
+        index = self.chain_store.get_index()
+        for (mi, wi), record in sorted(index.items()):
+            summary = record.get("summary")
+            if summary is None:
+                summary = get_summary(self.chain_store.read(record), record["columns"])
+            rows.append(self._flatten_summary(mi, wi, record["extra"], summary))
+        if not index:
+            # Older output with a file per fit has no summaries, so compute them from the chains
+            for mi, wi, chain in self._iterate_chains():
+                model, _, extra = self.get_model_and_data(mi)
+                columns = ["posterior", "weight", "evidence"] + model.get_names()[: chain.shape[1] - 3]
+                rows.append(self._flatten_summary(mi, wi, extra, get_summary(chain, columns)))
+        return pd.DataFrame(rows)
+
+    def reweight(self, model_index, model=None, dataset=None, min_ess_fraction=0.1, pool=None):
+        """ Reweights the chains of a finished fit to a slightly different model or dataset, instead of rerunning it.
+
+        Useful for things like fixing a parameter, changing the covariance correction or k range, where the new
+        posterior sits within the old one. Check `diagnostics["rerun"]` in the output, which is set when the
+        effective sample size has collapsed and the reweighted chain cannot be trusted.
+
+        Parameters
+        ----------
+        model_index : int
+            The index of the model-dataset pair whose chains to reweight. Every walker is combined.
+        model : `barry.models.Model`, optional
+            The new model. Every one of its active parameters must be in the stored chains, and any stored
+            parameters it does not have are dropped. Defaults to the original model.
+        dataset : `barry.datasets.Dataset` or list, optional
+            The new dataset, or the output of its `get_data`. Defaults to the original data.
+        min_ess_fraction : float, optional
+            Recommend a rerun if the effective sample size falls below this fraction of the original
+        pool : `barry.samplers.pool.SerialPool`, optional
+            If set, the new posterior is evaluated in parallel using this pool
+
+        Returns
+        -------
+        dict
+            A dictionary containing the chain of the new models parameters, the new weights and log posterior,
+            and diagnostics from `barry.reweight.reweight_chain`
+        """
+        old_model, data, _ = self.get_model_and_data(model_index)
+        old_names = old_model.get_names()
+        model = old_model if model is None else model
+        if dataset is not None:
+            data = dataset.get_data() if isinstance(dataset, Dataset) else dataset
+
+        chains = [chain for _, _, chain in self._iterate_chains(model_indexes=[model_index])]
+        assert chains, f"There are no chains for model index {model_index} to reweight"
+        result = np.concatenate(chains) if len(chains) > 1 else np.asarray(chains[0])
+        stored = old_names[: result.shape[1] - 3]
+        missing = [n for n in model.get_names() if n not in stored]
+        if missing:
+            raise ValueError(f"The chains for model index {model_index} do not have {missing}, so cannot be reweighted to {model}")
+
+        self.logger.info(f"Reweighting {result.shape[0]} samples from model index {model_index} to {model}")
+        model.set_data(data)
+        chain = np.asarray(result[:, 3:], dtype=np.float64)[:, [stored.index(n) for n in model.get_names()]]
+        return reweight_chain(model.get_posterior, chain, result[:, 1], result[:, 0], pool=pool, min_ess_fraction=min_ess_fraction)
+
+    def _flatten_summary(self, model_index, walker_index, extra, summary):
+        row = {"model_index": model_index, "walker_index": walker_index}
+        row.update(extra)
+        row.update({k: v for k, v in summary.items() if k not in ["params", "diagnostics"]})
+        # Sampler specific diagnostics, such as the autocorrelation times from an adaptive ensemble run
+        for k, v in summary.get("diagnostics", {}).items():
+            if np.ndim(v) == 0:
+                row[k] = v
+            else:
+                row.update({f"{name}_{k}": x for name, x in zip(summary["params"], v)})
+        for name, p in summary["params"].items():
+            row.update({f"{name}_mean": p["mean"], f"{name}_std": p["std"], f"{name}_best": p["best"]})
+            row.update({f"{name}_q{100 * q:g}": v for q, v in zip(QUANTILES, p["quantiles"])})
+        return row
+
+    def _load(self, split_models, split_walkers, model_indexes):
+        def group_key(mi, wi):
+            return (mi if split_models else None, wi if split_walkers else None)
+
+        def combine(chains, mi):
+            # Concatenate once per group, rather than growing an array walker by walker
+            result = np.concatenate(chains) if len(chains) > 1 else np.asarray(chains[0])
+            model, data, extra = self.get_model_and_data(mi)
+            return result[:, 0], result[:, 1], result[:, 3:], result[:, 2], model, data, extra
+
+        current_key, current_mi, chains = None, None, []
+        for mi, wi, chain in self._iterate_chains(model_indexes=model_indexes):
+            key = group_key(mi, wi)
+            if chains and key != current_key:
+                yield combine(chains, current_mi)
+                chains = []
+            current_key, current_mi = key, mi
+            chains.append(chain)
+        if chains:
+            yield combine(chains, current_mi)
@@ -3,12 +3,14 @@ import sys
 import os
 import logging
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.append("..")
 from barry.models import Model
 from barry.config import is_local, get_config
 from barry.cosmology.camb_generator import CambGenerator
 from barry.datasets.dataset import Dataset
+from barry.pregenerate import PregenRunner
 from tests.utils import get_concrete
 
 
@@ -57,37 +59,70 @@ def get_cosmologies(datasets):
     return cs
 
 
+def generate_camb(generator):
+    generator.load_data(can_generate=True)
+    return generator.key
+
+
+def generate_pregen(model_class, c, num_processes=1, refresh=False):
+    model = model_class()
+    model.set_cosmology(c, load_pregen=False)
+    PregenRunner(model, num_processes=num_processes, refresh=refresh).run()
+    return model.get_pregen_key()
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="[%(levelname)7s |%(funcName)20s]   %(message)s")
 
     # Set up command line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("-r", "--refresh", action="store_true", default=False)
+    parser.add_argument("-s", "--slurm", action="store_true", default=False, help="Submit missing pregen as MPI jobs instead of running locally")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="Number of local processes to pregenerate with")
     args = parser.parse_args()
 
-    # This should be run on a HPC for the PTGenerator side of things.
-    assert not is_local(), "Please run this on your HPC system"
+    # Submitting the PTGenerator jobs needs to happen on a HPC.
+    if args.slurm:
+        assert not is_local(), "Please run this on your HPC system"
 
     datasets = [c() for c in get_concrete(Dataset) if "Dummy" not in c.__name__]
 
     cosmologies = get_cosmologies(datasets)
     logging.info(f"Have {len(cosmologies)} cosmologies")
 
-    # Ensure all cosmologies exist
-    for c in cosmologies:
-        logging.info(f"Ensuring cosmology {c} is generated")
-        generator = CambGenerator(om_resolution=101, h0_resolution=1, h0=c["h0"], ob=c["ob"], ns=c["ns"], redshift=c["z"])
-        generator.load_data(can_generate=True)
+    # Ensure all cosmologies exist, generating the missing ones in parallel
+    generators = [CambGenerator(om_resolution=101, h0_resolution=1, h0=c["h0"], ob=c["ob"], ns=c["ns"], redshift=c["z"]) for c in cosmologies]
+    missing = [g for g in generators if g.get_status() != g.store.VALID]
+    logging.info(f"{len(missing)} of {len(generators)} CAMB grids need generating")
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        for key in executor.map(generate_camb, missing):
+            logging.info(f"Generated CAMB data {key}")
 
-    # For each cosmology, ensure that each model pregens the right data
+    # For each cosmology, ensure that each model has valid pregen data. Stale data (made from an older CAMB grid) is regenerated.
     models = [c() for c in get_concrete(Model) if "Dummy" not in c.__name__]
+    batched, unbatched = [], []
     for m in models:
         for c in cosmologies:
-            try:
-                m.set_cosmology(c)
+            m.set_cosmology(c, load_pregen=False)
+            status = m.get_pregen_status()
+            if status == m.store.VALID and not args.refresh:
                 logging.info(f"Model {m.__class__.__name__} already has pregenerated data for {m.camb.filename_unique}")
-                if args.refresh:
-                    logging.info("But going to refresh tme anyway!")
-                    assert not args.refresh, "Refreshing anyway!"
-            except AssertionError:
-                setup_ptgenerator_slurm(m, c)
+                continue
+            logging.info(f"Model {m.__class__.__name__} pregenerated data for {m.camb.filename_unique} is {status}")
+            if m._has_batch_precompute():
+                batched.append((m.__class__, c))
+            else:
+                unbatched.append((m, c))
+
+    # Batched models are cheap, so run all of them side by side
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        futures = [executor.submit(generate_pregen, model_class, c, refresh=args.refresh) for model_class, c in batched]
+        for future in as_completed(futures):
+            logging.info(f"Generated pregen data {future.result()}")
+
+    # The rest parallelise over their own grid
+    for m, c in unbatched:
+        if args.slurm:
+            setup_ptgenerator_slurm(m, c)
+        else:
+            generate_pregen(m.__class__, c, num_processes=args.processes, refresh=args.refresh)
@@ -132,6 +132,12 @@ class CorrelationFunctionFit(Model):
         xi_model = self.compute_correlation_function(data["dist"], p, smooth=smooth)
         return xi_model
 
+    def get_data_vector(self, d):
+        return d["xi0"]
+
+    def get_model_vector(self, p, d):
+        return self.get_model(p, d, smooth=self.smooth)
+
     def get_likelihood(self, p, d):
         """ Uses the stated likelihood correction and `get_model` to compute the likelihood
 
@@ -149,9 +155,7 @@ class CorrelationFunctionFit(Model):
             The corrected log likelihood
         """
 
-        xi_model = self.get_model(p, d, smooth=self.smooth)
-
-        diff = d["xi0"] - xi_model
+        diff = self.get_data_vector(d) - self.get_model_vector(p, d)
         num_mocks = d["num_mocks"]
         num_params = len(self.get_active_params())
         return self.get_chi2_likelihood(diff, d["icov"], num_mocks=num_mocks, num_params=num_params)
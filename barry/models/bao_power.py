@@ -127,6 +127,12 @@ class PowerSpectrumFit(Model):
         # Get the subsection of our model which corresponds to the data k values
         return pk_normalised, data["w_mask"]
 
+    def get_data_vector(self, d):
+        return d["pk"]
+
+    def get_model_vector(self, p, d):
+        return self.get_model(p, d, smooth=self.smooth)
+
     def get_likelihood(self, p, d):
         """ Uses the stated likelihood correction and `get_model` to compute the likelihood
 
@@ -143,10 +149,8 @@ class PowerSpectrumFit(Model):
         log_likelihood : float
             The corrected log likelihood
         """
-        pk_model = self.get_model(p, d, smooth=self.smooth)
-
         # Compute the chi2
-        diff = d["pk"] - pk_model
+        diff = self.get_data_vector(d) - self.get_model_vector(p, d)
         num_mocks = d["num_mocks"]
         num_params = len(self.get_active_params())
         return self.get_chi2_likelihood(diff, d["icov"], num_mocks=num_mocks, num_params=num_params)
@@ -37,6 +37,25 @@ class PowerDing2018(PowerSpectrumFit):
             "sigma_ss_nl": integrate.simps(pk_lin * s ** 2 * (1.0 - j0), ks) / (6.0 * np.pi ** 2),
         }
 
+    def precompute_batch(self, camb, pk_lin, r_s):
+
+        ks = camb.ks
+        j0 = jn(0, np.outer(r_s, ks))
+        s = camb.smoothing_kernel
+        w = self.get_simpson_weights()
+
+        # Fold the Simpson weights into the kernels so each integral becomes a matrix product over the whole grid
+        damped_kernels = np.vstack((w, w * (1.0 - s) ** 2, w * s ** 2)).T / (6.0 * np.pi ** 2)
+        damped = (pk_lin * (1.0 - j0)) @ damped_kernels
+        sigma_sd_nl = (pk_lin @ (w * 0.5 * (s ** 2 + (1.0 - s) ** 2)) - (pk_lin * j0) @ (w * s * (1.0 - s))) / (6.0 * np.pi ** 2)
+
+        return {
+            "sigma_nl": damped[:, 0],
+            "sigma_dd_nl": damped[:, 1],
+            "sigma_sd_nl": sigma_sd_nl,
+            "sigma_ss_nl": damped[:, 2],
+        }
+
     @lru_cache(maxsize=32)
     def get_damping_dd(self, growth, om):
         return np.exp(-np.outer(1.0 + (2.0 + growth) * growth * self.mu ** 2, self.camb.ks ** 2) * self.get_pregen("sigma_dd_nl", om))
@@ -41,6 +41,26 @@ class PowerSeo2016(PowerSpectrumFit):
             "R2": R2,
         }
 
+    def precompute_batch(self, camb, pk_lin, r_s):
+
+        ks = camb.ks
+        s = camb.smoothing_kernel
+        w = self.get_simpson_weights()
+
+        r1, r2 = self.get_Rs()
+
+        # Fold the Simpson weights into the kernels so each integral becomes a matrix product over the whole grid
+        sigma_kernels = np.vstack((w, w * (1.0 - s) ** 2, w * s ** 2)).T / (6.0 * np.pi ** 2)
+        sigmas = pk_lin @ sigma_kernels
+
+        return {
+            "sigma": sigmas[:, 0],
+            "sigma_dd": sigmas[:, 1],
+            "sigma_ss": sigmas[:, 2],
+            "R1": ks ** 2 * (pk_lin @ (r1 * w).T) / (4.0 * np.pi ** 2),
+            "R2": ks ** 2 * (pk_lin @ (r2 * w).T) / (4.0 * np.pi ** 2),
+        }
+
     @lru_cache(maxsize=2)
     def get_Rs(self):
         ks = self.camb.ks
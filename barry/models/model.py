@@ -1,20 +1,32 @@
 import os
-import inspect
+import shutil
 import logging
 import pickle
 from abc import ABC, abstractmethod
 from collections import OrderedDict
 from numpy.random import uniform
 import numpy as np
+from functools import lru_cache
+from scipy import integrate
 from scipy.special import loggamma
-from scipy.optimize import basinhopping
+from scipy.optimize import basinhopping, minimize
 from enum import Enum, unique
 from dataclasses import dataclass
 
 
+from barry.artifacts import get_artifact_store, get_hash, stage_file
 from barry.cosmology.camb_generator import Omega_m_z, getCambGenerator
 
 
+@lru_cache(maxsize=4)
+def _get_simpson_weights(ks_bytes):
+    # Keyed on the raw bytes of the ks, as arrays are not hashable
+    ks = np.frombuffer(ks_bytes, dtype=np.float64)
+    weights = integrate.simps(np.eye(ks.size), ks, axis=1)
+    weights.flags.writeable = False
+    return weights
+
+
 @dataclass
 class Param:
     name: str
@@ -47,6 +59,9 @@ class Model(ABC):
 
     """
 
+    # Increment this whenever a change to precompute would change its output, so old pregen data is not reused
+    pregen_version = 1
+
     def __init__(self, name, postprocess=None, correction=None):
         """ Create a new model.
 
@@ -68,9 +83,8 @@ class Model(ABC):
         self.cosmology = None
         self.pregen = None
         self.pregen_path = None
-        current_file = os.path.dirname(inspect.stack()[0][1])
-        self.data_location = os.path.normpath(current_file + f"/../generated/")
-        os.makedirs(self.data_location, exist_ok=True)
+        self.store = get_artifact_store()
+        self.data_location = self.store.root
 
         self.params = []
         self.fix_params = []
@@ -83,12 +97,66 @@ class Model(ABC):
         assert isinstance(self.correction, Correction), "Correction should be an enum of Correction"
         self.logger.info(f"Created model {name} of {self.__class__.__name__} with correction {correction} and postprocess {str(postprocess)}")
 
+    def __getstate__(self):
+        """ Drops the CAMB generator and pregenerated data when pickling, as they are large and reloaded by `set_data`.
+
+        This keeps models cheap to send to other processes. A model which has been unpickled needs `set_data`
+        called on it again before it can be used.
+        """
+        state = self.__dict__.copy()
+        state.update({"camb": None, "pregen": None, "cosmology": None})
+        return state
+
     def get_name(self):
         return self.name
 
+    def get_pregen_config(self):
+        """ Everything that determines the output of `precompute`, used to address the pregenerated data. """
+        return {
+            "type": "pregen",
+            "model": self.__class__.__name__,
+            "version": self.pregen_version,
+            "camb": self.camb.key,
+            "recon_smoothing_scale": float(self.camb.recon_smoothing_scale),
+            "smooth_type": getattr(self, "smooth_type", None),
+        }
+
+    def get_pregen_key(self):
+        return get_hash(self.get_pregen_config())
+
+    def get_pregen_status(self):
+        """ Returns whether the pregenerated data is missing, stale or valid in the artifact store """
+        if not self._needs_precompute():
+            return self.store.VALID
+        status = self.store.get_status(self.get_pregen_key(), self.get_pregen_config())
+        if status == self.store.MISSING and self._adopt_legacy_pregen():
+            status = self.store.get_status(self.get_pregen_key(), self.get_pregen_config())
+        return status
+
+    def get_legacy_pregen_path(self):
+        """ Returns where the pregenerated data was saved before it was addressed by its configuration. """
+        return os.path.join(self.store.root, self.__class__.__name__ + "_" + self.camb.legacy_name + ".pkl")
+
+    def _adopt_legacy_pregen(self):
+        """ Registers pregenerated data saved under the old style filename in the artifact store.
+
+        The data depends on the CAMB grid, so it can only be adopted once that is in the store as well.
+        """
+        legacy = self.get_legacy_pregen_path()
+        if not os.path.exists(legacy):
+            return False
+        self.camb.adopt_legacy_data()
+        if self.camb.get_status() != self.store.VALID:
+            self.logger.info(f"Cannot adopt {legacy} until its CAMB data has been generated")
+            return False
+        self.logger.warning(f"Adopting pregenerated data from the old style filename {legacy}")
+        shutil.copyfile(legacy, self.pregen_path)
+        self.store.register(self.get_pregen_key(), self.pregen_path, self.get_pregen_config(), dependencies=[self.camb.key])
+        return True
+
     def get_unique_cosmo_name(self):
         """ Unique name used to save out any pregenerated data. """
-        return self.__class__.__name__ + "_" + self.camb.filename_unique + ".pkl"
+        return self.__class__.__name__ + "_" + self.get_pregen_key() + ".pkl"
 
     def set_cosmology(self, c, load_pregen=True):
         z = c["z"]
@@ -100,7 +168,7 @@ class Model(ABC):
         if self.cosmology != c:
             self.camb = getCambGenerator(h0=c["h0"], ob=c["ob"], redshift=c["z"], ns=c["ns"], recon_smoothing_scale=c["reconsmoothscale"])
             self.set_default("om", c["om"])
-            self.pregen_path = os.path.abspath(os.path.join(self.data_location, self.get_unique_cosmo_name()))
+            self.pregen_path = os.path.join(self.store.root, self.get_unique_cosmo_name())
             self.cosmology = c
             if load_pregen:
                 self._load_precomputed_data()
@@ -199,9 +267,31 @@ class Model(ABC):
             The (corrected) log-likelihood value from the computed chi2.
         """
         chi2 = diff.T @ icov @ diff
+        return self.get_corrected_likelihood(chi2, diff.shape[0], num_mocks=num_mocks, num_params=num_params)
+
+    def get_corrected_likelihood(self, chi2, num_data, num_mocks=None, num_params=None):
+        """ Converts chi2 values to log likelihoods, applying the likelihood correction.
+
+        Works elementwise, so the chi2 of many models or data realisations can be corrected at once.
+
+        Parameters
+        ----------
+        chi2 : float or np.ndarray
+            The chi2 value(s)
+        num_data : int
+            The length of the data vector. Used for corrections.
+        num_mocks : int, optional
+            The number of mocks used to estimate the covariance. Used for corrections.
+        num_params : int, optional
+            The number of parameters in the model. Used for corrections.
 
+        Returns
+        -------
+        log_likelihood : float or np.ndarray
+            The (corrected) log-likelihood value for each chi2.
+        """
         if self.correction is Correction.HARTLAP:  # From Hartlap 2007
-            chi2 *= (num_mocks - diff.shape - 2) / (num_mocks - 1)
+            chi2 = chi2 * (num_mocks - num_data - 2) / (num_mocks - 1)
 
         if self.correction is Correction.SELLENTIN:  # From Sellentin 2016
             key = f"{num_mocks}_{num_params}"
@@ -215,6 +305,18 @@ class Model(ABC):
         else:
             return -0.5 * chi2
 
+    def get_data_vector(self, data):
+        """ Returns the observed data vector that `get_model_vector` is compared to. Only needed for `barry.campaign.MockCampaign`. """
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement get_data_vector")
+
+    def get_model_vector(self, params, data):
+        """ Returns the model prediction compared to `get_data_vector` in the chi2.
+
+        Only needed for `barry.campaign.MockCampaign`, which relies on the prediction depending only on the
+        parameters and the parts of the data (like the binning and window function) which every realisation shares.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement get_model_vector")
+
     @abstractmethod
     def get_likelihood(self, params, data):
         raise NotImplementedError("You need to set your likelihood")
@@ -226,8 +328,9 @@ class Model(ABC):
 
     def _load_precomputed_data(self):
         if self._needs_precompute():
-            assert os.path.exists(self.pregen_path), f"You need to pregenerate the required data for {self.pregen_path}"
-            with open(self.pregen_path, "rb") as f:
+            status = self.get_pregen_status()
+            assert status == self.store.VALID, f"Pregenerated data for {self.pregen_path} is {status}, you need to (re)generate it"
+            with open(stage_file(self.pregen_path), "rb") as f:
                 self.pregen = pickle.load(f)
             self.logger.info(f"Pregen data loaded from {self.pregen_path}")
         else:
@@ -237,6 +340,7 @@ class Model(ABC):
         with open(self.pregen_path, "wb") as f:
             pickle.dump(data, f)
             self.logger.info(f"Pregen data saved to {self.pregen_path}")
+        self.store.register(self.get_pregen_key(), self.pregen_path, self.get_pregen_config(), dependencies=[self.camb.key])
 
     def generate_precomputed_data(self, indexes):
         self.logger.info(f"Pregenerating model {self.__class__.__name__} data for {self.camb.filename_unique}")
@@ -251,6 +355,27 @@ class Model(ABC):
             data.append([i, j, values])
         return data
 
+    def generate_precomputed_data_batch(self):
+        """ Pregenerates the data for the entire CAMB grid at once using `precompute_batch`.
+
+        Returns
+        -------
+        combined : dict
+            A dictionary mapping each precomputed key to an array of shape `(om_resolution, h0_resolution)` for
+            scalars or `(om_resolution, h0_resolution, n)` for vectors. This is the same layout as `precompute_mpi.py` creates.
+        """
+        self.logger.info(f"Batch pregenerating model {self.__class__.__name__} data for {self.camb.filename_unique}")
+        if self.camb.data is None:
+            self.camb.load_data()
+
+        grid_shape = self.camb.data.shape[:2]
+        flat = self.camb.data.reshape((-1, self.camb.data.shape[2]))
+        r_s = flat[:, 0]
+        pk_lin = flat[:, 1 : 1 + self.camb.k_num]
+
+        values = self.precompute_batch(self.camb, pk_lin, r_s)
+        return {key: value.reshape(grid_shape + value.shape[1:]) for key, value in values.items()}
+
     def get_pregen(self, key, om, h0=None):
         if h0 is None:
             h0 = self.camb.h0
@@ -279,13 +404,59 @@ class Model(ABC):
         """
         return None
 
-    def get_start(self, num_walkers=1):
-        """ Gets an optimised `n` starting points by calculating a best fit starting point using basinhopping """
+    def _has_batch_precompute(self):
+        return self.precompute_batch.__func__ is not Model.precompute_batch
+
+    def precompute_batch(self, camb, pk_lin, r_s):
+        """ An optional, vectorised version of `precompute` which computes the values for many cosmologies at once.
+
+        Only worth implementing when the precomputed values are cheap functions (ideally linear functionals) of the
+        CAMB outputs, such that they can be computed for the whole grid with a few matrix multiplications.
+
+        Parameters
+        ----------
+        camb : CambGenerator
+            Stores the ks, smoothing kernel, etc
+        pk_lin : np.ndarray
+            The linear power spectra, of shape `(n, camb.k_num)`
+        r_s : np.ndarray
+            The sound horizon for each of the `n` power spectra
+
+        Returns
+        -------
+        A dictionary mapping the same keywords as `precompute` to arrays whose first axis has length `n`.
+        """
+        raise NotImplementedError("This model does not implement a batched precompute")
+
+    def get_simpson_weights(self):
+        """ Returns the weights `w` such that `w @ y` equals `simps(y, ks)` for any `y` sampled at the CAMB ks. """
+        ks = np.ascontiguousarray(self.camb.ks, dtype=np.float64)
+        return _get_simpson_weights(ks.tobytes())
+
+    def get_start(self, num_walkers=1, warm_start=None):
+        """ Gets an optimised `n` starting points by calculating a best fit starting point using basinhopping
+
+        Parameters
+        ----------
+        num_walkers : int, optional
+            How many starting points to return
+        warm_start : `barry.warm_start.WarmStart`, optional
+            What fits to other realisations learnt about the posterior. If given, the best fit is found with a short
+            local optimisation from their best fit, and the starting points are spread out like their posterior.
+
+        Returns
+        -------
+        start : np.ndarray
+            An array of shape `(num_walkers, num_dim)`
+        """
         self.logger.info("Getting start position")
 
         def minimise(scale_params):
             return -self.get_posterior(self.unscale(scale_params))
 
+        if warm_start is not None:
+            return self._get_warm_start(num_walkers, warm_start, minimise)
+
         close_default = 3
         start_random = self.get_raw_start()
         start_close = [(s + p.default * close_default) / (1 + close_default) for s, p in zip(start_random, self.get_active_params())]
@@ -308,6 +479,25 @@ class Model(ABC):
 
         return unscaled_samples
 
+    def _get_warm_start(self, num_walkers, warm_start, minimise):
+        mins = np.array([p.min for p in self.get_active_params()])
+        maxes = np.array([p.max for p in self.get_active_params()])
+        initial = self.scale(np.clip(warm_start.best_fit, mins, maxes))
+        res = minimize(minimise, initial, method="Nelder-Mead", options={"maxiter": 200})
+        best_fit = np.clip(self.unscale(res.x), mins, maxes)
+        self.logger.debug(f"Warm start optimisation moved the best fit by {np.array(self.unscale(res.x)) - warm_start.best_fit}")
+
+        # Draw from the posterior of the earlier fits, redrawing any points outside the priors
+        samples = np.random.multivariate_normal(best_fit, warm_start.covariance, size=num_walkers)
+        for _ in range(10):
+            bad = np.any((samples < mins) | (samples > maxes), axis=1)
+            if not bad.any():
+                break
+            samples[bad] = np.random.multivariate_normal(best_fit, warm_start.covariance, size=bad.sum())
+        if num_walkers == 1:
+            samples[0] = best_fit
+        return np.clip(samples, mins, maxes)
+
     def get_num_dim(self):
         """ Gets the number of dimensions (active, free parameters) in the model """
         return len(self.get_active_params())
@@ -337,6 +527,13 @@ class Model(ABC):
             posterior += self.get_likelihood(ps, d)
         return posterior
 
+    def get_posterior_batch(self, params):
+        """ Returns the posterior for each row of a 2D array of param values.
+
+        Used by samplers which evaluate many points at once. Override this if the model can be vectorised over parameters.
+        """
+        return np.array([self.get_posterior(p) for p in params])
+
     def scale(self, params):
         """ Scale parameter values to the unit hypercube. Assumes uniform priors. If you want other dists and nested sampling, overwrite this """
         scaled = np.array([(s - p.min) / (p.max - p.min) for s, p in zip(params, self.get_active_params())])
@@ -46,7 +46,8 @@ class PureBAOExtractor(PkPostProcess):
         ks : np.array
             The k values for the BAO power spectrum
         pk : np.array
-            The power spectrum at `ks`
+            The power spectrum at `ks`. Can have leading dimensions (such as one per realisation),
+            in which case the extraction is done along the last axis.
 
         Returns
         -------
@@ -54,20 +55,17 @@ class PureBAOExtractor(PkPostProcess):
         """
         k_range = self.get_krange()
 
-        result = []
-        denoms = []
-        for k, p in zip(ks, pk):
-            k_diff = np.abs(ks - k)
-            m = k_diff < k_range
-            numerator = (1 - (pk[m] / p)).sum()
-            denominator = (1 - np.cos(self.r_s * (ks[m] - k))).sum()
-            res = numerator / denominator
-            denoms.append(denominator)
-            result.append(res)
-        result = np.array(result)
+        # window[i, j] selects the ks[j] within k_range of ks[i]
+        k_diff = ks[np.newaxis, :] - ks[:, np.newaxis]
+        window = np.abs(k_diff) < k_range
+        # The sum of 1 - pk[j] / pk[i] over the window is its size minus the windowed sum of pk over pk[i]. Written as a
+        # matrix product, this only needs memory for the output, however many realisations there are.
+        numerator = window.sum(axis=-1) - (pk @ window.T.astype(float)) / pk
+        denoms = np.where(window, 1 - np.cos(self.r_s * k_diff), 0).sum(axis=-1)
+        result = numerator / denoms
 
         if mask is None:
-            mask = np.ones(result.shape).astype(np.bool)
+            mask = np.ones(ks.shape).astype(bool)
 
         # Plots for debugging purposes to make sure everything looks good
         if self.plot:
@@ -86,8 +84,8 @@ class PureBAOExtractor(PkPostProcess):
         # Used for manually verifying the correctness of the covariance
         # described in Eq7 (and Noda2019 eq 21,22,23)
         if return_denominator:
-            return np.array(denoms)[mask]
-        return result[mask]
+            return denoms[mask]
+        return result[..., mask]
 
 
 class BAOExtractor(PureBAOExtractor):
@@ -130,20 +128,20 @@ class BAOExtractor(PureBAOExtractor):
         ks : np.ndarray
             Wavenumbers
         pk : np.ndarray
-            Power at wavenumber
+            Power at wavenumber. Can have leading dimensions, such as one per realisation.
         mask : np.ndarray (bool mask), optional
             Which k values to return at the end. Used to remove k values below / above certain values.
             I pass them in here because if we reorder the k values the masking cannot be done outside this function.
         """
         if mask is None:
-            mask = np.ones(pk.shape).astype(np.bool)
+            mask = np.ones(ks.shape).astype(bool)
         extracted_pk = super().postprocess(ks, pk, None)
         mask_bao = self.get_is_extracted(ks)
         if self.reorder:
-            result = np.concatenate((pk[mask & ~mask_bao], extracted_pk[mask & mask_bao]))
+            result = np.concatenate((pk[..., mask & ~mask_bao], extracted_pk[..., mask & mask_bao]), axis=-1)
         else:
-            mask_int = mask_bao.astype(np.int)
-            result = (extracted_pk * (mask_int) + pk * (1 - mask_int))[mask]
+            mask_int = mask_bao.astype(int)
+            result = (extracted_pk * (mask_int) + pk * (1 - mask_int))[..., mask]
         return result
 
 
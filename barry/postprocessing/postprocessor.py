@@ -10,11 +10,17 @@ class PostProcess(ABC):
     def __call__(self, **inputs):
         pass
 
+    def get_config(self):
+        """ Describes this postprocessor and its settings. Used to identify cached data which was made using it. """
+        return {"class": self.__class__.__name__, **{k: v for k, v in self.__dict__.items() if k != "logger"}}
+
 
 class PkPostProcess(PostProcess):
     """ An abstract implementation of PostProcess for power spectrum models.
 
     Requires that implementations pass in k values, p(k) values and a boolean mask.
+    Implementations should act along the last axis of p(k), so that datasets can postprocess
+    every realisation at once.
     """
 
     def __call__(self, **inputs):
@@ -1,10 +1,10 @@
 import sys
 import logging
 import argparse
-import numpy as np
 
 sys.path.append("..")
 from barry.models import Model
+from barry.pregenerate import PregenRunner
 from tests.utils import get_concrete
 
 
@@ -20,6 +20,8 @@ if __name__ == "__main__":
     parser.add_argument("--ob", type=float, default=0.04814)
     parser.add_argument("--ns", type=float, default=0.97)
     parser.add_argument("--reconsmoothscale", type=float, default=21.21)
+    parser.add_argument("--nompi", action="store_true", default=False, help="Use a local process pool instead of MPI")
+    parser.add_argument("--processes", type=int, default=None, help="Number of processes when not using MPI")
     args = parser.parse_args()
 
     # Find the right model
@@ -29,57 +31,6 @@ if __name__ == "__main__":
         {"z": args.redshift, "h0": args.h0, "om": args.om, "ob": args.ob, "ns": args.ns, "reconsmoothscale": args.reconsmoothscale}, load_pregen=False
     )
 
-    from mpi4py import MPI
-
-    mpi_comm = MPI.COMM_WORLD
-    rank = mpi_comm.Get_rank()
-    size = mpi_comm.Get_size()
-    logging.info(f"Process reporting rank {rank} and size {size}")
-
-    # Ensure that the camb data loads
-    if rank == 0:
-        model.camb.load_data(can_generate=True)
-    mpi_comm.Barrier()
-
-    camb = model.camb
-    omch2s = camb.omch2s
-    h0s = camb.h0s
-    all_indexes = [(i, j) for i in range(len(omch2s)) for j in range(len(h0s))]
-
-    assert mpi_comm is not None, "Yeah this is going to need MPI, which isnt working for some reason..."
-    size = mpi_comm.Get_size()
-    logging.info(f"Running generation via MPI with size {size}")
-
-    # Split the tasks based on how many MPI cores we have
-    delegations = [all_indexes[i::size] for i in range(size)]
-    run_indexes = mpi_comm.scatter(delegations, root=0)
-    results = model.generate_precomputed_data(run_indexes)
-    all_results = mpi_comm.gather(results, root=0)
-
-    # Should have a list of results mapping indexes to values that have come back. Unpack these into fixed arrays
-    if rank == 0:
-        logging.info("Merging results")
-        data = all_results[0]  # Start with the first set
-
-        # Use the shapes to create the right sized arrays
-        tmp = data[0][2]  # This is the first thing model.precompute would have generated
-        combined = {}
-        num = []
-        for key in tmp.keys():
-            if isinstance(tmp[key], (float, int)):
-                combined[key] = np.empty((model.camb.om_resolution, model.camb.h0_resolution))
-                num.append(key)
-            else:
-                combined[key] = np.empty((model.camb.om_resolution, model.camb.h0_resolution, len(tmp[key])))
-            combined[key][:] = np.nan
-
-        # Combine the results of all different cores
-        for data in all_results:
-            for i, j, values in data:
-                for k, v in values.items():
-                    if k in num:
-                        combined[k][i, j] = v
-                    else:
-                        combined[k][i, j, :] = v
-
-        model._save_precomputed_data(combined)
+    # Results are saved per grid point, so if this gets killed, simply run it again to resume
+    runner = PregenRunner(model, num_processes=args.processes, use_mpi=not args.nompi)
+    runner.run()
@@ -0,0 +1,213 @@
+import os
+import pickle
+import shutil
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+
+def combine_precomputed_data(model, results):
+    """ Merges per grid point results into the dictionary of arrays saved out as a models pregen data.
+
+    Parameters
+    ----------
+    model : `barry.models.Model`
+        The model the results belong to. Used to determine the CAMB grid resolution.
+    results : list
+        A list of `[i, j, values]` elements, where `values` is the dictionary returned by `model.precompute`.
+
+    Returns
+    -------
+    combined : dict
+        Maps each key to an array of shape `(om_resolution, h0_resolution)` for scalars, or
+        `(om_resolution, h0_resolution, n)` for vectors. Any grid point not in `results` is left as NaN.
+    """
+    # Use the shapes to create the right sized arrays
+    tmp = results[0][2]  # This is the first thing model.precompute would have generated
+    combined = {}
+    num = []
+    for key in tmp.keys():
+        if isinstance(tmp[key], (float, int)):
+            combined[key] = np.empty((model.camb.om_resolution, model.camb.h0_resolution))
+            num.append(key)
+        else:
+            combined[key] = np.empty((model.camb.om_resolution, model.camb.h0_resolution, len(tmp[key])))
+        combined[key][:] = np.nan
+
+    for i, j, values in results:
+        for k, v in values.items():
+            if k in num:
+                combined[k][i, j] = v
+            else:
+                combined[k][i, j, :] = v
+    return combined
+
+
+_worker_model = None
+
+
+def _init_worker(model, camb, cosmology):
+    # Models drop their CAMB generator and cosmology when pickled, so they are sent separately and restored here
+    global _worker_model
+    model.camb = camb
+    model.cosmology = cosmology
+    if camb.data is None:
+        camb.load_data()
+    _worker_model = model
+
+
+def _run_index(index, part_dir):
+    i, j = index
+    results = _worker_model.generate_precomputed_data([index])
+    _write_part(part_dir, i, j, results[0][2])
+    return index
+
+
+def _part_filename(part_dir, i, j):
+    return os.path.join(part_dir, f"{i}_{j}.pkl")
+
+
+def _write_part(part_dir, i, j, values):
+    # Write then rename so that a killed process never leaves a half written part behind
+    filename = _part_filename(part_dir, i, j)
+    with open(filename + ".tmp", "wb") as f:
+        pickle.dump(values, f)
+    os.replace(filename + ".tmp", filename)
+
+
+class PregenRunner(object):
+    """ Pregenerates the data a model needs for every point in its CAMB grid.
+
+    Each grid point is saved to its own file as soon as it has been computed, so that if the
+    process (or a node) dies, rerunning will pick up where it left off. Once every grid point exists,
+    they are combined into the usual pregen file and the partial results removed.
+
+    By default this runs using a local process pool, but it can also distribute the grid using MPI.
+    Models that implement `precompute_batch` skip all of this and compute the grid in one go.
+    """
+
+    def __init__(self, model, num_processes=None, use_mpi=False, refresh=False, mp_context=None):
+        """
+
+        Parameters
+        ----------
+        model : `barry.models.Model`
+            The model to pregenerate data for. Must have its cosmology set already.
+        num_processes : int, optional
+            The size of the process pool. Defaults to the number of cores available.
+        use_mpi : bool, optional
+            Whether to split the grid across MPI ranks instead of using a local process pool.
+        refresh : bool, optional
+            Whether to regenerate the data from scratch, even if it (or partial output) already exists.
+        mp_context : str, optional
+            The multiprocessing start method for the process pool, such as "spawn". Defaults to the platform default.
+        """
+        self.logger = logging.getLogger("barry")
+        self.model = model
+        self.num_processes = num_processes or os.cpu_count()
+        self.use_mpi = use_mpi
+        self.refresh = refresh
+        self.mp_context = mp_context
+        self.part_dir = model.pregen_path + ".parts"
+
+    def get_all_indexes(self):
+        camb = self.model.camb
+        return [(i, j) for i in range(len(camb.omch2s)) for j in range(len(camb.h0s))]
+
+    def get_missing_indexes(self):
+        """ Returns the grid indexes which do not yet have a saved result """
+        return [(i, j) for i, j in self.get_all_indexes() if not os.path.exists(_part_filename(self.part_dir, i, j))]
+
+    def load_parts(self):
+        results = []
+        for i, j in self.get_all_indexes():
+            with open(_part_filename(self.part_dir, i, j), "rb") as f:
+                results.append([i, j, pickle.load(f)])
+        return results
+
+    def run(self):
+        """ Pregenerates and saves the data, resuming from any existing partial output.
+
+        Returns
+        -------
+        combined : dict
+            The combined pregen data, or None if this is not the MPI root process.
+        """
+        status = self.model.get_pregen_status()
+        if status == self.model.store.VALID and not self.refresh:
+            self.logger.info(f"Pregen data already exists at {self.model.pregen_path}")
+            return None
+        if status == self.model.store.STALE or self.refresh:
+            # Partial results from a previous attempt cannot be trusted either
+            shutil.rmtree(self.part_dir, ignore_errors=True)
+
+        if self.model._has_batch_precompute():
+            self.logger.info("Model supports batched pregeneration, computing the whole grid at once")
+            self._ensure_camb()
+            combined = self.model.generate_precomputed_data_batch()
+            self.model._save_precomputed_data(combined)
+            return combined
+
+        if self.use_mpi:
+            is_root = self._run_mpi()
+        else:
+            self._run_pool()
+            is_root = True
+        if not is_root:
+            return None
+
+        missing = self.get_missing_indexes()
+        assert not missing, f"Pregeneration did not complete, {len(missing)} grid points are missing"
+        self.logger.info("Merging results")
+        combined = combine_precomputed_data(self.model, self.load_parts())
+        self.model._save_precomputed_data(combined)
+        shutil.rmtree(self.part_dir)
+        return combined
+
+    def _ensure_camb(self):
+        if self.model.camb.data is None:
+            self.model.camb.load_data(can_generate=True)
+
+    def _run_pool(self):
+        self._ensure_camb()
+        os.makedirs(self.part_dir, exist_ok=True)
+        missing = self.get_missing_indexes()
+        total = len(self.get_all_indexes())
+        self.logger.info(f"Have {total - len(missing)} of {total} grid points, running the rest on {self.num_processes} processes")
+        if not missing:
+            return
+
+        context = None if self.mp_context is None else multiprocessing.get_context(self.mp_context)
+        initargs = (self.model, self.model.camb, self.model.cosmology)
+        with ProcessPoolExecutor(max_workers=self.num_processes, mp_context=context, initializer=_init_worker, initargs=initargs) as executor:
+            futures = [executor.submit(_run_index, index, self.part_dir) for index in missing]
+            for n, future in enumerate(as_completed(futures)):
+                i, j = future.result()
+                self.logger.debug(f"Finished grid point {i}:{j}, {n + 1} of {len(missing)}")
+
+    def _run_mpi(self):
+        from mpi4py import MPI
+
+        mpi_comm = MPI.COMM_WORLD
+        rank = mpi_comm.Get_rank()
+        size = mpi_comm.Get_size()
+        self.logger.info(f"Running generation via MPI with rank {rank} and size {size}")
+
+        # Ensure that the camb data loads
+        if rank == 0:
+            self._ensure_camb()
+            os.makedirs(self.part_dir, exist_ok=True)
+            missing = self.get_missing_indexes()
+        else:
+            missing = None
+        missing = mpi_comm.bcast(missing, root=0)
+        if self.model.camb.data is None:
+            self.model.camb.load_data()
+
+        _init_worker(self.model, self.model.camb, self.model.cosmology)
+        for index in missing[rank::size]:
+            _run_index(index, self.part_dir)
+        mpi_comm.Barrier()
+        return rank == 0
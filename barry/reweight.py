@@ -0,0 +1,91 @@
+import logging
+
+import numpy as np
+
+from barry.samplers.pool import get_batch_posterior
+
+
+def get_importance_weights(new_posterior, old_posterior, weights):
+    """ Computes importance weights that take samples of one posterior to another.
+
+    Parameters
+    ----------
+    new_posterior : np.ndarray
+        The log posterior of each sample under the new model or data
+    old_posterior : np.ndarray
+        The log posterior (or log likelihood, for nested sampling) each sample was drawn with
+    weights : np.ndarray
+        The original weight of each sample
+
+    Returns
+    -------
+    new_weights : np.ndarray
+        The reweighted weights, normalised to have the same sum as `weights`
+    log_evidence_ratio : float
+        The log of the ratio of the new evidence to the old evidence
+    """
+    log_ratio = np.asarray(new_posterior, dtype=np.float64) - np.asarray(old_posterior, dtype=np.float64)
+    log_ratio[~np.isfinite(log_ratio)] = -np.inf
+    weights = np.asarray(weights, dtype=np.float64)
+    if not np.any(np.isfinite(log_ratio) & (weights > 0)):
+        return np.zeros_like(weights), -np.inf
+    # Subtract the maximum before exponentiating, as the log posteriors can be large
+    offset = np.max(log_ratio[weights > 0])
+    ratio = weights * np.exp(log_ratio - offset)
+    return ratio * weights.sum() / ratio.sum(), offset + np.log(ratio.sum() / weights.sum())
+
+
+def reweight_chain(log_posterior, chain, weights, posterior, pool=None, min_ess_fraction=0.1):
+    """ Reweights an existing chain to a slightly different posterior, rather than sampling it again.
+
+    The new posterior is evaluated at every sample in batches (using the pool, or the models `get_posterior_batch`),
+    and each sample is weighted by the ratio of the new posterior to the old one. This is only accurate when the new
+    posterior lies well within the old one. The (Kish) effective sample size of the weights shows when it does not:
+    if it falls below `min_ess_fraction` of what it was, the result is flagged as needing a full rerun.
+
+    Parameters
+    ----------
+    log_posterior : function
+        The new log posterior, such as `model.get_posterior` for a model with its new data set
+    chain : np.ndarray
+        The samples, of shape `(num_samples, num_dim)`
+    weights : np.ndarray
+        The weight of each sample
+    posterior : np.ndarray
+        The log posterior each sample was drawn with
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, the new posterior is evaluated in parallel using this pool
+    min_ess_fraction : float, optional
+        Recommend a rerun if the effective sample size falls below this fraction of the original
+
+    Returns
+    -------
+    dict
+        A dictionary containing the chain, new weights and new log posterior, and diagnostics holding the
+        original and new effective sample size, their ratio, the largest share of the total weight held by a
+        single sample, the log evidence ratio, and whether a full rerun is recommended
+    """
+    logger = logging.getLogger("barry")
+    chain = np.asarray(chain, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64).flatten()
+    new_posterior = np.asarray(get_batch_posterior(log_posterior, pool)(chain), dtype=np.float64)
+    new_weights, log_evidence_ratio = get_importance_weights(new_posterior, np.asarray(posterior).flatten(), weights)
+
+    old_ess = weights.sum() ** 2 / (weights ** 2).sum()
+    new_ess = 0.0 if new_weights.sum() == 0 else new_weights.sum() ** 2 / (new_weights ** 2).sum()
+    ess_fraction = new_ess / old_ess
+    rerun = bool(ess_fraction < min_ess_fraction)
+    if rerun:
+        logger.warning(f"Reweighting left an effective sample size of {new_ess:0.1f} from {old_ess:0.1f}, you should rerun the fit instead")
+    else:
+        logger.info(f"Reweighting kept an effective sample size of {new_ess:0.1f} from {old_ess:0.1f}")
+
+    diagnostics = {
+        "old_ess": old_ess,
+        "new_ess": new_ess,
+        "ess_fraction": ess_fraction,
+        "max_weight_fraction": 1.0 if new_weights.sum() == 0 else new_weights.max() / new_weights.sum(),
+        "log_evidence_ratio": log_evidence_ratio,
+        "rerun": rerun,
+    }
+    return {"chain": chain, "weights": new_weights, "posterior": new_posterior, "diagnostics": diagnostics}
@@ -1,5 +1,10 @@
 from barry.samplers.dynesty_sampler import DynestySampler
 from barry.samplers.ensemble import EnsembleSampler
+from barry.samplers.grid import GridSampler
+from barry.samplers.laplace import LaplaceSampler
 from barry.samplers.metropolisHastings import MetropolisHastings
+from barry.samplers.multi_chain_mh import MultiChainMetropolisHastings
+from barry.samplers.smc import SMCSampler
+from barry.samplers.pool import SerialPool, ThreadPool, ProcessPool, MPIPool, get_pool
 
-__all__ = ["EnsembleSampler", "DynestySampler", "MetropolisHastings"]
+__all__ = ["EnsembleSampler", "DynestySampler", "MetropolisHastings", "MultiChainMetropolisHastings", "LaplaceSampler", "GridSampler", "SMCSampler", "SerialPool", "ThreadPool", "ProcessPool", "MPIPool", "get_pool"]
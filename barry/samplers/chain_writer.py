@@ -0,0 +1,154 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MAGIC = b"BARRYAPP"
+ALIGNMENT = 64
+
+
+def _align(n):
+    return n + (-n % ALIGNMENT)
+
+
+def create_appendable(filename, width, dtype=np.float64, **meta):
+    """ Creates an empty append only file of rows.
+
+    The file starts with the magic bytes, the length of a JSON header and the header itself (holding the dtype, row
+    width and any extra metadata), padded so the rows start aligned. Rows are then simply appended to the end of the
+    file, so the number of rows is given by the file size, and a partially written row from a crash is ignored.
+
+    Parameters
+    ----------
+    filename : str
+        Where to create the file
+    width : int
+        The number of elements in each row
+    dtype : np.dtype, optional
+        The type to store rows as. Defaults to float64, so resumed samplers continue from exactly where they stopped.
+    meta : kwargs, optional
+        Any (JSON serialisable) information to keep in the header
+    """
+    header = json.dumps({"dtype": np.dtype(dtype).str, "width": int(width), "meta": meta}).encode("utf-8")
+    tmp = filename + f".{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        f.write(b"\0" * (_align(len(MAGIC) + 8 + len(header)) - f.tell()))
+    os.replace(tmp, filename)
+
+
+def read_appendable_header(filename):
+    """ Returns the header of an append only file, and the offset its rows start at """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not an append only chain file")
+        length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, _align(len(MAGIC) + 8 + length)
+
+
+def get_num_rows(filename):
+    """ Returns how many complete rows an append only file has, without reading them """
+    header, start = read_appendable_header(filename)
+    row_size = header["width"] * np.dtype(header["dtype"]).itemsize
+    return (os.path.getsize(filename) - start) // row_size
+
+
+def read_appendable(filename, start=0, stop=None):
+    """ Memory maps the rows of an append only file.
+
+    Parameters
+    ----------
+    filename : str
+        The file to read
+    start : int, optional
+        The first row to read. Negative values count back from the end, so the tail of a file can be read without the rest.
+    stop : int, optional
+        One past the last row to read. Defaults to the last complete row.
+
+    Returns
+    -------
+    rows : np.ndarray
+        A read only array of shape `(num_rows, width)`
+    """
+    header, offset = read_appendable_header(filename)
+    dtype = np.dtype(header["dtype"])
+    rows = np.arange(get_num_rows(filename))[start:stop]
+    if rows.size == 0:
+        return np.zeros((0, header["width"]), dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode="r", offset=offset + rows[0] * header["width"] * dtype.itemsize, shape=(rows.size, header["width"]))
+
+
+def truncate_appendable(filename, num_rows):
+    """ Drops every row after the first `num_rows`, along with any partially written row """
+    header, start = read_appendable_header(filename)
+    row_size = header["width"] * np.dtype(header["dtype"]).itemsize
+    with open(filename, "r+b") as f:
+        f.truncate(start + min(num_rows, get_num_rows(filename)) * row_size)
+
+
+def append_rows(filename, rows):
+    """ Appends rows to the end of an append only file, converting them to the files dtype """
+    header, _ = read_appendable_header(filename)
+    rows = np.ascontiguousarray(rows, dtype=header["dtype"]).reshape((-1, header["width"]))
+    with open(filename, "ab") as f:
+        f.write(rows.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def save_atomic(filename, save, *args, **kwargs):
+    """ Calls `save(file, *args, **kwargs)` on a temporary file and then renames it over `filename`.
+
+    Used for the small files that are overwritten each time, like the current sampler position, so a crash part
+    way through a write never leaves a corrupt file behind.
+    """
+    directory, name = os.path.split(filename)
+    tmp = os.path.join(directory, f".{os.getpid()}.{name}")
+    with open(tmp, "wb") as f:
+        save(f, *args, **kwargs)
+    os.replace(tmp, filename)
+
+
+class BackgroundWriter(object):
+    """ Runs writes to disk in order on a background thread, so a sampler never has to wait on I/O.
+
+    Any array passed in is copied straight away, so the sampler can keep modifying its own. If a write fails, the
+    error is raised from the next call to `submit` or `flush`.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("barry")
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+
+    def _check(self, wait=False):
+        remaining = []
+        for future in self.futures:
+            if wait or future.done():
+                future.result()
+            else:
+                remaining.append(future)
+        self.futures = remaining
+
+    def submit(self, func, *args, **kwargs):
+        """ Queues up `func(*args, **kwargs)` to run after every write submitted so far """
+        self._check()
+        args = [np.array(a) if isinstance(a, np.ndarray) else a for a in args]
+        self.futures.append(self.executor.submit(func, *args, **kwargs))
+
+    def append(self, filename, rows):
+        """ Queues up appending rows to an append only file """
+        self.submit(append_rows, filename, rows)
+
+    def flush(self):
+        """ Waits for every queued write to finish """
+        self._check(wait=True)
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown()
@@ -1,15 +1,47 @@
 import logging
 import os
+import signal
 import numpy as np
 from barry.samplers.sampler import Sampler
 
 
+class _Interrupted(Exception):
+    """ Raised from the signal handler to stop a fit, so that it can be checkpointed """
+
+
 class DynestySampler(Sampler):
-    def __init__(self, temp_dir=None, max_iter=None, nlive=500):
+    """ Nested sampling using dynesty.
+
+    If a temporary directory is given, dynesty checkpoints the state of the sampler to it every `checkpoint_interval`
+    seconds, and a fit which was killed part way through will resume from its last checkpoint when rerun. On
+    SIGTERM (which SLURM sends before killing a job at its walltime) or SIGUSR1, a checkpoint is written
+    straight away and the fit exits. The likelihood and prior transform are saved with the checkpoint, so they
+    need to be picklable, as they do for a pool.
+
+    Parameters
+    ----------
+    temp_dir : str, optional
+        The directory to save chains and checkpoints to
+    max_iter : int, optional
+        The maximum number of iterations to run
+    nlive : int, optional
+        The number of live points
+    checkpoint_interval : float, optional
+        How many seconds between checkpoints. Set to None to only checkpoint when signalled.
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, new live points are proposed and evaluated in parallel using this pool. See `barry.samplers.pool.get_pool`.
+    queue_size : int, optional
+        How many live points to propose at once. Defaults to the size of the pool.
+    """
+
+    def __init__(self, temp_dir=None, max_iter=None, nlive=500, checkpoint_interval=600, pool=None, queue_size=None):
 
         self.logger = logging.getLogger("barry")
         self.max_iter = max_iter
         self.nlive = nlive
+        self.checkpoint_interval = checkpoint_interval
+        self.pool = pool
+        self.queue_size = queue_size
         # dynesty.utils.merge_runs()
         self.temp_dir = temp_dir
         if temp_dir is not None and not os.path.exists(temp_dir):
@@ -18,7 +50,43 @@ class DynestySampler(Sampler):
     def get_filename(self, uid):
         return os.path.join(self.temp_dir, f"{uid}_chain.npy")
 
-    def fit(self, log_likelihood, start, num_dim, prior_transform, save_dims=None, uid=None):
+    def get_checkpoint_filename(self, uid):
+        return os.path.join(self.temp_dir, f"{uid}_dynesty.save")
+
+    def _save_checkpoint(self, sampler, filename):
+        # Proposals waiting in the queue may be part way through being evaluated, so they are dropped and proposed again
+        sampler.queue, sampler.nqueue = [], 0
+        sampler.save(filename)
+        self.logger.info(f"Checkpointed sampler at iteration {sampler.it} to {filename}")
+
+    def _run(self, sampler, checkpoint_file, resume):
+        """ Runs the sampler to completion, letting dynesty checkpoint periodically, and checkpointing when signalled to stop """
+        if checkpoint_file is None:
+            sampler.run_nested(maxiter=self.max_iter, print_progress=False)
+            return
+
+        def handler(signum, frame):
+            raise _Interrupted(signum)
+
+        previous = {}
+        for s in [signal.SIGTERM, signal.SIGUSR1]:
+            try:
+                previous[s] = signal.signal(s, handler)
+            except ValueError:  # Signal handlers can only be installed from the main thread
+                self.logger.debug("Not in the main thread, cannot checkpoint on signals")
+        try:
+            periodic = None if self.checkpoint_interval is None else checkpoint_file
+            every = 60 if self.checkpoint_interval is None else self.checkpoint_interval
+            sampler.run_nested(maxiter=self.max_iter, print_progress=False, checkpoint_file=periodic, checkpoint_every=every, resume=resume)
+        except _Interrupted as e:
+            self._save_checkpoint(sampler, checkpoint_file)
+            raise SystemExit(f"Received signal {e.args[0]}, checkpointed to {checkpoint_file} and exiting")
+        finally:
+            for s, h in previous.items():
+                signal.signal(s, h)
+
+    def fit(self, log_likelihood, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
+        # Nested sampling draws from the prior, so there is no burn in or proposal for a warm start to help with
 
         import dynesty
 
@@ -32,9 +100,20 @@ class DynestySampler(Sampler):
             save_dims = num_dim
         self.logger.debug("Fitting framework with %d dimensions" % num_dim)
         self.logger.info("Using dynesty Sampler")
-        sampler = dynesty.NestedSampler(log_likelihood, prior_transform, num_dim, nlive=self.nlive)
+        if self.pool is not None:
+            log_likelihood = self.pool.wrap(log_likelihood)
+            prior_transform = self.pool.wrap(prior_transform)
+        checkpoint_file = None if self.temp_dir is None else self.get_checkpoint_filename(uid)
+        resume = checkpoint_file is not None and os.path.exists(checkpoint_file)
+        if resume:
+            self.logger.info(f"Resuming from checkpoint {checkpoint_file}")
+            sampler = dynesty.NestedSampler.restore(checkpoint_file, pool=self.pool)
+            sampler.loglikelihood.loglikelihood = log_likelihood
+            sampler.prior_transform = prior_transform
+        else:
+            sampler = dynesty.NestedSampler(log_likelihood, prior_transform, num_dim, nlive=self.nlive, pool=self.pool, queue_size=self.queue_size)
 
-        sampler.run_nested(maxiter=self.max_iter, print_progress=False)
+        self._run(sampler, checkpoint_file, resume)
 
         self.logger.debug("Fit finished")
 
@@ -47,6 +126,8 @@ class DynestySampler(Sampler):
         mask = weights > trim
         likelihood = dresults["logl"]
         self._save(chain[mask, :], weights[mask], likelihood[mask], filename, logz[mask], save_dims)
+        if checkpoint_file is not None and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
         return {"chain": chain[mask, :], "weights": weights[mask], "posterior": likelihood[mask], "evidence": logz}
 
     def _save(self, chain, weights, likelihood, filename, logz, save_dims):
@@ -1,12 +1,14 @@
+import json
 import logging
 import os
 import numpy as np
+from barry.samplers.chain_writer import read_appendable, read_appendable_header
 from barry.samplers.hdemcee import EmceeWrapper
 from barry.samplers.sampler import Sampler
 
 
 class EnsembleSampler(Sampler):
-    def __init__(self, num_walkers=None, num_steps=1000, num_burn=300, temp_dir=None, save_interval=300):
+    def __init__(self, num_walkers=None, num_steps=1000, num_burn=300, temp_dir=None, save_interval=300, pool=None, adaptive=False, tau_factor=50, tau_tolerance=0.01, check_interval=100):
         """ Uses ``emcee`` and the `EnsembleSampler
         <http://dan.iel.fm/emcee/current/api/#emcee.EnsembleSampler>`_ to fit the supplied
         model.
@@ -22,20 +24,31 @@ class EnsembleSampler(Sampler):
             The number of walkers to run. If not supplied, it defaults to eight times the
             framework dimensionality
         num_steps : int, optional
-            The number of steps to run
+            The number of steps to run, or the maximum number of steps if ``adaptive`` is set
         num_burn : int, optional
-            The number of steps to discard for burn in
+            The number of steps to discard for burn in. Ignored if ``adaptive`` is set.
         temp_dir : str
             If set, specifies a directory in which to save temporary results, like the emcee chain
         save_interval : float
             The amount of seconds between saving the chain to file. Setting to ``None``
             disables serialisation.
+        pool : `barry.samplers.pool.SerialPool`, optional
+            If set, the walkers posteriors are evaluated in parallel using this pool. See `barry.samplers.pool.get_pool`.
+        adaptive : bool, optional
+            If set, the integrated autocorrelation time of each parameter is monitored while sampling, and the
+            chain stops once it is ``tau_factor`` times longer than every autocorrelation time and the estimates
+            have stabilised to within ``tau_tolerance``. The burn in is then set to twice the largest autocorrelation time.
+        tau_factor : float, optional
+            How many autocorrelation times long the chain must be to stop
+        tau_tolerance : float, optional
+            The largest fractional change in the autocorrelation times between checks to stop
+        check_interval : int, optional
+            How many steps between estimates of the autocorrelation time
         """
 
         self.logger = logging.getLogger("barry")
         self.chain = None
-        self.pool = None
-        self.master = True
+        self.pool = pool
         self.num_steps = num_steps
         self.num_burn = num_burn
         self.temp_dir = temp_dir
@@ -43,8 +56,12 @@ class EnsembleSampler(Sampler):
             os.makedirs(temp_dir, exist_ok=True)
         self.save_interval = save_interval
         self.num_walkers = num_walkers
+        self.adaptive = adaptive
+        self.tau_factor = tau_factor
+        self.tau_tolerance = tau_tolerance
+        self.check_interval = check_interval
 
-    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None):
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
         """ Runs the sampler over the model and returns the flat chain of results
 
         Parameters
@@ -63,6 +80,9 @@ class EnsembleSampler(Sampler):
             A unique identifier used to differentiate different fits
             if two fits both serialise their chains and use the
             same temporary directory
+        warm_start : `barry.warm_start.WarmStart`, optional
+            If given, only a fraction of the burn in is run, as the walkers
+            from ``start`` should already be spread like the posterior
         Returns
         -------
         dict
@@ -81,12 +101,14 @@ class EnsembleSampler(Sampler):
         self.logger.debug("Fitting framework with %d dimensions" % num_dim)
 
         self.logger.info("Using Ensemble Sampler")
-        sampler = emcee.EnsembleSampler(self.num_walkers, num_dim, log_posterior, live_dangerously=True)
+        if self.pool is not None:
+            log_posterior = self.pool.wrap(log_posterior)
+        sampler = emcee.EnsembleSampler(self.num_walkers, num_dim, log_posterior, pool=self.pool, live_dangerously=True)
 
         emcee_wrapper = EmceeWrapper(sampler)
         flat_chain = emcee_wrapper.run_chain(
             self.num_steps,
-            self.num_burn,
+            self.num_burn if warm_start is None else warm_start.get_num_burn(self.num_burn),
             self.num_walkers,
             num_dim,
             start=start,
@@ -94,16 +116,29 @@ class EnsembleSampler(Sampler):
             temp_dir=self.temp_dir,
             uid=uid,
             save_interval=self.save_interval,
+            adaptive=self.adaptive,
+            tau_factor=self.tau_factor,
+            tau_tolerance=self.tau_tolerance,
+            check_interval=self.check_interval,
         )
         self.logger.debug("Fit finished")
-        if self.pool is not None:  # pragma: no cover
-            self.pool.close()
-            self.logger.debug("Pool closed")
-        return {"chain": flat_chain, "weights": np.ones(flat_chain.shape[0])}
+        posterior = emcee_wrapper.posterior[:, emcee_wrapper.num_burn :].flatten()
+        return {"chain": flat_chain, "weights": np.ones(flat_chain.shape[0]), "posterior": posterior, "diagnostics": emcee_wrapper.diagnostics}
 
     def load_file(self, filename):
-        results = np.load(filename)
-        posterior = np.load(filename.replace("chain.npy", "prob.npy"))
-        flat_chain = results[:, self.num_burn :, :].reshape((-1, results.shape[2]))
-        flat_posterior = posterior[:, self.num_burn :].reshape((-1, 1))
-        return {"chain": flat_chain, "posterior": flat_posterior}
+        header, _ = read_appendable_header(filename)
+        num_walkers = header["meta"]["num_walkers"]
+        rows = read_appendable(filename)
+        results = rows[: rows.shape[0] - rows.shape[0] % num_walkers].reshape((-1, num_walkers, rows.shape[1]))
+        diagnostics_file = filename.replace("chain.bin", "diagnostics.json")
+        diagnostics = None
+        num_burn = self.num_burn
+        if os.path.exists(diagnostics_file):
+            with open(diagnostics_file) as f:
+                diagnostics = json.load(f)
+            num_burn = diagnostics["num_burn"]
+        # Walker major, to match the order chains are returned in by `fit`
+        results = results[num_burn:].swapaxes(0, 1)
+        flat_chain = results[:, :, 1:].reshape((-1, results.shape[2] - 1))
+        flat_posterior = results[:, :, 0].reshape((-1, 1))
+        return {"chain": flat_chain, "posterior": flat_posterior, "diagnostics": diagnostics}
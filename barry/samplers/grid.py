@@ -0,0 +1,156 @@
+import itertools
+import logging
+
+import numpy as np
+from scipy.special import logsumexp
+
+from barry.samplers.pool import get_batch_posterior
+from barry.samplers.sampler import Sampler
+
+
+class GridSampler(Sampler):
+    """ Evaluates the posterior on an adaptively refined grid, for models with only a few free parameters.
+
+    The prior volume (the extents of each parameter, from the prior transform) starts as a regular grid of cells,
+    with the posterior evaluated at the centre of each. At each level of refinement, every cell whose log posterior
+    is within `delta_posterior` of the maximum is split in half along each dimension. This stops once the evidence
+    changes by less than `logz_tolerance` between levels (after at least `min_levels`, as the
+    quantiles need a finer grid than the evidence does), or after `max_levels` levels. Each level is evaluated in
+    one batch, using the pool if given, or the models `get_posterior_batch` if it has one.
+
+    The output is the centre of every cell, weighted by its posterior mass, so the marginals, quantiles and
+    evidence all come from integrating over the grid. Unlike the stochastic samplers, the same fit always gives
+    the same result. The number of cells grows exponentially with the dimension, so this is only useful for up
+    to about three free parameters.
+
+    Parameters
+    ----------
+    num_points : int, optional
+        The number of cells along each dimension of the initial grid
+    min_levels : int, optional
+        The minimum number of times to refine the grid
+    max_levels : int, optional
+        The maximum number of times to refine the grid
+    delta_posterior : float, optional
+        Cells with a log posterior within this much of the maximum are refined
+    logz_tolerance : float, optional
+        Stop refining once the log evidence changes by less than this
+    max_dim : int, optional
+        Refuse to fit models with more free parameters than this
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, the posterior of each level is evaluated in parallel using this pool
+    """
+
+    def __init__(self, num_points=20, min_levels=2, max_levels=6, delta_posterior=12, logz_tolerance=0.01, max_dim=4, pool=None):
+        self.logger = logging.getLogger("barry")
+        self.num_points = num_points
+        self.min_levels = min_levels
+        self.max_levels = max_levels
+        self.delta_posterior = delta_posterior
+        self.logz_tolerance = logz_tolerance
+        self.max_dim = max_dim
+        self.pool = pool
+
+    def get_initial_grid(self, mins, maxes):
+        """ Returns the centres and half widths of a regular grid of cells covering the prior """
+        half_width = 0.5 * (maxes - mins) / self.num_points
+        axes = [np.linspace(lo + h, hi - h, self.num_points) for lo, hi, h in zip(mins, maxes, half_width)]
+        centres = np.array(np.meshgrid(*axes, indexing="ij")).reshape((len(axes), -1)).T
+        return centres, half_width
+
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
+        """ Integrates the posterior over an adaptive grid, ignoring the starting position.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the centre, weight and log posterior of every cell, the log evidence, and
+            diagnostics holding the number of evaluations and levels, the change in evidence over the last
+            level, and whether that was within `logz_tolerance`
+        """
+        evaluate = get_batch_posterior(log_posterior, self.pool)
+        return self.fit_batch(lambda x: np.asarray(evaluate(x), dtype=np.float64)[:, None], num_dim, prior_transform, save_dims=save_dims)[0]
+
+    def fit_batch(self, log_posteriors, num_dim, prior_transform, save_dims=None):
+        """ Integrates many posteriors over the same parameters at once, sharing one grid between them.
+
+        A cell is refined if it is within `delta_posterior` of the maximum of any of the posteriors, and refining
+        stops once every evidence has converged. This is used to fit many realisations of a dataset at once,
+        where computing the model at each point is the expensive part, and the posteriors differ only slightly.
+
+        Parameters
+        ----------
+        log_posteriors : function
+            Takes a `(num_points, num_dim)` array and returns the `(num_points, num_posteriors)` log posteriors
+        num_dim : int
+            The number of parameters
+        prior_transform : function
+            Transforms from the unit hypercube to the parameters, giving their extents
+        save_dims : int, optional
+            Only return values for the first ``save_dims`` parameters.
+
+        Returns
+        -------
+        list[dict]
+            The result for each posterior, in the same format as `fit`
+        """
+        if num_dim > self.max_dim:
+            raise ValueError(f"A grid over {num_dim} dimensions is too large, use another sampler or raise max_dim")
+        mins, maxes = self.get_bounds(prior_transform, num_dim)
+        if not np.all(np.isfinite(maxes - mins)):
+            raise ValueError("The grid sampler needs a prior transform to give each parameter finite extents")
+        # Every combination of moving half way to the edge of a cell, which gives the centres of its children
+        signs = np.array(list(itertools.product([-0.5, 0.5], repeat=num_dim)))
+
+        centres, half_width = self.get_initial_grid(mins, maxes)
+        levels = np.zeros(centres.shape[0], dtype=int)
+        posteriors = np.asarray(log_posteriors(centres), dtype=np.float64)
+        num_evaluations = centres.shape[0]
+        if not np.all(np.any(np.isfinite(posteriors), axis=0)):
+            raise ValueError("The posterior is not finite anywhere on the initial grid")
+        logz, change, level = self._get_logz(posteriors, levels, half_width), np.full(posteriors.shape[1], np.inf), 0
+        self.logger.info(f"Initial grid of {centres.shape[0]} cells has log evidence {np.max(logz):0.3f}")
+
+        while level < self.max_levels and (level < self.min_levels or np.any(change > self.logz_tolerance)):
+            refine = np.any(posteriors > posteriors.max(axis=0) - self.delta_posterior, axis=1)
+            parents, parent_levels = centres[refine], levels[refine]
+            widths = half_width * 0.5 ** parent_levels[:, None]
+            children = (parents[:, None, :] + signs[None, :, :] * widths[:, None, :]).reshape((-1, num_dim))
+            child_posteriors = np.asarray(log_posteriors(children), dtype=np.float64)
+            num_evaluations += children.shape[0]
+
+            centres = np.concatenate((centres[~refine], children))
+            levels = np.concatenate((levels[~refine], np.repeat(parent_levels + 1, signs.shape[0])))
+            posteriors = np.concatenate((posteriors[~refine], child_posteriors))
+            new_logz = self._get_logz(posteriors, levels, half_width)
+            change, logz, level = np.abs(new_logz - logz), new_logz, level + 1
+            self.logger.info(f"Refined {refine.sum()} cells to {centres.shape[0]}, log evidence changed by up to {np.max(change):0.3f}")
+
+        converged = change <= self.logz_tolerance
+        if not np.all(converged):
+            self.logger.warning(f"Grid evidence changed by up to {np.max(change):0.3f} at the last level, consider raising max_levels")
+        log_mass = self._get_log_mass(posteriors, levels, half_width)
+        log_volume = np.sum(np.log(maxes - mins))
+        results = []
+        for i in range(posteriors.shape[1]):
+            keep = np.isfinite(log_mass[:, i])
+            chain = centres[keep] if save_dims is None else centres[keep, :save_dims]
+            diagnostics = {"num_evaluations": num_evaluations, "num_levels": level, "logz_change": change[i], "converged": bool(converged[i])}
+            results.append(
+                {
+                    "chain": chain,
+                    "weights": np.exp(log_mass[keep, i] - log_mass[keep, i].max()),
+                    "posterior": posteriors[keep, i],
+                    "evidence": np.full(chain.shape[0], logz[i] - log_volume),
+                    "diagnostics": diagnostics,
+                }
+            )
+        return results
+
+    def _get_log_mass(self, posteriors, levels, half_width):
+        """ The log of each posterior times the volume of each cell """
+        log_volume = np.sum(np.log(2 * half_width)) - levels * half_width.size * np.log(2)
+        return np.where(np.isfinite(posteriors), posteriors + log_volume[:, None], -np.inf)
+
+    def _get_logz(self, posteriors, levels, half_width):
+        return logsumexp(self._get_log_mass(posteriors, levels, half_width), axis=0)
@@ -1,8 +1,19 @@
 from time import time
+import json
 import logging
 import numpy as np
 import os
 
+from barry.samplers.chain_writer import (
+    BackgroundWriter,
+    create_appendable,
+    get_num_rows,
+    read_appendable,
+    read_appendable_header,
+    save_atomic,
+    truncate_appendable,
+)
+
 
 class EmceeWrapper(object):
     def __init__(self, sampler):
@@ -10,28 +21,69 @@ class EmceeWrapper(object):
         self.logger = logging.getLogger("barry")
         self.chain = None
         self.posterior = None
+        self.num_burn = None
+        self.tau_history = []
+        self.diagnostics = None
+
+    def run_chain(
+        self,
+        num_steps,
+        num_burn,
+        num_walkers,
+        num_dim,
+        start=None,
+        save_interval=300,
+        save_dim=None,
+        temp_dir=None,
+        uid="ensemble",
+        adaptive=False,
+        tau_factor=50,
+        tau_tolerance=0.01,
+        check_interval=100,
+    ):
+        """ Runs the ensemble sampler, resuming from any chain saved in the temporary directory.
 
-    def run_chain(self, num_steps, num_burn, num_walkers, num_dim, start=None, save_interval=300, save_dim=None, temp_dir=None, uid="ensemble"):
-        assert num_steps > num_burn, "num_steps has to be larger than num_burn"
+        In adaptive mode, the integrated autocorrelation time of each parameter is estimated every
+        `check_interval` steps, and sampling stops early once the chain is longer than `tau_factor` times every
+        estimate and the estimates have changed by less than `tau_tolerance` (fractionally) since the last check.
+        The burn in is then set to twice the largest autocorrelation time, and `num_burn` is ignored.
+        `num_steps` becomes the maximum number of steps to take.
+        """
+        if not adaptive:
+            assert num_steps > num_burn, "num_steps has to be larger than num_burn"
         if save_dim is not None:
             assert save_dim <= num_dim, "You cannot save more dimensions than you actually have"
         else:
             save_dim = num_dim
+        self.num_burn = num_burn
+        self.tau_history = []
+        self.diagnostics = None
 
+        # Each step appends one row per walker of the log posterior and every parameter to the chain file,
+        # so the walkers can be restarted from the last step without any other files
         past_chain = None
         pos = None
+        chain_file = None
         if temp_dir is not None:
             self.logger.debug("Looking in temp dir %s" % temp_dir)
-            chain_file = os.path.join(temp_dir, uid + "_ens.chain.npy")
-            position_file = os.path.join(temp_dir, uid + "_ens.pos.npy")
-            posterior_file = os.path.join(temp_dir, uid + "_ens.prob.npy")
-            try:
-                pos = np.load(position_file)
-                past_chain = np.load(chain_file)
-                past_posterior = np.load(posterior_file)
-                self.logger.info("Found chain of %d steps" % past_chain.shape[1])
-            except IOError:
-                self.logger.info("Prior chain and/or does not exist. Looked in %s" % position_file)
+            chain_file = os.path.join(temp_dir, uid + "_ens.chain.bin")
+            diagnostics_file = os.path.join(temp_dir, uid + "_ens.diagnostics.json")
+            if os.path.exists(chain_file):
+                header, _ = read_appendable_header(chain_file)
+                assert header["width"] == num_dim + 1 and header["meta"]["num_walkers"] == num_walkers, f"{chain_file} is from a different sampler setup"
+                # Drop any partially written step. Steps beyond num_steps are kept on disk, and only cut in memory.
+                rows = get_num_rows(chain_file)
+                past_steps = rows // num_walkers
+                truncate_appendable(chain_file, rows - rows % num_walkers)
+                if past_steps:
+                    pos = np.array(read_appendable(chain_file, start=-num_walkers)[:, 1:], dtype=np.float64)
+                    past_chain = read_appendable(chain_file).reshape((past_steps, num_walkers, num_dim + 1))
+                self.logger.info("Found chain of %d steps" % past_steps)
+            else:
+                self.logger.info("Prior chain does not exist. Looked in %s" % chain_file)
+        do_save = temp_dir is not None and save_interval is not None
+        if do_save and not os.path.exists(chain_file):
+            create_appendable(chain_file, num_dim + 1, num_walkers=num_walkers)
 
         if start is None and pos is None:
             raise ValueError("You need to have either a starting function or existing chains")
@@ -42,37 +94,97 @@ class EmceeWrapper(object):
         step = 0
         self.chain = np.zeros((num_walkers, num_steps, save_dim))
         self.posterior = np.zeros((num_walkers, num_steps))
-        if past_chain is not None and past_posterior is not None:
-            step = min(past_chain.shape[1], num_steps)
+        if past_chain is not None:
+            step = min(past_chain.shape[0], num_steps)
             num = num_steps - step
-            self.chain[:, :step, :] = past_chain[:, :step, :]
-            self.posterior[:, :step] = past_posterior[:, :step]
+            self.chain[:, :step, :] = past_chain[:step, :, 1 : 1 + save_dim].swapaxes(0, 1)
+            self.posterior[:, :step] = past_chain[:step, :, 0].T
             self.logger.debug("A further %d steps are required" % num)
         else:
             num = num_steps
             self.logger.debug("Running full chain of %d steps" % num)
         t = time()
 
-        if step == num_steps:
+        # A resumed chain may have converged already, if the job was killed just before it could finish.
+        # Redo the last two convergence checks on the saved steps, so the history matches an uninterrupted run.
+        converged = False
+        last_check = step - step % check_interval
+        if adaptive and last_check >= 2 * check_interval:
+            self.tau_history = [self.get_autocorrelation_time(last_check - check_interval)]
+            converged = self._check_convergence(last_check, tau_factor, tau_tolerance)
+        if step == num_steps or converged:
             self.logger.debug("Returning serialised data from %s" % temp_dir)
-            return self.get_results(num_burn)
+            self._finish(step, adaptive, converged)
+            if past_chain is not None:
+                save_atomic(diagnostics_file, self._save_diagnostics)
+            return self.get_results(self.num_burn)
         else:
             self.logger.debug("Starting sampling. Saving to %s ever %d seconds" % (temp_dir, save_interval))
 
-        for state in self.sampler.sample(pos, iterations=num, store=False):
-            self.chain[:, step, :] = state.coords[:, :save_dim]
-            self.posterior[:, step] = state.log_prob
-            step += 1
-            if step == 1 or temp_dir is not None and save_interval is not None:
-                t2 = time()
-                if temp_dir is not None and (step == 1 or t2 - t > save_interval or step == num_steps):
-                    t = t2
-                    position = state.coords
-                    np.save(position_file, position)
-                    np.save(chain_file, self.chain[:, :step, :].astype(np.float32))
-                    np.save(posterior_file, self.posterior[:, :step].astype(np.float32))
-                    self.logger.debug("Saving chain with %d steps" % step)
-        return self.get_results(num_burn)
+        # Only the steps since the last save are kept in full, and they are written out in the background
+        writer = BackgroundWriter() if do_save else None
+        unsaved = []
+        try:
+            for state in self.sampler.sample(pos, iterations=num, store=False):
+                self.chain[:, step, :] = state.coords[:, :save_dim]
+                self.posterior[:, step] = state.log_prob
+                step += 1
+                converged = adaptive and step % check_interval == 0 and self._check_convergence(step, tau_factor, tau_tolerance)
+                done = converged or step == num_steps
+                if done:
+                    self._finish(step, adaptive, converged)
+                if writer is not None:
+                    unsaved.append(np.hstack((state.log_prob[:, None], state.coords)))
+                    t2 = time()
+                    if step == 1 or t2 - t > save_interval or done:
+                        t = t2
+                        writer.append(chain_file, np.concatenate(unsaved))
+                        unsaved = []
+                        if done:
+                            writer.submit(save_atomic, diagnostics_file, self._save_diagnostics)
+                        self.logger.debug("Saving chain with %d steps" % step)
+                if converged:
+                    self.logger.info(f"Chain converged after {step} steps, with autocorrelation times {self.tau_history[-1]}")
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.get_results(self.num_burn)
+
+    def get_autocorrelation_time(self, step):
+        """ Estimates the integrated autocorrelation time of each (saved) parameter from the first `step` steps """
+        from emcee.autocorr import integrated_time
+
+        # We check convergence ourselves, so ask for an estimate regardless of the chain length
+        return integrated_time(self.chain[:, :step, :].swapaxes(0, 1), tol=0)
+
+    def _check_convergence(self, step, tau_factor, tau_tolerance):
+        tau = self.get_autocorrelation_time(step)
+        previous = self.tau_history[-1] if self.tau_history else None
+        self.tau_history.append(tau)
+        self.logger.debug(f"Autocorrelation times at step {step} are {tau}")
+        if previous is None:
+            return False
+        return bool(np.all(tau * tau_factor < step) and np.all(np.abs(previous - tau) / tau < tau_tolerance))
+
+    def _save_diagnostics(self, f):
+        f.write(json.dumps(self.diagnostics).encode("utf-8"))
+
+    def _finish(self, step, adaptive, converged):
+        """ Trims the chain to the steps taken and records the autocorrelation diagnostics """
+        self.chain = self.chain[:, :step, :]
+        self.posterior = self.posterior[:, :step]
+        tau = self.tau_history[-1] if self.tau_history else self.get_autocorrelation_time(step)
+        if adaptive:
+            self.num_burn = min(int(np.ceil(2 * np.max(tau))), step // 2)
+        num_samples = self.chain.shape[0] * (step - self.num_burn)
+        self.diagnostics = {
+            "tau": [float(x) for x in tau],
+            "ess": [float(x) for x in num_samples / tau],
+            "num_burn": self.num_burn,
+            "num_steps": step,
+            "converged": bool(converged),
+        }
 
     def get_results(self, num_burn):
         return self.chain[:, num_burn:, :].reshape((-1, self.chain.shape[2]))
@@ -0,0 +1,160 @@
+import logging
+
+import numpy as np
+from scipy.optimize import minimize
+
+from barry.samplers.pool import get_batch_posterior
+from barry.samplers.sampler import Sampler
+
+
+def get_hessian(evaluate, x0, f0, steps):
+    """ Computes the Hessian of a function with central finite differences, evaluating every point in one batch.
+
+    Parameters
+    ----------
+    evaluate : function
+        Takes a `(num_points, num_dim)` array and returns the function value at each point
+    x0 : np.ndarray
+        Where to compute the Hessian
+    f0 : float
+        The function value at `x0`
+    steps : np.ndarray
+        The step size to use for each dimension
+
+    Returns
+    -------
+    hessian : np.ndarray
+        The `(num_dim, num_dim)` Hessian
+    values : np.ndarray
+        The function value at every point that was evaluated, so callers can check they were all finite
+    """
+    num_dim = x0.size
+    offsets = np.diag(steps)
+    pairs = [(i, j) for i in range(num_dim) for j in range(i + 1, num_dim)]
+    points = [x0 + offsets[i] for i in range(num_dim)] + [x0 - offsets[i] for i in range(num_dim)]
+    for i, j in pairs:
+        points += [x0 + offsets[i] + offsets[j], x0 + offsets[i] - offsets[j], x0 - offsets[i] + offsets[j], x0 - offsets[i] - offsets[j]]
+    values = np.asarray(evaluate(np.array(points)), dtype=np.float64)
+
+    hessian = np.zeros((num_dim, num_dim))
+    plus, minus = values[:num_dim], values[num_dim : 2 * num_dim]
+    hessian[np.diag_indices(num_dim)] = (plus - 2 * f0 + minus) / steps ** 2
+    for n, (i, j) in enumerate(pairs):
+        pp, pm, mp, mm = values[2 * num_dim + 4 * n : 2 * num_dim + 4 * (n + 1)]
+        hessian[i, j] = hessian[j, i] = (pp - pm - mp + mm) / (4 * steps[i] * steps[j])
+    return hessian, values
+
+
+class LaplaceSampler(Sampler):
+    """ Approximates the posterior as a Gaussian about its maximum.
+
+    The maximum posterior is found with a local optimisation from the starting point, and the covariance is the
+    inverse of the negative Hessian there, computed with finite differences. All the points needed for the Hessian
+    are evaluated in one batch, using the pool if given, or the models `get_posterior_batch` if it has one.
+    Parameters the model is linear in (like the polynomial marginalisation terms) have a quadratic log posterior,
+    so their block of the Hessian is exact.
+
+    The result is a sample drawn from the Gaussian (truncated to the prior), in the same format as the other
+    samplers, along with the exact mean and standard deviation of the Gaussian in the diagnostics, and the
+    Laplace approximation to the evidence. A fit takes a few hundred posterior evaluations, so this is useful
+    for looking at the bias and scatter of parameters over many mocks, but it will be wrong for posteriors which
+    are far from Gaussian or pressed up against a prior boundary.
+
+    Parameters
+    ----------
+    num_samples : int, optional
+        How many samples to draw from the Gaussian
+    step : float, optional
+        The finite difference step size, as a fraction of each parameters standard deviation
+    maxiter : int, optional
+        The maximum number of iterations of the Nelder-Mead optimisation to the maximum posterior
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, the points for the Hessian are evaluated in parallel using this pool
+    """
+
+    def __init__(self, num_samples=10000, step=0.1, maxiter=2000, pool=None):
+        self.logger = logging.getLogger("barry")
+        self.num_samples = num_samples
+        self.step = step
+        self.maxiter = maxiter
+        self.pool = pool
+
+    def _get_best_fit(self, log_posterior, start, num_dim, scale):
+        if callable(start):
+            start = start(num_walkers=1)
+        x0 = np.asarray(start, dtype=np.float64).reshape(num_dim)
+
+        # Optimise in units of the prior width, so the simplex tolerances mean the same thing for every parameter
+        def minimise(x):
+            return -log_posterior(list(x0 + x * scale))
+
+        res = minimize(minimise, np.zeros(num_dim), method="Nelder-Mead", options={"maxiter": self.maxiter, "xatol": 1e-6, "fatol": 1e-8})
+        if not res.success:
+            self.logger.warning(f"Optimisation to the maximum posterior did not converge: {res.message}")
+        return x0 + res.x * scale, -res.fun, res.nfev
+
+    def _get_hessian(self, evaluate, best_fit, max_posterior, steps):
+        """ Computes the Hessian, halving the step of any parameter whose stencil leaves the prior """
+        num_evaluations = 0
+        for _ in range(10):
+            hessian, values = get_hessian(evaluate, best_fit, max_posterior, steps)
+            num_evaluations += values.size
+            bad = ~np.isfinite(values[: 2 * best_fit.size].reshape((2, -1))).all(axis=0)
+            if not bad.any() and np.isfinite(hessian).all():
+                return hessian, num_evaluations
+            steps = np.where(bad, steps / 2, steps)
+        raise ValueError(f"Could not find a finite Hessian, the best fit {best_fit} may be on a prior boundary")
+
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
+        """ Finds the Laplace approximation to the posterior, and draws a sample from it.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the chain, weights, the log posterior of the Gaussian approximation, and the
+            Laplace evidence for each sample, as well as diagnostics holding the mean and standard deviation of
+            each parameter, whether the Hessian was negative definite, and the number of posterior evaluations
+        """
+        mins, maxes = self.get_bounds(prior_transform, num_dim)
+        widths = np.where(np.isfinite(maxes - mins), maxes - mins, 1.0)
+        best_fit, max_posterior, num_evaluations = self._get_best_fit(log_posterior, start, num_dim, widths)
+        self.logger.info(f"Found maximum posterior {max_posterior:0.3f} at {best_fit}")
+
+        # A first pass with small steps gives the scale of each parameter, which sets the steps for the second
+        evaluate = get_batch_posterior(log_posterior, self.pool)
+        hessian, n = self._get_hessian(evaluate, best_fit, max_posterior, 1e-3 * widths)
+        num_evaluations += n
+        curvature = -np.diag(hessian)
+        scales = np.where(curvature > 0, 1 / np.sqrt(np.abs(curvature)), 1e-3 * widths)
+        hessian, n = self._get_hessian(evaluate, best_fit, max_posterior, self.step * np.minimum(scales, widths))
+        num_evaluations += n
+
+        # Force the precision matrix to be positive definite, so there is always a Gaussian to return
+        eigenvalues, eigenvectors = np.linalg.eigh(-0.5 * (hessian + hessian.T))
+        positive_definite = bool(np.all(eigenvalues > 0))
+        if not positive_definite:
+            self.logger.warning("The Hessian is not negative definite, so the maximum posterior was not found. Flipping negative curvatures.")
+            eigenvalues = np.maximum(np.abs(eigenvalues), 1e-12 * np.abs(eigenvalues).max())
+        covariance = (eigenvectors / eigenvalues) @ eigenvectors.T
+        std = np.sqrt(np.diag(covariance))
+
+        # Laplace evidence, with the flat prior normalised over its volume so it is comparable to nested sampling
+        log_volume = np.sum(np.log(widths))
+        logz = max_posterior + 0.5 * num_dim * np.log(2 * np.pi) + 0.5 * np.sum(np.log(1 / eigenvalues)) - log_volume
+
+        samples = np.random.multivariate_normal(best_fit, covariance, size=self.num_samples)
+        samples = samples[np.all((samples >= mins) & (samples <= maxes), axis=1)]
+        diff = (samples - best_fit) @ eigenvectors
+        posterior = max_posterior - 0.5 * np.sum(diff ** 2 * eigenvalues, axis=1)
+        if save_dims is not None:
+            samples, best_fit, std = samples[:, :save_dims], best_fit[:save_dims], std[:save_dims]
+
+        self.logger.info(f"Laplace approximation took {num_evaluations} posterior evaluations")
+        diagnostics = {"laplace_mean": list(best_fit), "laplace_std": list(std), "positive_definite": positive_definite, "num_evaluations": num_evaluations}
+        return {
+            "chain": samples,
+            "weights": np.ones(samples.shape[0]),
+            "posterior": posterior,
+            "evidence": np.full(samples.shape[0], logz),
+            "diagnostics": diagnostics,
+        }
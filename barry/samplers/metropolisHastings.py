@@ -3,6 +3,7 @@ import numpy as np
 from time import time
 import logging
 
+from barry.samplers.chain_writer import BackgroundWriter, create_appendable, read_appendable, save_atomic, truncate_appendable
 from barry.samplers.sampler import Sampler
 
 
@@ -35,6 +36,10 @@ class MetropolisHastings(Sampler):
     num_start : int, optional
         How many starting positions to trial, if the ``start`` value given
         is a function.
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, each step proposes as many points as the pool has workers and evaluates them in parallel,
+        accepting the first one that passes in the order they were proposed. This gives exactly the same chain
+        statistics as the serial sampler, as every proposal is made from the same position until one is accepted.
     """
 
     space = 3  # log posterior, sigma, weight
@@ -53,6 +58,7 @@ class MetropolisHastings(Sampler):
         accept_ratio=0.234,
         callback=None,
         plot_covariance=False,
+        pool=None,
     ):
         self.temp_dir = temp_dir
         if temp_dir is not None and not os.path.exists(temp_dir):
@@ -63,8 +69,10 @@ class MetropolisHastings(Sampler):
         self.save_dims = None
         self.callback = callback
         self.do_plot_covariance = plot_covariance
+        self.pool = pool
 
         self.num_burn = num_burn
+        self._num_burn = num_burn
         self.num_steps = num_steps
         self.sigma_adjust = sigma_adjust  # Also should be at least 5 x num_dim
         self.covariance_adjust = covariance_adjust
@@ -77,8 +85,10 @@ class MetropolisHastings(Sampler):
         self.chain_file = None
         self.covariance_file = None
         self.covariance_plot = None
+        self._writer = None
+        self._num_written = {"burn": 0, "chain": 0}
 
-    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None):
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
         """
         Fit the model
 
@@ -98,6 +108,8 @@ class MetropolisHastings(Sampler):
             A unique identifier used to differentiate different fits
             if two fits both serialise their chains and use the
             same temporary directory
+        warm_start : `barry.warm_start.WarmStart`, optional
+            If given, the burn in is shortened and starts with the proposal covariance of earlier fits
 
         Returns
         -------
@@ -108,48 +120,63 @@ class MetropolisHastings(Sampler):
             uid = "mh"
         self._update_temp_files(uid)
         self.save_dims = save_dims
-        self.log_posterior = log_posterior
+        self.log_posterior = log_posterior if self.pool is None else self.pool.wrap(log_posterior)
         self.start = start
+        self._writer = None
+        self._num_burn = self.num_burn if warm_start is None else warm_start.get_num_burn(self.num_burn)
         position, burnin, chain, covariance = self._load()
         if burnin is not None:
             self.logger.debug("Found burnin of size %d" % burnin.shape[0])
         if chain is not None:
             self.logger.debug("Found chain of size %d" % chain.shape[0])
-        position = self._ensure_position(position)
-        if self.save_dims is None:
-            self.save_dims = len(position) - self.space
-
-        if chain is None or burnin is None or burnin.shape[0] < self.num_burn:
-            position, covariance, burnin = self._do_burnin(position, burnin, covariance)
-            chain = None
-
-        if self.do_plot_covariance:
-            self.plot_covariance(burnin)
-
-        c, w, p = self._do_chain(position, covariance, chain=chain)
+        try:
+            if position is None and warm_start is not None:
+                position = self._ensure_position(position)
+                try:
+                    covariance = np.linalg.cholesky(warm_start.covariance)
+                    position[self.IND_S] = 1.0
+                except np.linalg.LinAlgError:
+                    self.logger.warning("Warm start covariance is not positive definite, learning it from scratch")
+            position = self._ensure_position(position)
+            if self.save_dims is None:
+                self.save_dims = len(position) - self.space
+
+            if chain is None or burnin is None or burnin.shape[0] < self._num_burn:
+                position, covariance, burnin = self._do_burnin(position, burnin, covariance)
+                chain = None
+
+            if self.do_plot_covariance:
+                self.plot_covariance(burnin)
+
+            c, w, p = self._do_chain(position, covariance, chain=chain)
+        finally:
+            # Make sure everything is on disk before the chain is read back in
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
         self.logger.info("Returning results")
         return {"chain": c, "weights": w, "posterior": p}
 
     def _do_burnin(self, position, burnin, covariance):
         if burnin is None:
             # Initialise burning to all zeros. 2 from posterior and step size
-            burnin = np.zeros((self.num_burn, position.size))
+            burnin = np.zeros((self._num_burn, position.size))
             step = 1
             burnin[0, :] = position
-        elif burnin.shape[0] < self.num_burn:
+        elif burnin.shape[0] < self._num_burn:
             step = burnin.shape[0]
             position = burnin[-1, :]
             # If we only saved part of the burnin to save size, add the rest in as zeros
-            burnin = np.vstack((burnin, np.zeros((self.num_burn - burnin.shape[0], position.size))))
+            burnin = np.vstack((burnin, np.zeros((self._num_burn - burnin.shape[0], position.size))))
         else:
-            step = self.num_burn
+            step = self._num_burn
         num_dim = position.size - self.space
         if covariance is None:
             covariance = np.identity(position.size - self.space)
 
         last_save_time = time()
         self.logger.info("Starting burn in")
-        while step < self.num_burn:
+        while step < self._num_burn:
             # If sigma adjust, adjust
             if step % self.sigma_adjust == 0 and step > 0:
                 burnin[step - 1, self.IND_S] = self._adjust_sigma_ratio(burnin, step)
@@ -164,7 +191,7 @@ class MetropolisHastings(Sampler):
             if self.callback is not None:
                 self.callback(burnin[step - 1, self.IND_P], burnin[step - 1, self.space : self.space + self.save_dims], weight=burnin[step - 1, self.IND_W])
             step += 1
-            if step == self.num_burn or (self._do_save and (time() - last_save_time) > self.save_interval):
+            if step == self._num_burn or (self._do_save and (time() - last_save_time) > self.save_interval):
                 self._save(burnin[step - 1, :], burnin[:step, :], None, covariance)
                 last_save_time = time()
 
@@ -199,9 +226,9 @@ class MetropolisHastings(Sampler):
 
     def _update_temp_files(self, uid):
         if self.temp_dir is not None:
-            self.position_file = self.temp_dir + os.sep + "%s_mh_position.npy" % uid
-            self.burn_file = self.temp_dir + os.sep + "%s_mh_burn.npy" % uid
-            self.chain_file = self.temp_dir + os.sep + "%s_mh_chain.npy" % uid
+            self.position_file = self.temp_dir + os.sep + "%s_mh_position.npz" % uid
+            self.burn_file = self.temp_dir + os.sep + "%s_mh_burn.bin" % uid
+            self.chain_file = self.temp_dir + os.sep + "%s_mh_chain.bin" % uid
             self.covariance_file = self.temp_dir + os.sep + "%s_mh_covariance.npy" % uid
             self.covariance_plot = self.temp_dir + os.sep + "%s_mh_covariance.png" % uid
 
@@ -260,55 +287,81 @@ class MetropolisHastings(Sampler):
         return p + step
 
     def _get_next_step(self, position, covariance, burnin=False):
-        attempts = 1
+        attempts = 0
         counter = 1
         past_pot = position[self.IND_P]
+        num_proposals = 1 if self.pool is None else self.pool.size
         while True:
-            pot = self._propose_point(position, covariance)
-            posterior = self.log_posterior(pot)
-            if posterior > past_pot or np.exp(posterior - past_pot) > np.random.uniform():
-                result = np.concatenate(([posterior, position[self.IND_S], 1], pot))
-                return result, attempts
-            else:
+            pots = [self._propose_point(position, covariance) for _ in range(num_proposals)]
+            posteriors = [self.log_posterior(pots[0])] if self.pool is None else self.pool.map(self.log_posterior, pots)
+            for pot, posterior in zip(pots, posteriors):
                 attempts += 1
-                counter += 1
-                if counter > 100 and burnin:
-                    position[self.IND_S] *= 0.9
-                    counter = 0
+                if posterior > past_pot or np.exp(posterior - past_pot) > np.random.uniform():
+                    result = np.concatenate(([posterior, position[self.IND_S], 1], pot))
+                    return result, attempts
+            counter += num_proposals
+            if counter > 100 and burnin:
+                position[self.IND_S] *= 0.9
+                counter = 0
 
     def load_file(self, filename):
-        result = np.load(filename)
+        result = read_appendable(filename)
         posterior = result[:, MetropolisHastings.IND_P]
         weight = result[:, MetropolisHastings.IND_W]
         chain = result[:, MetropolisHastings.space :]
         return {"posterior": posterior, "weights": weight, "chain": chain}
 
+    def _read_rows(self, filename, num_rows):
+        """ Reads the first `num_rows` of a burn in or chain file, dropping any written after the last position was saved """
+        if num_rows == 0 or not os.path.exists(filename):
+            return None
+        truncate_appendable(filename, num_rows)
+        return np.array(read_appendable(filename), dtype=np.float64)
+
     def _load(self):
-        position = None
+        self._num_written = {"burn": 0, "chain": 0}
+        position, burnin, chain, covariance = None, None, None, None
         if self.position_file is not None and os.path.exists(self.position_file):
-            position = np.load(self.position_file)
-        burnin = None
-        if self.burn_file is not None and os.path.exists(self.burn_file):
-            burnin = np.load(self.burn_file)
-        chain = None
-        if self.chain_file is not None and os.path.exists(self.chain_file):
-            chain = np.load(self.chain_file)
-        covariance = None
+            state = np.load(self.position_file)
+            position = state["position"]
+            self._num_written = {"burn": int(state["num_burn"]), "chain": int(state["num_chain"])}
+            burnin = self._read_rows(self.burn_file, self._num_written["burn"])
+            chain = self._read_rows(self.chain_file, self._num_written["chain"])
+            # The current position is the last step, which is not written until its weight is known
+            if chain is not None:
+                chain = np.vstack((chain, position[: chain.shape[1]]))
+            elif self._num_written["burn"] < self._num_burn:
+                burnin = position[None, :] if burnin is None else np.vstack((burnin, position))
         if self.covariance_file is not None and os.path.exists(self.covariance_file):
             covariance = np.load(self.covariance_file)
         return position, burnin, chain, covariance
 
+    def _append(self, name, filename, rows, total):
+        """ Queues up writing every row whose weight is final, which is all but the last until the end is reached """
+        final = rows.shape[0] if rows.shape[0] == total else rows.shape[0] - 1
+        if final > self._num_written[name]:
+            if not os.path.exists(filename):
+                create_appendable(filename, rows.shape[1])
+            self._writer.append(filename, rows[self._num_written[name] : final])
+            self._num_written[name] = final
+
     def _save(self, position, burnin, chain, covariance):
-        if position is not None and self.position_file is not None:
-            np.save(self.position_file, position)
-        if burnin is not None and self.burn_file is not None:
+        if self.position_file is None:
+            return
+        if self._writer is None:
+            self._writer = BackgroundWriter()
+        if burnin is not None:
             self.logger.info("Serialising results to file. Burnin has %d steps" % burnin.shape[0])
-            np.save(self.burn_file, burnin.astype(np.float32))
-        if chain is not None and self.chain_file is not None:
+            self._append("burn", self.burn_file, burnin, self._num_burn)
+        if chain is not None:
             self.logger.info("Serialising results to file. Chain has %d steps" % chain.shape[0])
-            np.save(self.chain_file, chain.astype(np.float32))
-        if covariance is not None and self.covariance_file is not None:
-            np.save(self.covariance_file, covariance)
+            self._append("chain", self.chain_file, chain, self.num_steps)
+        if covariance is not None:
+            self._writer.submit(save_atomic, self.covariance_file, np.save, covariance)
+        # Saved after the rows, so on resume any rows written past this position can be dropped
+        self._writer.submit(
+            save_atomic, self.position_file, np.savez, position=position.copy(), num_burn=self._num_written["burn"], num_chain=self._num_written["chain"]
+        )
 
     def plot_covariance(self, burnin):
         if self.covariance_plot is None:
@@ -0,0 +1,323 @@
+import os
+import json
+import logging
+from time import time
+
+import numpy as np
+
+from barry.samplers.chain_writer import BackgroundWriter, create_appendable, read_appendable, read_appendable_header, save_atomic, truncate_appendable
+from barry.samplers.pool import get_batch_posterior
+from barry.samplers.sampler import Sampler
+
+
+def get_rhat(n, means, variances):
+    """ Computes the Gelman-Rubin potential scale reduction factor of each parameter.
+
+    Parameters
+    ----------
+    n : int
+        The number of samples in each chain
+    means : np.ndarray
+        The mean of each parameter in each chain, of shape `(num_chains, num_dim)`
+    variances : np.ndarray
+        The (unbiased) variance of each parameter in each chain, of shape `(num_chains, num_dim)`
+
+    Returns
+    -------
+    rhat : np.ndarray
+        The R-hat of each parameter, which tends to one as the chains converge
+    """
+    within = variances.mean(axis=0)
+    between = means.var(axis=0, ddof=1)
+    return np.sqrt(((n - 1) / n * within + between) / within)
+
+
+def compress_chain(chain, posterior):
+    """ Collapses repeated steps (from rejected proposals) into weights.
+
+    Parameters
+    ----------
+    chain : np.ndarray
+        The positions of each chain, of shape `(num_chains, num_steps, num_dim)`
+    posterior : np.ndarray
+        The log posterior at each position, of shape `(num_chains, num_steps)`
+
+    Returns
+    -------
+    chain, weights, posterior : np.ndarray
+        The unique steps of every chain, one after the other, with how many steps each was repeated for
+    """
+    chains, weights, posteriors = [], [], []
+    for c, p in zip(chain, posterior):
+        if c.shape[0] == 0:
+            continue
+        moved = np.ones(c.shape[0], dtype=bool)
+        moved[1:] = np.any(c[1:] != c[:-1], axis=1)
+        index = np.flatnonzero(moved)
+        chains.append(c[index])
+        weights.append(np.diff(np.append(index, c.shape[0])))
+        posteriors.append(p[index])
+    if not chains:
+        return np.zeros((0, chain.shape[2])), np.zeros(0), np.zeros(0)
+    return np.concatenate(chains), np.concatenate(weights), np.concatenate(posteriors)
+
+
+class MultiChainMetropolisHastings(Sampler):
+    """ Metropolis Hastings that advances many chains in lockstep.
+
+    Every step proposes one new point for each chain, and evaluates them in one batch, using the pool if given,
+    or the models `get_posterior_batch` if it has one. During burn in, the step size and proposal covariance
+    are adapted using every chain at once. After burn in, the Gelman-Rubin R-hat of each parameter is updated
+    online, and sampling stops once every R-hat is below `rhat_target` (or `num_steps` is reached).
+
+    This lets one job replace running `MetropolisHastings` as many independent walkers, with a convergence
+    test between the chains. The chains are returned one after the other, with repeated steps collapsed into weights.
+
+    Parameters
+    ----------
+    num_chains : int, optional
+        The number of chains to run
+    num_burn : int, optional
+        The number of burn in steps each chain takes
+    num_steps : int, optional
+        The maximum number of steps each chain takes after burn in
+    rhat_target : float, optional
+        Stop once every parameter has an R-hat below this
+    check_interval : int, optional
+        How many steps between checking R-hat
+    sigma_adjust : int, optional
+        During the burn in, how many steps between adjustments to the step size
+    covariance_adjust : int, optional
+        During the burn in, how many steps between adjustments to the proposal covariance
+    accept_ratio : float, optional
+        The desired acceptance ratio
+    temp_dir : str, optional
+        The location of a folder to save the chains to, so a killed fit can resume
+    save_interval : float, optional
+        How many seconds should pass between saving
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, the proposals for each step are evaluated in parallel using this pool
+    """
+
+    def __init__(
+        self,
+        num_chains=8,
+        num_burn=2000,
+        num_steps=10000,
+        rhat_target=1.01,
+        check_interval=500,
+        sigma_adjust=100,
+        covariance_adjust=500,
+        accept_ratio=0.234,
+        temp_dir=None,
+        save_interval=300,
+        pool=None,
+    ):
+        self.logger = logging.getLogger("barry")
+        self.num_chains = num_chains
+        self.num_burn = num_burn
+        self._num_burn = num_burn
+        self.num_steps = num_steps
+        self.rhat_target = rhat_target
+        self.check_interval = check_interval
+        self.sigma_adjust = sigma_adjust
+        self.covariance_adjust = covariance_adjust
+        self.accept_ratio = accept_ratio
+        self.temp_dir = temp_dir
+        if temp_dir is not None and not os.path.exists(temp_dir):
+            os.makedirs(temp_dir, exist_ok=True)
+        self.save_interval = save_interval
+        self.pool = pool
+        self._do_save = temp_dir is not None and save_interval is not None
+        self._writer = None
+
+    def _get_start(self, start, num_dim):
+        if callable(start):
+            return np.atleast_2d(start(num_walkers=self.num_chains)).reshape((self.num_chains, num_dim))
+        return np.tile(np.asarray(start, dtype=np.float64), (self.num_chains, 1))
+
+    def _step(self, evaluate, positions, posteriors, sigma, chol):
+        proposals = positions + sigma * np.random.normal(size=positions.shape) @ chol.T
+        proposed = np.asarray(evaluate(proposals), dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            accept = np.log(np.random.uniform(size=proposed.size)) < proposed - posteriors
+        positions = np.where(accept[:, None], proposals, positions)
+        posteriors = np.where(accept, proposed, posteriors)
+        return positions, posteriors, accept
+
+    def get_filenames(self, uid):
+        return (
+            os.path.join(self.temp_dir, f"{uid}_mhk_chain.bin"),
+            os.path.join(self.temp_dir, f"{uid}_mhk_state.npz"),
+            os.path.join(self.temp_dir, f"{uid}_mhk_diagnostics.json"),
+        )
+
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
+        """ Runs the chains, returning them one after the other.
+
+        If given a `barry.warm_start.WarmStart`, the chains start with its covariance as their proposal, and
+        only run a fraction of the burn in.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the chain, weights and log posterior, and diagnostics holding the R-hat of each
+            parameter, whether the chains converged and how many steps they took
+        """
+        if uid is None:
+            uid = "mhk"
+        evaluate = get_batch_posterior(log_posterior, self.pool)
+        self._num_burn = self.num_burn if warm_start is None else warm_start.get_num_burn(self.num_burn)
+        chain_file, state_file, diagnostics_file = self.get_filenames(uid) if self.temp_dir is not None else (None, None, None)
+
+        state = self._load(chain_file, state_file, num_dim)
+        if state is None:
+            positions = self._get_start(start, num_dim)
+            state = {"positions": positions, "sigma": 0.1, "chol": np.identity(num_dim), "burn_step": 0, "past_chain": None}
+            if warm_start is not None:
+                try:
+                    state.update({"sigma": 2.38 / np.sqrt(num_dim), "chol": np.linalg.cholesky(np.atleast_2d(warm_start.covariance))})
+                except np.linalg.LinAlgError:
+                    self.logger.warning("Warm start covariance is not positive definite, learning it from scratch")
+        # Always recompute, as the posterior may have been saved at lower precision
+        posteriors = np.asarray(evaluate(state["positions"]), dtype=np.float64)
+
+        self._writer = BackgroundWriter() if self._do_save else None
+        try:
+            positions, posteriors, sigma, chol = self._do_burnin(
+                evaluate, state["positions"], posteriors, state["sigma"], state["chol"], state["burn_step"], chain_file, state_file
+            )
+            chain, posterior, diagnostics = self._do_chain(evaluate, positions, posteriors, sigma, chol, state["past_chain"], chain_file, state_file)
+            if self._writer is not None:
+                self._writer.submit(save_atomic, diagnostics_file, lambda f: f.write(json.dumps(diagnostics).encode("utf-8")))
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        if save_dims is not None:
+            chain = chain[:, :, :save_dims]
+        c, w, p = compress_chain(chain, posterior)
+        return {"chain": c, "weights": w, "posterior": p, "diagnostics": diagnostics}
+
+    def _save_state(self, state_file, positions, posteriors, sigma, chol, burn_step, num_chain_steps):
+        self._writer.submit(
+            save_atomic,
+            state_file,
+            np.savez,
+            positions=positions.copy(),
+            posteriors=posteriors.copy(),
+            sigma=sigma,
+            chol=chol.copy(),
+            burn_step=burn_step,
+            num_chain_steps=num_chain_steps,
+        )
+
+    def _load(self, chain_file, state_file, num_dim):
+        if state_file is None or not os.path.exists(state_file):
+            return None
+        saved = np.load(state_file)
+        assert saved["positions"].shape == (self.num_chains, num_dim), f"{state_file} is from a different sampler setup"
+        state = {k: saved[k] for k in ["positions", "sigma", "chol"]}
+        state["burn_step"] = int(saved["burn_step"])
+        num_chain_steps = int(saved["num_chain_steps"])
+        state["past_chain"] = None
+        if num_chain_steps:
+            # Anything written after the state was last saved is dropped, so the chain and positions agree
+            truncate_appendable(chain_file, num_chain_steps * self.num_chains)
+            state["past_chain"] = read_appendable(chain_file).reshape((num_chain_steps, self.num_chains, num_dim + 1))
+        self.logger.info(f"Resuming from burn in step {state['burn_step']} and chain step {num_chain_steps}")
+        return state
+
+    def _do_burnin(self, evaluate, positions, posteriors, sigma, chol, step, chain_file, state_file):
+        num_dim = positions.shape[1]
+        history = []
+        accepted, proposed = 0, 0
+        last_save_time = time()
+        if step < self._num_burn:
+            self.logger.info(f"Starting burn in of {self.num_chains} chains")
+        while step < self._num_burn:
+            positions, posteriors, accept = self._step(evaluate, positions, posteriors, sigma, chol)
+            history.append(positions)
+            accepted += accept.sum()
+            proposed += accept.size
+            step += 1
+            if step % self.sigma_adjust == 0:
+                actual_ratio = max(accepted / proposed, 1 / proposed)
+                sigma *= (actual_ratio / self.accept_ratio) ** (1.0 / num_dim)
+                self.logger.debug(f"Adjusting sigma: Want {self.accept_ratio:0.3f}, got {actual_ratio:0.3f}. Updating to {sigma:0.5f}")
+                accepted, proposed = 0, 0
+            if step % self.covariance_adjust == 0 and len(history) * self.num_chains > 10 * num_dim:
+                # The covariance is shared, so every chain contributes to it
+                samples = np.concatenate(history[len(history) // 2 :])
+                try:
+                    chol = np.linalg.cholesky(np.atleast_2d(np.cov(samples.T)))
+                    sigma = 2.38 / np.sqrt(num_dim)
+                    self.logger.debug("Adjusting covariance and resetting sigma")
+                except np.linalg.LinAlgError:
+                    self.logger.warning("Burn in covariance is not positive definite, not adjusting it")
+            if self._writer is not None and (step == self._num_burn or time() - last_save_time > self.save_interval):
+                self._save_state(state_file, positions, posteriors, sigma, chol, step, 0)
+                last_save_time = time()
+        return positions, posteriors, sigma, chol
+
+    def _do_chain(self, evaluate, positions, posteriors, sigma, chol, past_chain, chain_file, state_file):
+        num_chains, num_dim = positions.shape
+        chain = np.zeros((num_chains, self.num_steps, num_dim))
+        posterior = np.zeros((num_chains, self.num_steps))
+        step = 0
+        if past_chain is not None:
+            step = min(past_chain.shape[0], self.num_steps)
+            chain[:, :step] = past_chain[:step, :, 1:].swapaxes(0, 1)
+            posterior[:, :step] = past_chain[:step, :, 0].T
+
+        # Running means and sums of squared deviations of each chain, for R-hat
+        mean = chain[:, :step].mean(axis=1) if step else np.zeros((num_chains, num_dim))
+        m2 = ((chain[:, :step] - mean[:, None, :]) ** 2).sum(axis=1) if step else np.zeros((num_chains, num_dim))
+        rhat = np.full(num_dim, np.nan)
+        converged = False
+
+        if self._writer is not None and not os.path.exists(chain_file):
+            create_appendable(chain_file, num_dim + 1, num_chains=num_chains)
+        last_save_time, num_saved = time(), step
+        self.logger.info(f"Starting {num_chains} chains")
+        while step < self.num_steps:
+            positions, posteriors, _ = self._step(evaluate, positions, posteriors, sigma, chol)
+            chain[:, step] = positions
+            posterior[:, step] = posteriors
+            step += 1
+            delta = positions - mean
+            mean += delta / step
+            m2 += delta * (positions - mean)
+
+            if step % self.check_interval == 0:
+                rhat = get_rhat(step, mean, m2 / (step - 1))
+                self.logger.debug(f"R-hat after {step} steps is {rhat}")
+                converged = bool(np.all(rhat < self.rhat_target))
+            done = converged or step == self.num_steps
+            if self._writer is not None and (done or time() - last_save_time > self.save_interval):
+                rows = np.concatenate((posterior[:, num_saved:step, None], chain[:, num_saved:step]), axis=2).swapaxes(0, 1)
+                self._writer.append(chain_file, rows.reshape((-1, num_dim + 1)))
+                self._save_state(state_file, positions, posteriors, sigma, chol, self._num_burn, step)
+                last_save_time, num_saved = time(), step
+            if converged:
+                self.logger.info(f"Chains converged after {step} steps, with R-hat {rhat}")
+                break
+
+        if step > 1:
+            rhat = get_rhat(step, mean, m2 / (step - 1))
+        diagnostics = {"rhat": [float(r) for r in rhat], "converged": converged, "num_steps": step, "num_chains": num_chains}
+        return chain[:, :step], posterior[:, :step], diagnostics
+
+    def load_file(self, filename):
+        header, _ = read_appendable_header(filename)
+        num_chains = header["meta"]["num_chains"]
+        rows = read_appendable(filename)
+        rows = rows[: rows.shape[0] - rows.shape[0] % num_chains].reshape((-1, num_chains, rows.shape[1])).swapaxes(0, 1)
+        chain, weights, posterior = compress_chain(rows[:, :, 1:], rows[:, :, 0])
+        diagnostics = None
+        diagnostics_file = filename.replace("chain.bin", "diagnostics.json")
+        if os.path.exists(diagnostics_file):
+            with open(diagnostics_file) as f:
+                diagnostics = json.load(f)
+        return {"chain": chain, "weights": weights, "posterior": posterior, "diagnostics": diagnostics}
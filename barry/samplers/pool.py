@@ -0,0 +1,272 @@
+import os
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from barry.models.model import Model
+
+# The model specs each worker process has been sent, keyed on their unique key
+_worker_specs = {}
+
+
+def _init_worker(specs):
+    _worker_specs.update(specs)
+
+
+class ModelSpec(object):
+    """ A lightweight, rebuildable description of a model with its data set.
+
+    When sent to another process only the model parameters and data are pickled, as `Model.__getstate__` drops
+    the CAMB generator and pregenerated data. The first time the model is used in the new process, `set_data`
+    is called to reload them (from the node-local cache, if configured).
+    """
+
+    def __init__(self, model):
+        self.key = uuid.uuid4().hex
+        self.model = model
+        self.data = model.data
+        self._ready = True
+
+    def __getstate__(self):
+        return {"key": self.key, "model": self.model, "data": None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._ready = False
+
+    def get_model(self):
+        if not self._ready:
+            if self.model.data is not None:
+                self.model.set_data(self.model.data)
+            self._ready = True
+        return self.model
+
+
+class ModelFunction(object):
+    """ A picklable stand-in for a bound model method, such as `model.get_posterior`.
+
+    Pickling one only sends the spec key and method name, so it is cheap to send with every batch of points.
+    Workers look the spec up from the ones registered with their pool.
+    """
+
+    def __init__(self, spec, method):
+        self.spec = spec
+        self.key = spec.key
+        self.method = method
+
+    def __getstate__(self):
+        return {"key": self.key, "method": self.method, "spec": None}
+
+    def __call__(self, *args, **kwargs):
+        spec = self.spec if self.spec is not None else _worker_specs[self.key]
+        return getattr(spec.get_model(), self.method)(*args, **kwargs)
+
+
+class SerialPool(object):
+    """ Evaluates everything in the current process. All other pools share this interface.
+
+    Samplers call `wrap` on the functions they are given before passing them to `map`, which lets pools that
+    use other processes replace bound model methods with a `ModelFunction` and send the model to each
+    worker once, rather than pickling it with every task.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("barry")
+        self.size = 1
+        self.spec = None
+
+    def wrap(self, func):
+        """ Returns a version of `func` that can be evaluated by this pool """
+        return func
+
+    def _wrap_model_method(self, func):
+        """ Replaces a bound model method with a `ModelFunction`, returning whether the model spec is new """
+        model = getattr(func, "__self__", None)
+        if not isinstance(model, Model):
+            return func, False
+        # The Fitter reuses models between fits, so the spec also has to be replaced when the data changes
+        is_new = self.spec is None or self.spec.model is not model or self.spec.data is not model.data
+        if is_new:
+            self.spec = ModelSpec(model)
+        return ModelFunction(self.spec, func.__name__), is_new
+
+    def map(self, func, iterable):
+        """ Evaluates `func` on every element of `iterable`, returning a list of the results in order """
+        return [func(x) for x in iterable]
+
+    def close(self):
+        """ Shuts down any workers """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ThreadPool(SerialPool):
+    """ Evaluates functions using a pool of threads.
+
+    Models are shared between threads, so nothing needs to be copied. This only helps for models which spend
+    most of their time in numpy or scipy routines that release the GIL.
+    """
+
+    def __init__(self, num_workers=None):
+        super().__init__()
+        self.size = num_workers or os.cpu_count()
+        self.executor = ThreadPoolExecutor(max_workers=self.size)
+
+    def map(self, func, iterable):
+        return list(self.executor.map(func, iterable))
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class ProcessPool(SerialPool):
+    """ Evaluates functions using a pool of local processes.
+
+    Bound model methods given to `wrap` are sent to each worker process once, as a `ModelSpec`, and rebuilt there.
+    The workers are (re)started when a map needs a model they do not have, which happens once per fit.
+    """
+
+    def __init__(self, num_workers=None):
+        super().__init__()
+        self.size = num_workers or os.cpu_count()
+        self.executor = None
+
+    def wrap(self, func):
+        func, is_new = self._wrap_model_method(func)
+        if is_new:
+            self.close()
+        return func
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.logger.debug(f"Starting {self.size} worker processes")
+            specs = {} if self.spec is None else {self.spec.key: self.spec}
+            self.executor = ProcessPoolExecutor(max_workers=self.size, initializer=_init_worker, initargs=(specs,))
+        return self.executor
+
+    def map(self, func, iterable):
+        items = list(iterable)
+        chunksize = max(1, int(np.ceil(len(items) / self.size)))
+        return list(self._get_executor().map(func, items, chunksize=chunksize))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __getstate__(self):
+        # Sending the pool elsewhere (such as with the Fitter to its own worker processes) gives an unstarted copy
+        state = self.__dict__.copy()
+        state.update({"executor": None, "spec": None})
+        return state
+
+
+class MPIPool(SerialPool):
+    """ Evaluates functions using MPI, with rank 0 as the master and every other rank as a worker.
+
+    Every rank should create the pool, and then the workers should call `wait` straight away, which only
+    returns once the master closes the pool:
+
+        pool = MPIPool()
+        if not pool.is_master():
+            pool.wait()
+            sys.exit(0)
+
+    Requires `mpi4py`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        from mpi4py import MPI
+
+        self.comm = MPI.COMM_WORLD
+        self.rank = self.comm.Get_rank()
+        self.size = self.comm.Get_size() - 1
+        assert self.size > 0, "An MPI pool needs at least two ranks, a master and a worker"
+        self.workers = list(range(1, self.size + 1))
+
+    def is_master(self):
+        return self.rank == 0
+
+    def wait(self):
+        """ Runs tasks sent from the master until the pool is closed """
+        while True:
+            task = self.comm.recv(source=0)
+            if task is None:
+                break
+            kind, payload = task
+            if kind == "register":
+                _worker_specs.clear()
+                _worker_specs.update(payload)
+            else:
+                func, items = payload
+                self.comm.send([func(x) for x in items], dest=0)
+
+    def wrap(self, func):
+        func, is_new = self._wrap_model_method(func)
+        if is_new:
+            for worker in self.workers:
+                self.comm.send(("register", {self.spec.key: self.spec}), dest=worker)
+        return func
+
+    def map(self, func, iterable):
+        items = list(iterable)
+        chunks = np.array_split(np.arange(len(items)), self.size)
+        used = [(w, c) for w, c in zip(self.workers, chunks) if c.size]
+        for worker, chunk in used:
+            self.comm.send(("map", (func, [items[i] for i in chunk])), dest=worker)
+        return [r for worker, _ in used for r in self.comm.recv(source=worker)]
+
+    def close(self):
+        if self.is_master():
+            for worker in self.workers:
+                self.comm.send(None, dest=worker)
+            self.workers = []
+
+
+def get_batch_posterior(log_posterior, pool=None):
+    """ Returns a function evaluating the log posterior of each row of a `(num_points, num_dim)` array.
+
+    Uses the pool if given, or the models `get_posterior_batch` if `log_posterior` is a models `get_posterior`,
+    and otherwise evaluates each point in turn.
+    """
+    if pool is not None:
+        log_posterior = pool.wrap(log_posterior)
+        return lambda positions: pool.map(log_posterior, list(positions))
+    batch = getattr(getattr(log_posterior, "__self__", None), "get_posterior_batch", None)
+    if batch is not None and getattr(log_posterior, "__name__", None) == "get_posterior":
+        return batch
+    return lambda positions: [log_posterior(p) for p in positions]
+
+
+def get_pool(backend="serial", num_workers=None):
+    """ Creates a pool to evaluate likelihoods with.
+
+    Parameters
+    ----------
+    backend : str, optional
+        One of "serial", "thread", "process" or "mpi"
+    num_workers : int, optional
+        The number of threads or processes to use. Defaults to the number of cores. Ignored for MPI, which uses
+        every rank but the first.
+
+    Returns
+    -------
+    pool : `SerialPool`
+    """
+    if backend == "serial":
+        return SerialPool()
+    if backend == "thread":
+        return ThreadPool(num_workers)
+    if backend == "process":
+        return ProcessPool(num_workers)
+    if backend == "mpi":
+        return MPIPool()
+    raise ValueError(f"Backend {backend} is not one of serial, thread, process or mpi")
@@ -1,10 +1,12 @@
 import abc
 
+import numpy as np
+
 
 class Sampler(object):
     __metaclass__ = abc.ABCMeta
 
-    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None):
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
         """" Runs the sampler over the model and returns the flat chain of results
 
         Parameters
@@ -26,6 +28,9 @@ class Sampler(object):
             A unique identifier used to differentiate different fits
             if two fits both serialise their chains and use the
             same temporary directory
+        warm_start : `barry.warm_start.WarmStart`, optional
+            What earlier fits to similar data learnt about the posterior,
+            which samplers can use to shorten their burn in
         Returns
         -------
         dict
@@ -35,6 +40,16 @@ class Sampler(object):
         """
         raise NotImplementedError()
 
+    def get_bounds(self, prior_transform, num_dim):
+        """ Returns the lower and upper bound of each parameter, from the corners of the unit hypercube.
+
+        Assumes the prior transform is separable, like the uniform priors from `Model.unscale`. Without one,
+        every parameter is unbounded.
+        """
+        if prior_transform is None:
+            return np.full(num_dim, -np.inf), np.full(num_dim, np.inf)
+        return np.asarray(prior_transform(np.zeros(num_dim)), dtype=np.float64), np.asarray(prior_transform(np.ones(num_dim)), dtype=np.float64)
+
     def load_file(self, filename):
         """ Load existing results from a file"""
         raise NotImplementedError()
@@ -0,0 +1,150 @@
+import logging
+
+import numpy as np
+from scipy.special import logsumexp
+
+from barry.samplers.pool import get_batch_posterior
+from barry.samplers.sampler import Sampler
+
+
+def get_ess(log_weights):
+    """ Returns the (Kish) effective sample size of a set of log weights """
+    if not np.any(np.isfinite(log_weights)):
+        return 0.0
+    log_weights = log_weights - np.max(log_weights)
+    return np.exp(2 * logsumexp(log_weights) - logsumexp(2 * log_weights))
+
+
+def systematic_resample(log_weights):
+    """ Returns the indexes of a systematic resampling of particles with the given log weights """
+    weights = np.exp(log_weights - logsumexp(log_weights))
+    positions = (np.random.uniform() + np.arange(weights.size)) / weights.size
+    return np.minimum(np.searchsorted(np.cumsum(weights), positions), weights.size - 1)
+
+
+class SMCSampler(Sampler):
+    """ Sequential Monte Carlo, tempering a population of particles from the prior to the posterior.
+
+    Particles are drawn from the prior using the prior transform, and the likelihood is raised to a power that
+    goes from zero to one. Each new power is chosen so the effective sample size of the reweighted particles is
+    `ess_fraction` of the population. The particles are then resampled and moved with Metropolis Hastings steps
+    in the unit hypercube, using a proposal covariance from the particles themselves, until each particle has
+    made about `num_moves` accepted moves.
+
+    Every step evaluates the whole population in one batch, using the pool if given, or the models
+    `get_posterior_batch` if it has one. Like nested sampling, the log evidence comes for free, and as with
+    `DynestySampler`, the function being fit is treated as the likelihood of the prior from the prior transform,
+    so the two evidences can be compared.
+
+    Parameters
+    ----------
+    num_particles : int, optional
+        The number of particles
+    ess_fraction : float, optional
+        The fraction of the particles which should remain effective after each change in temperature
+    num_moves : float, optional
+        How many accepted moves each particle should make at each temperature
+    max_steps : int, optional
+        The maximum number of Metropolis Hastings steps at each temperature
+    pool : `barry.samplers.pool.SerialPool`, optional
+        If set, the particles are evaluated in parallel using this pool
+    """
+
+    def __init__(self, num_particles=1000, ess_fraction=0.5, num_moves=5, max_steps=100, pool=None):
+        self.logger = logging.getLogger("barry")
+        self.num_particles = num_particles
+        self.ess_fraction = ess_fraction
+        self.num_moves = num_moves
+        self.max_steps = max_steps
+        self.pool = pool
+
+    def _get_next_beta(self, beta, log_likelihood):
+        """ Finds the next temperature by bisection, so the incremental weights keep `ess_fraction` of the particles """
+        target = self.ess_fraction * log_likelihood.size
+        if get_ess((1 - beta) * log_likelihood) >= target:
+            return 1.0
+        low, high = beta, 1.0
+        for _ in range(100):
+            mid = 0.5 * (low + high)
+            if get_ess((mid - beta) * log_likelihood) >= target:
+                low = mid
+            else:
+                high = mid
+            if high - low < 1e-10:
+                break
+        return low if low > beta else high
+
+    def _move(self, evaluate, prior_transform, unit, params, log_likelihood, beta):
+        """ Runs Metropolis Hastings steps in the unit hypercube at a fixed temperature """
+        num_particles, num_dim = unit.shape
+        # Start with the optimal scale for a Gaussian, and adapt it towards a reasonable acceptance rate
+        scale = 2.38 / np.sqrt(num_dim)
+        chol = np.linalg.cholesky(np.atleast_2d(np.cov(unit.T)) + 1e-12 * np.identity(num_dim))
+        accepted, num_steps, num_evaluations = np.zeros(num_particles), 0, 0
+        while num_steps < self.max_steps and np.mean(accepted) < self.num_moves:
+            proposal = unit + scale * np.random.normal(size=unit.shape) @ chol.T
+            inside = np.all((proposal > 0) & (proposal < 1), axis=1)
+            new_likelihood = np.full(num_particles, -np.inf)
+            new_params = params.copy()
+            if inside.any():
+                new_params[inside] = np.array([prior_transform(u) for u in proposal[inside]])
+                new_likelihood[inside] = evaluate(new_params[inside])
+            num_steps += 1
+            num_evaluations += int(inside.sum())
+
+            with np.errstate(invalid="ignore"):
+                accept = np.log(np.random.uniform(size=num_particles)) < beta * (new_likelihood - log_likelihood)
+            accept &= inside & np.isfinite(new_likelihood)
+            unit[accept], params[accept], log_likelihood[accept] = proposal[accept], new_params[accept], new_likelihood[accept]
+            accepted += accept
+            scale *= np.exp(np.mean(accept) - 0.234)
+        return unit, params, log_likelihood, num_steps, num_evaluations, np.mean(accepted) / num_steps
+
+    def fit(self, log_posterior, start, num_dim, prior_transform, save_dims=None, uid=None, warm_start=None):
+        """ Tempers the particles from the prior to the posterior, ignoring the starting position.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the final particles with equal weights, their log likelihood, the log evidence,
+            and diagnostics holding the number of temperatures and posterior evaluations, and an estimate of
+            the error on the log evidence
+        """
+        assert prior_transform is not None, "The SMC sampler draws its initial particles using the prior transform"
+        evaluate = get_batch_posterior(log_posterior, self.pool)
+
+        def evaluate_batch(params):
+            return np.asarray(evaluate(params), dtype=np.float64)
+
+        unit = np.random.uniform(size=(self.num_particles, num_dim))
+        params = np.array([prior_transform(u) for u in unit], dtype=np.float64)
+        log_likelihood = evaluate_batch(params)
+        if not np.any(np.isfinite(log_likelihood)):
+            raise ValueError("The likelihood is not finite for any particle drawn from the prior")
+        num_evaluations = self.num_particles
+
+        beta, logz, logz_variance, num_temperatures = 0.0, 0.0, 0.0, 0
+        while beta < 1:
+            new_beta = self._get_next_beta(beta, log_likelihood)
+            log_weights = np.where(np.isfinite(log_likelihood), (new_beta - beta) * log_likelihood, -np.inf)
+            ess = get_ess(log_weights)
+            # The particles are equally weighted after each resampling, so each increment is a simple average
+            logz += logsumexp(log_weights) - np.log(self.num_particles)
+            logz_variance += (self.num_particles / ess - 1) / self.num_particles
+            beta, num_temperatures = new_beta, num_temperatures + 1
+
+            index = systematic_resample(log_weights)
+            unit, params, log_likelihood = unit[index], params[index], log_likelihood[index]
+            unit, params, log_likelihood, num_steps, num_moved, accept = self._move(evaluate_batch, prior_transform, unit, params, log_likelihood, beta)
+            num_evaluations += num_moved
+            self.logger.info(f"Temperature {beta:0.5f} has log evidence {logz:0.3f}, after {num_steps} steps with acceptance {accept:0.3f}")
+
+        chain = params if save_dims is None else params[:, :save_dims]
+        diagnostics = {"num_temperatures": num_temperatures, "num_evaluations": num_evaluations, "logz_error": np.sqrt(logz_variance)}
+        return {
+            "chain": chain,
+            "weights": np.ones(chain.shape[0]),
+            "posterior": log_likelihood,
+            "evidence": np.full(chain.shape[0], logz),
+            "diagnostics": diagnostics,
+        }
@@ -20,11 +20,18 @@ def create_histogram_plot():
     plt.rc("font", family="serif")
 
 
-def get_model_comparison_dataframe(fitter):
-    """ Uses fitter.load to create a comparison dataframe on the first column of fitter results (presumed to be alpha)
+def get_model_comparison_dataframe(fitter, param=None):
+    """ Uses fitter.summarise to create a comparison dataframe on the first column of fitter results (presumed to be alpha)
 
     Will only produce a row if a given realisation has a successful fit for all models.
 
+    Parameters
+    ----------
+    fitter : `barry.fitter.Fitter`
+        The fitter whose results to compare
+    param : str, optional
+        The parameter to compare. Defaults to the first active parameter of the first model.
+
     Returns
     -------
     model_results : dict of pd.DataFrame
@@ -33,14 +40,21 @@ def get_model_comparison_dataframe(fitter):
         One row per model, giving the mean alpha over all realisations, mean of the alpha stds (mean reported error), and std of the mean alpha (scatter in reported mean)
 
     """
+    fits = fitter.summarise()
+    if param is None:
+        param = fitter.get_model_and_data(fits["model_index"].iloc[0])[0].get_names()[0]
     model_results = {}
-    for posterior, weight, chain, evidence, model, data, extra in fitter.load():
-        n = extra["name"]
+    for _, walkers in fits.groupby("model_index"):
+        # Combine the walkers of each model-dataset pair, weighting their moments by their total weight
+        w = walkers["weight_sum"].values
+        means, stds = walkers[f"{param}_mean"].values, walkers[f"{param}_std"].values
+        a = np.average(means, weights=w)
+        s = np.sqrt(np.average(stds ** 2 + means ** 2, weights=w) - a ** 2)
+        best = walkers.iloc[walkers["max_posterior"].values.argmax()]
+        n = best["name"]
         if model_results.get(n) is None:
             model_results[n] = []
-        i = posterior.argmax()
-        a, s = weighted_avg_and_std(chain[:, 0], weights=weight)
-        model_results[n].append([a, s, chain[i, 0], posterior[i], extra["realisation"]])
+        model_results[n].append([a, s, best[f"{param}_best"], best["max_posterior"], best["realisation"]])
 
     for label in model_results.keys():
         model_results[label] = pd.DataFrame(model_results[label], columns=["avg", "std", "max", "posterior", "realisation"])
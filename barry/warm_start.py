@@ -0,0 +1,118 @@
+import os
+import json
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+
+from barry.artifacts import _file_lock, get_hash
+
+
+@dataclass
+class WarmStart:
+    """ What earlier fits of the same model to the same family of datasets learnt about the posterior """
+
+    best_fit: np.ndarray
+    covariance: np.ndarray
+    num_fits: int
+    burn_fraction: float = 0.1
+
+    def get_num_burn(self, num_burn):
+        """ Returns the shortened burn in to use instead of `num_burn` """
+        return max(1, int(np.ceil(num_burn * self.burn_fraction)))
+
+
+def get_warm_start_config(model, data):
+    """ Returns everything that determines the shape of a posterior, except which realisation of the data is being fit """
+    return {
+        "model": model.__class__.__name__,
+        "name": model.get_name(),
+        "params": [[p.name, p.min, p.max, p.default, p.active] for p in model.params],
+        "correction": model.correction.name,
+        "postprocess": None if model.postprocess is None else model.postprocess.get_config(),
+        "data": [{"name": d.get("name"), "cosmology": d.get("cosmology"), "shape": list(np.shape(d.get("cov")))} for d in data],
+    }
+
+
+class WarmStartCache(object):
+    """ Shares the best fit and posterior covariance between fits to different realisations of a dataset.
+
+    When fitting hundreds of mocks, the posteriors all have nearly the same shape. After each fit, its best fit and
+    weighted covariance are averaged into a cache entry keyed on the model configuration and dataset family
+    (the dataset names, cosmology and data vector length, but not the realisation). Later fits can then start with
+    a short local optimisation from the cached best fit, walkers spread like the posterior, a proposal covariance
+    that is already tuned, and a much shorter burn in.
+    """
+
+    def __init__(self, directory, burn_fraction=0.1):
+        """
+
+        Parameters
+        ----------
+        directory : str
+            Where to keep the cache
+        burn_fraction : float, optional
+            The fraction of their usual burn in that warm started fits run
+        """
+        self.logger = logging.getLogger("barry")
+        self.directory = directory
+        self.burn_fraction = burn_fraction
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, model, data):
+        return os.path.join(self.directory, f"{get_hash(get_warm_start_config(model, data))}.json")
+
+    def get(self, model, data):
+        """ Returns the `WarmStart` for a model and its data, or None if no similar fit has finished yet """
+        path = self._get_path(model, data)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            entry = json.load(f)
+        if len(entry["best_fit"]) != model.get_num_dim():
+            return None
+        self.logger.info(f"Warm starting from {entry['num_fits']} previous fits")
+        return WarmStart(np.array(entry["best_fit"]), np.array(entry["covariance"]), entry["num_fits"], self.burn_fraction)
+
+    def update(self, model, data, chain, weights=None, posterior=None):
+        """ Adds a finished fit to the cache.
+
+        Parameters
+        ----------
+        model : `barry.models.Model`
+        data : list[dict]
+            The data the model was fit to
+        chain : np.ndarray
+            The samples of every active parameter
+        weights : np.ndarray, optional
+            The weight of each sample
+        posterior : np.ndarray, optional
+            The log posterior of each sample. If not given, the weighted mean is used as the best fit.
+        """
+        chain = np.asarray(chain, dtype=np.float64)
+        if chain.ndim != 2 or chain.shape[1] != model.get_num_dim() or chain.shape[0] < 2:
+            self.logger.debug("Not updating the warm start cache, as the chain does not have every parameter")
+            return
+        weights = np.ones(chain.shape[0]) if weights is None else np.asarray(weights, dtype=np.float64).flatten()
+        if posterior is None:
+            best_fit = np.average(chain, weights=weights, axis=0)
+        else:
+            best_fit = chain[np.argmax(np.asarray(posterior).flatten())]
+        covariance = np.atleast_2d(np.cov(chain.T, aweights=weights))
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._get_path(model, data)
+        with _file_lock(path + ".lock"):
+            num_fits = 0
+            if os.path.exists(path):
+                with open(path) as f:
+                    entry = json.load(f)
+                num_fits = entry["num_fits"]
+                # A running mean over every fit, so no one realisation dominates
+                best_fit = (num_fits * np.array(entry["best_fit"]) + best_fit) / (num_fits + 1)
+                covariance = (num_fits * np.array(entry["covariance"]) + covariance) / (num_fits + 1)
+            entry = {"best_fit": best_fit.tolist(), "covariance": covariance.tolist(), "num_fits": num_fits + 1}
+            tmp = path + f".{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
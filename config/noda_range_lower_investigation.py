@@ -23,10 +23,11 @@ if __name__ == "__main__":
     ps = [BAOExtractor(r_s, mink=0.03), BAOExtractor(r_s, mink=0.04), BAOExtractor(r_s, mink=0.05), BAOExtractor(r_s, mink=0.06), BAOExtractor(r_s, mink=0.07)]
 
     recon = True
+    parent = PowerSpectrum_SDSS_DR12_Z061_NGC(min_k=0.02, max_k=0.30, recon=recon)
     for p in ps:
         n = f"$k = {p.mink:0.2f}\, h / {{\\rm Mpc}}$"
         model = PowerNoda2019(postprocess=p, recon=recon)
-        data = PowerSpectrum_SDSS_DR12_Z061_NGC(min_k=0.02, max_k=0.30, postprocess=p, recon=recon)
+        data = parent.view(postprocess=p)
         fitter.add_model_and_dataset(model, data, name=n)
 
     sampler = DynestySampler(temp_dir=dir_name)
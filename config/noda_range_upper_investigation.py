@@ -37,10 +37,11 @@ if __name__ == "__main__":
     ]
 
     recon = True
+    parent = PowerSpectrum_SDSS_DR12_Z061_NGC(min_k=0.02, max_k=0.30, recon=recon)
     for p in ps:
         n = f"$k = {p.extra_ks[1]:0.2f}\, h / {{\\rm Mpc}}$"
         model = PowerNoda2019(postprocess=p, recon=recon)
-        data = PowerSpectrum_SDSS_DR12_Z061_NGC(min_k=0.02, max_k=0.30, postprocess=p, recon=recon)
+        data = parent.view(postprocess=p)
         fitter.add_model_and_dataset(model, data, name=n)
 
     sampler = DynestySampler(temp_dir=dir_name)
@@ -28,7 +28,7 @@ if __name__ == "__main__":
         t = "Recon" if r else "Prerecon"
         ls = "-" if r else "--"
         d = PowerSpectrum_SDSS_DR12_Z061_NGC(recon=r, min_k=0.03, max_k=0.21)
-        de = PowerSpectrum_SDSS_DR12_Z061_NGC(recon=r, postprocess=p, min_k=0.03, max_k=0.21)
+        de = d.view(postprocess=p)
 
         # Fix sigma_nl for one of the Beutler models
         model = PowerBeutler2017(recon=r)
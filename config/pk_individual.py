@@ -42,14 +42,11 @@ if __name__ == "__main__":
         noda = PowerNoda2019(recon=r, postprocess=p)
 
         for i in range(999):
-            d.set_realisation(i)
-            de.set_realisation(i)
-
-            fitter.add_model_and_dataset(beutler_not_fixed, d, name=f"Beutler 2017 {t}, mock number {i}", linestyle=ls, color="p", realisation=i)
-            fitter.add_model_and_dataset(beutler, d, name=f"Beutler 2017 Fixed $\\Sigma_{{nl}}$ {t}, mock number {i}", linestyle=ls, color="p", realisation=i)
-            fitter.add_model_and_dataset(seo, d, name=f"Seo 2016 {t}, mock number {i}", linestyle=ls, color="r", realisation=i)
-            fitter.add_model_and_dataset(ding, d, name=f"Ding 2018 {t}, mock number {i}", linestyle=ls, color="lb", realisation=i)
-            fitter.add_model_and_dataset(noda, de, name=f"Noda 2019 {t}, mock number {i}", linestyle=ls, color="o", realisation=i)
+            fitter.add_model_and_dataset(beutler_not_fixed, (d, i), name=f"Beutler 2017 {t}, mock number {i}", linestyle=ls, color="p", realisation=i)
+            fitter.add_model_and_dataset(beutler, (d, i), name=f"Beutler 2017 Fixed $\\Sigma_{{nl}}$ {t}, mock number {i}", linestyle=ls, color="p", realisation=i)
+            fitter.add_model_and_dataset(seo, (d, i), name=f"Seo 2016 {t}, mock number {i}", linestyle=ls, color="r", realisation=i)
+            fitter.add_model_and_dataset(ding, (d, i), name=f"Ding 2018 {t}, mock number {i}", linestyle=ls, color="lb", realisation=i)
+            fitter.add_model_and_dataset(noda, (de, i), name=f"Noda 2019 {t}, mock number {i}", linestyle=ls, color="o", realisation=i)
 
     fitter.set_sampler(sampler)
     fitter.set_num_walkers(1)
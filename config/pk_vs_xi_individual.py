@@ -30,14 +30,11 @@ if __name__ == "__main__":
         ding_xi_smooth = CorrDing2018(recon=r, smooth=True)
 
         for i in range(999):
-            d_pk.set_realisation(i)
-            d_xi.set_realisation(i)
+            fitter.add_model_and_dataset(ding_pk, (d_pk, i), name=f"Ding 2018 $P(k)$, mock number {i}", linestyle="-", color="p", realisation=i)
+            fitter.add_model_and_dataset(ding_pk_smooth, (d_pk, i), name=f"Ding 2018 $P(k)$ Smooth, mock number {i}", linestyle="-", color="p", realisation=i)
 
-            fitter.add_model_and_dataset(ding_pk, d_pk, name=f"Ding 2018 $P(k)$, mock number {i}", linestyle="-", color="p", realisation=i)
-            fitter.add_model_and_dataset(ding_pk_smooth, d_pk, name=f"Ding 2018 $P(k)$ Smooth, mock number {i}", linestyle="-", color="p", realisation=i)
-
-            fitter.add_model_and_dataset(ding_xi, d_xi, name=f"Ding 2018 $\\xi(s)$, mock number {i}", linestyle=":", color="p", realisation=i)
-            fitter.add_model_and_dataset(ding_xi_smooth, d_xi, name=f"Ding 2018 $\\xi(s)$ Smooth, mock number {i}", linestyle=":", color="p", realisation=i)
+            fitter.add_model_and_dataset(ding_xi, (d_xi, i), name=f"Ding 2018 $\\xi(s)$, mock number {i}", linestyle=":", color="p", realisation=i)
+            fitter.add_model_and_dataset(ding_xi_smooth, (d_xi, i), name=f"Ding 2018 $\\xi(s)$ Smooth, mock number {i}", linestyle=":", color="p", realisation=i)
 
     fitter.set_sampler(sampler)
     fitter.set_num_walkers(1)
@@ -34,11 +34,10 @@ if __name__ == "__main__":
         ding = CorrDing2018(recon=r)
 
         for i in range(999):
-            d.set_realisation(i)
-            fitter.add_model_and_dataset(beutler_not_fixed, d, name=f"Beutler 2017 {t}, mock number {i}", linestyle=ls, color=c4[0], realisation=i)
-            fitter.add_model_and_dataset(beutler, d, name=f"Beutler 2017 Fixed $\\Sigma_{{nl}}$ {t}, mock number {i}", linestyle=ls, color=c4[0], realisation=i)
-            fitter.add_model_and_dataset(seo, d, name=f"Seo 2016 {t}, mock number {i}", linestyle=ls, color=c4[1], realisation=i)
-            fitter.add_model_and_dataset(ding, d, name=f"Ding 2018 {t}, mock number {i}", linestyle=ls, color=c4[2], realisation=i)
+            fitter.add_model_and_dataset(beutler_not_fixed, (d, i), name=f"Beutler 2017 {t}, mock number {i}", linestyle=ls, color=c4[0], realisation=i)
+            fitter.add_model_and_dataset(beutler, (d, i), name=f"Beutler 2017 Fixed $\\Sigma_{{nl}}$ {t}, mock number {i}", linestyle=ls, color=c4[0], realisation=i)
+            fitter.add_model_and_dataset(seo, (d, i), name=f"Seo 2016 {t}, mock number {i}", linestyle=ls, color=c4[1], realisation=i)
+            fitter.add_model_and_dataset(ding, (d, i), name=f"Ding 2018 {t}, mock number {i}", linestyle=ls, color=c4[2], realisation=i)
 
     fitter.set_sampler(sampler)
     fitter.set_num_walkers(1)
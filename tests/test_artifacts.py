@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from barry.artifacts import ArtifactStore, get_hash, stage_file
+from barry.datasets import dataset
+from barry.datasets.dataset import Dataset
+
+
+class TestArtifactStore:
+    def test_hash_distinguishes_untruncated_values(self):
+        # These used to collide when truncated to int(h0 * 10000)
+        assert get_hash({"h0": 0.67601}) != get_hash({"h0": 0.67602})
+        assert get_hash({"a": 1, "b": 2}) == get_hash({"b": 2, "a": 1})
+
+    def write(self, store, key, config, dependencies=()):
+        filename = store.get_path(key, "test", ".txt")
+        with open(filename, "w") as f:
+            f.write(key)
+        store.register(key, filename, config, dependencies=dependencies)
+        return filename
+
+    def test_status_and_staleness(self, tmp_path):
+        store = ArtifactStore(tmp_path)
+        parent_config, child_config = {"type": "parent"}, {"type": "child"}
+        parent, child = get_hash(parent_config), get_hash(child_config)
+
+        assert store.get_status(parent, parent_config) == store.MISSING
+        self.write(store, parent, parent_config)
+        self.write(store, child, child_config, dependencies=[parent])
+        assert store.get_status(parent, parent_config) == store.VALID
+        assert store.get_status(child, child_config) == store.VALID
+
+        # Regenerating the parent makes the child stale
+        self.write(store, parent, parent_config)
+        assert store.get_status(child, child_config) == store.STALE
+
+        os.remove(store.get_path(parent, "test", ".txt"))
+        assert store.get_status(parent, parent_config) == store.MISSING
+
+    def test_collision_detected(self, tmp_path):
+        store = ArtifactStore(tmp_path)
+        self.write(store, "abc", {"type": "one"})
+        with pytest.raises(ValueError):
+            store.get_status("abc", {"type": "two"})
+
+
+class TestStaging:
+    def test_stage_file_copies_once_and_refreshes(self, tmp_path):
+        shared, local = tmp_path / "shared", tmp_path / "local"
+        shared.mkdir()
+        source = shared / "data.pkl"
+        source.write_text("first")
+
+        staged = stage_file(str(source), cache_root=str(local))
+        assert staged.startswith(str(local))
+        assert open(staged).read() == "first"
+        assert stage_file(str(source), cache_root=str(local)) == staged
+
+        # Replacing the original should cause it to be restaged
+        replacement = shared / "tmp.pkl"
+        replacement.write_text("second, longer")
+        os.replace(replacement, source)
+        assert open(stage_file(str(source), cache_root=str(local))).read() == "second, longer"
+
+    def test_stage_file_without_cache_root(self, tmp_path):
+        source = tmp_path / "data.pkl"
+        source.write_text("data")
+        assert stage_file(str(source)) == str(source)
+
+
+class TestCovarianceCache:
+    class _FakeDataset(Dataset):
+        def __init__(self):
+            super().__init__("fake")
+            self.computed = 0
+
+        def get_cov_config(self):
+            return {"type": "cov", "dataset": "fake"}
+
+        def compute(self):
+            self.computed += 1
+            self.cov = np.array([[2.0, 0.5], [0.5, 1.0]])
+            self.icov = np.linalg.inv(self.cov)
+            self.corr = self.cov / np.sqrt(np.outer(np.diag(self.cov), np.diag(self.cov)))
+            self.cov_chol = np.linalg.cholesky(self.cov)
+
+    def test_cov_computed_once(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dataset, "get_artifact_store", lambda: ArtifactStore(tmp_path))
+        first, second = self._FakeDataset(), self._FakeDataset()
+        first._set_cov_cached(first.compute)
+        second._set_cov_cached(second.compute)
+        assert first.computed == 1 and second.computed == 0
+        for attr in ["cov", "icov", "corr", "cov_chol"]:
+            assert np.all(getattr(first, attr) == getattr(second, attr))
@@ -0,0 +1,97 @@
+import numpy as np
+
+from barry.campaign import MockCampaign
+from barry.fitter import Fitter
+from barry.models.model import Model, Correction
+from barry.samplers import GridSampler
+
+cosmology = {"om": 0.31, "h0": 0.676, "z": 0.61, "ob": 0.04814, "ns": 0.97, "reconsmoothscale": 15}
+
+
+class LinearModel(Model):
+    def __init__(self):
+        super().__init__("LinearModel", correction=Correction.HARTLAP)
+        self.add_param("a", r"$a$", 0.0, 2.0, 1.0)
+        self.add_param("b", r"$b$", -1.0, 1.0, 0.0)
+        self.add_param("om", r"$\Omega_m$", 0.1, 0.5, 0.31)
+        self.set_fix_params(["om"])
+
+    def get_data_vector(self, d):
+        return d["y"]
+
+    def get_model_vector(self, p, d):
+        return p["a"] + p["b"] * d["x"]
+
+    def get_likelihood(self, p, d):
+        diff = self.get_data_vector(d) - self.get_model_vector(p, d)
+        return self.get_chi2_likelihood(diff, d["icov"], num_mocks=d["num_mocks"], num_params=2)
+
+    def plot(self, params, smooth_params=None):
+        pass
+
+
+class LinearMocks:
+    def __init__(self, num_mocks=5):
+        self.x = np.linspace(0, 1, 20)
+        self.cov = 0.01 * (np.identity(20) + 0.3 * np.exp(-np.abs(self.x[:, None] - self.x[None, :]) / 0.1))
+        self.icov = np.linalg.inv(self.cov)
+        self.mocks = np.random.multivariate_normal(1.0 + 0.2 * self.x, self.cov, size=num_mocks)
+        self.realisation = None
+
+    def set_realisation(self, realisation):
+        self.realisation = realisation
+
+    def get_data(self):
+        d = {"x": self.x, "y": self.mocks[self.realisation], "icov": self.icov, "num_mocks": 1000, "name": "Linear", "cosmology": cosmology}
+        return [d]
+
+
+class TestMockCampaign:
+    def test_matches_individual_posteriors(self):
+        np.random.seed(0)
+        mocks = LinearMocks()
+        data = []
+        for i in range(5):
+            mocks.set_realisation(i)
+            data.append(mocks.get_data())
+        model = LinearModel()
+        campaign = MockCampaign(model, data)
+        points = np.random.uniform([0, -1], [2, 1], size=(30, 2))
+        posteriors = campaign.get_posterior_batch(points)
+        assert posteriors.shape == (30, 5)
+
+        single = LinearModel()
+        for i in range(5):
+            single.set_data(data[i])
+            assert np.allclose(posteriors[:, i], [single.get_posterior(p) for p in points])
+        # Outside the prior
+        assert np.all(campaign.get_posterior_batch(np.array([[3.0, 0.0]])) == -np.inf)
+
+    def test_fitter_campaign(self, tmp_path):
+        np.random.seed(1)
+        mocks = LinearMocks()
+        fitter = Fitter(str(tmp_path))
+        fitter.set_num_walkers(1)
+        indexes = fitter.run_mock_campaign(LinearModel, mocks, range(5), sampler=GridSampler(num_points=10))
+        assert indexes == list(range(5))
+        assert all(fitter.is_complete(i) for i in indexes)
+
+        # With wide flat priors, the posterior mean is the generalised least squares fit
+        design = np.vstack((np.ones(20), mocks.x)).T
+        gls = np.linalg.solve(design.T @ mocks.icov @ design, design.T @ mocks.icov @ mocks.mocks.T).T
+        summary = fitter.summarise()
+        assert list(summary["realisation"]) == list(range(5))
+        assert np.allclose(summary["a_mean"], gls[:, 0], atol=2e-3)
+        assert np.allclose(summary["b_mean"], gls[:, 1], atol=5e-3)
+        assert len(fitter.load()) == 5
+
+        # Rerunning reuses the pairs of the finished realisations, without refitting or storing them again
+        assert fitter.run_mock_campaign(LinearModel, mocks, range(5)) == list(range(5))
+        assert len(fitter.model_datasets) == 5
+        with open(fitter.chain_store.index_path) as f:
+            assert len(f.readlines()) == 5
+        assert len(fitter.load()) == 5
+
+        # Different extra information makes new pairs
+        assert fitter.run_mock_campaign(LinearModel, mocks, [0], sampler=GridSampler(num_points=10), name="Again") == [5]
+        assert len(fitter.load()) == 6
@@ -0,0 +1,27 @@
+import numpy as np
+
+from barry.chain_store import ChainStore
+
+
+class TestChainStore:
+    def test_torn_index_line(self, tmp_path):
+        store = ChainStore(str(tmp_path))
+        chains = [np.random.normal(size=(10, 4)) for _ in range(3)]
+        store.write(0, 0, chains[0], ["posterior", "weight", "evidence", "alpha"])
+
+        # A crash part way through appending the second entry leaves a partial line behind
+        with open(store.index_path, "a") as f:
+            f.write('{"model_index": 1, "walker_index": 0, "sha')
+        assert list(store.get_index().keys()) == [(0, 0)]
+
+        # Reopening the store drops it, so later entries are not written on the end of it
+        store = ChainStore(str(tmp_path))
+        store.write(1, 0, chains[1], ["posterior", "weight", "evidence", "alpha"])
+        with open(store.index_path, "a") as f:
+            f.write('{"model_index": 2')
+        store.write(2, 0, chains[2], ["posterior", "weight", "evidence", "alpha"])
+
+        index = store.get_index()
+        assert sorted(index.keys()) == [(0, 0), (1, 0), (2, 0)]
+        for i in range(3):
+            assert np.array_equal(store.read(index[(i, 0)]), chains[i])
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from barry.samplers import MetropolisHastings
+from barry.samplers.chain_writer import BackgroundWriter, create_appendable, get_num_rows, read_appendable, truncate_appendable
+
+
+def log_posterior(x):
+    return -0.5 * np.sum(np.asarray(x) ** 2)
+
+
+def start(num_walkers=1):
+    return np.random.normal(scale=0.1, size=(num_walkers, 2))
+
+
+class Interrupt(Exception):
+    pass
+
+
+class TestChainWriter:
+    def test_append_and_read_tail(self, tmp_path):
+        filename = str(tmp_path / "rows.bin")
+        create_appendable(filename, 3, num_walkers=2)
+        writer = BackgroundWriter()
+        data = np.random.normal(size=(10, 3))
+        for i in range(0, 10, 4):
+            writer.append(filename, data[i : i + 4])
+        writer.close()
+        assert get_num_rows(filename) == 10
+        assert np.array_equal(read_appendable(filename), data)
+        assert np.array_equal(read_appendable(filename, start=-2), data[-2:])
+
+        # A partially written row is ignored, and can be truncated away
+        with open(filename, "ab") as f:
+            f.write(b"\0" * 5)
+        assert get_num_rows(filename) == 10
+        truncate_appendable(filename, 7)
+        assert get_num_rows(filename) == 7 and os.path.getsize(filename) % 8 == 0
+
+    def test_metropolis_hastings_resume(self, tmp_path):
+        steps = []
+
+        def callback(*args, **kwargs):
+            steps.append(1)
+            if len(steps) == 700:
+                raise Interrupt()
+
+        np.random.seed(0)
+        sampler = MetropolisHastings(num_burn=500, num_steps=1000, temp_dir=str(tmp_path), save_interval=0, callback=callback)
+        with pytest.raises(Interrupt):
+            sampler.fit(log_posterior, start, 2, None, uid="resume")
+        assert get_num_rows(str(tmp_path / "resume_mh_burn.bin")) == 500
+        written = get_num_rows(str(tmp_path / "resume_mh_chain.bin"))
+        assert 0 < written < 1000
+
+        sampler = MetropolisHastings(num_burn=500, num_steps=1000, temp_dir=str(tmp_path), save_interval=0)
+        result = sampler.fit(log_posterior, start, 2, None, uid="resume")
+        assert result["chain"].shape == (1000, 2)
+        assert np.all(result["weights"] >= 1)
+        loaded = sampler.load_file(str(tmp_path / "resume_mh_chain.bin"))
+        assert loaded["chain"].shape == (1000, 2)
+        # The rows written before the interruption are kept as they were
+        assert np.allclose(loaded["chain"][: written - 1], result["chain"][: written - 1])
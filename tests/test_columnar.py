@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from barry.datasets.columnar import write_columnar, load_columnar
+
+
+class TestColumnar:
+    def get_data_obj(self):
+        ks = np.linspace(0.01, 0.3, 30)
+        dfs = [pd.DataFrame({"k": ks, "pk": np.random.normal(size=ks.size), "nk": np.arange(ks.size, dtype=float)}) for _ in range(4)]
+        winfit = {1: {"w_ks_input": ks.astype(np.float32), "w_k0_scale": np.float64(0.5), "w_transform": np.eye(ks.size)}}
+        return {
+            "name": "Test",
+            "cosmology": {"om": 0.31, "h0": 0.676},
+            "pre-recon": dfs,
+            "post-recon": [np.random.normal(size=(10, 2)) for _ in range(4)],
+            "winfit": winfit,
+            "winpk": np.random.normal(size=(30, 4)),
+        }
+
+    def test_round_trip(self, tmp_path):
+        data_obj = self.get_data_obj()
+        filename = str(tmp_path / "data.col")
+        write_columnar(data_obj, filename)
+        loaded, data_hash = load_columnar(filename)
+
+        assert loaded["name"] == "Test"
+        assert loaded["cosmology"] == data_obj["cosmology"]
+        for c in ["k", "pk", "nk"]:
+            assert np.all(loaded["pre-recon"][c] == np.array([df[c].values for df in data_obj["pre-recon"]]))
+        assert np.all(loaded["post-recon"] == np.stack(data_obj["post-recon"]))
+        assert list(loaded["winfit"].keys()) == [1]
+        assert loaded["winfit"][1]["w_ks_input"].dtype == np.float32
+        assert loaded["winfit"][1]["w_k0_scale"] == 0.5
+        assert np.all(loaded["winpk"] == data_obj["winpk"])
+
+        # The hash only depends on the contents
+        write_columnar(data_obj, str(tmp_path / "copy.col"))
+        assert load_columnar(str(tmp_path / "copy.col"))[1] == data_hash
@@ -0,0 +1,48 @@
+import numpy as np
+
+from barry.artifacts import ArtifactStore
+from barry.datasets import dataset
+from barry.datasets.covariance import CovarianceAccumulator, compute_cov
+from barry.datasets.dataset_power_spectrum_abc import PowerSpectrum
+from tests.utils import write_fake_data
+
+
+class TestCovariance:
+    @classmethod
+    def setup_class(cls):
+        cov = np.array([[2.0, 0.5, 0.1], [0.5, 1.0, 0.2], [0.1, 0.2, 0.5]])
+        cls.mocks = np.random.multivariate_normal([100.0, 50.0, 10.0], cov, size=1001).astype(np.float32)
+
+    def test_streamed_matches_numpy(self):
+        expected = np.cov(self.mocks.astype(np.float64).T)
+        for block_size in [1, 7, 500, 2000]:
+            assert np.allclose(compute_cov(self.mocks, block_size=block_size), expected, rtol=1e-10, atol=0)
+
+    def test_shrinkage(self):
+        accumulator = CovarianceAccumulator()
+        accumulator.add(self.mocks)
+        cov, shrunk = accumulator.get_cov(), accumulator.get_cov(shrinkage=0.25)
+        assert np.allclose(np.diag(shrunk), np.diag(cov))
+        assert np.allclose(shrunk[0, 1], 0.75 * cov[0, 1])
+
+    def test_power_spectrum_streams_mocks(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dataset, "get_artifact_store", lambda: ArtifactStore(tmp_path))
+        data = PowerSpectrum(write_fake_data(tmp_path), step_size=2, shrinkage=0.1)
+        expected = np.cov(data.get_realisations().T)
+        expected = 0.9 * expected + 0.1 * np.diag(np.diag(expected))
+        assert np.allclose(data.cov, expected)
+        data._full_covs = {}
+        assert np.allclose(data._compute_cov(block_size=7), expected)
+
+    def test_cached_covariance_only_rebins_one_realisation(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dataset, "get_artifact_store", lambda: ArtifactStore(tmp_path))
+        filename = write_fake_data(tmp_path)
+        first = PowerSpectrum(filename, step_size=2, realisation=3)
+
+        rebinned = []
+        original = PowerSpectrum._rebin_block
+        monkeypatch.setattr(PowerSpectrum, "_rebin_block", lambda self, start, stop: rebinned.append(stop - start) or original(self, start, stop))
+        second = PowerSpectrum(filename, step_size=2, realisation=3)
+        assert rebinned == [1]
+        assert np.allclose(second.cov, first.cov) and np.allclose(second.data, first.data)
+        assert np.allclose(second.data, first.get_realisations()[3])
@@ -0,0 +1,23 @@
+import numpy as np
+
+from barry.artifacts import ArtifactStore
+from barry.datasets import dataset
+from barry.datasets.dataset_power_spectrum_abc import PowerSpectrum
+from tests.utils import write_fake_data
+
+
+class TestDatasetView:
+    def test_view_matches_new_dataset(self, tmp_path, monkeypatch):
+        view_store, fresh_store = ArtifactStore(tmp_path / "view"), ArtifactStore(tmp_path / "fresh")
+        filename = write_fake_data(tmp_path)
+        monkeypatch.setattr(dataset, "get_artifact_store", lambda: view_store)
+        parent = PowerSpectrum(filename, min_k=0.02, max_k=0.3, step_size=1)
+        for min_k, max_k, step_size in [(0.03, 0.2, 1), (0.05, 0.25, 2), (0.02, 0.3, 1)]:
+            view = parent.view(min_k=min_k, max_k=max_k, step_size=step_size)
+            # The fresh dataset uses its own store, so its covariance is recomputed rather than loaded from the view's
+            monkeypatch.setattr(dataset, "get_artifact_store", lambda: fresh_store)
+            fresh = PowerSpectrum(filename, min_k=min_k, max_k=max_k, step_size=step_size)
+            monkeypatch.setattr(dataset, "get_artifact_store", lambda: view_store)
+            for key in ["ks", "pk", "cov", "icov", "w_mask", "w_pk"]:
+                assert np.allclose(view.get_data()[0][key], fresh.get_data()[0][key])
+        assert parent.max_k == 0.3 and parent.ks.max() <= 0.3
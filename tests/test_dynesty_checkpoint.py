@@ -0,0 +1,49 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("dynesty")
+
+SCRIPT = """
+import sys
+import numpy as np
+from barry.samplers import DynestySampler
+
+def log_likelihood(x):
+    return -0.5 * np.sum(((x - 0.5) / 0.01) ** 2)
+
+def prior_transform(u):
+    return u
+
+sampler = DynestySampler(temp_dir=sys.argv[1], nlive=500, checkpoint_interval=1)
+sampler.fit(log_likelihood, None, 5, prior_transform, uid="test")
+"""
+
+
+class TestDynestyCheckpoint:
+    def run(self, directory):
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return subprocess.Popen([sys.executable, "-c", SCRIPT, directory], env=env)
+
+    def test_signal_checkpoints_and_resumes(self, tmp_path):
+        directory = str(tmp_path)
+        checkpoint = os.path.join(directory, "test_dynesty.save")
+        chain = os.path.join(directory, "test_chain.npy")
+
+        process = self.run(directory)
+        while not os.path.exists(checkpoint):
+            assert process.poll() is None, "Fit finished before it checkpointed"
+            time.sleep(0.1)
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=60) != 0
+        assert os.path.exists(checkpoint) and not os.path.exists(chain)
+
+        # Rerunning picks up from the checkpoint and finishes the fit
+        assert self.run(directory).wait(timeout=600) == 0
+        assert os.path.exists(chain) and not os.path.exists(checkpoint)
+        assert np.all(np.isfinite(np.load(chain)))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from barry.samplers import EnsembleSampler
+from barry.samplers.chain_writer import get_num_rows
+
+pytest.importorskip("emcee")
+
+
+def log_posterior(x):
+    return -0.5 * np.sum(x ** 2)
+
+
+def start(num_walkers=1):
+    return np.random.normal(scale=0.1, size=(num_walkers, 2))
+
+
+class TestEnsembleSampler:
+    def test_adaptive_stops_early(self, tmp_path):
+        np.random.seed(1)
+        sampler = EnsembleSampler(num_walkers=16, num_steps=20000, temp_dir=str(tmp_path), adaptive=True, check_interval=100)
+        result = sampler.fit(log_posterior, start, 2, None, uid="adaptive")
+        diagnostics = result["diagnostics"]
+        assert diagnostics["converged"]
+        assert diagnostics["num_steps"] < 20000
+        assert diagnostics["num_steps"] > 50 * max(diagnostics["tau"])
+        assert diagnostics["num_burn"] == int(np.ceil(2 * max(diagnostics["tau"])))
+        assert result["chain"].shape == (16 * (diagnostics["num_steps"] - diagnostics["num_burn"]), 2)
+        assert np.allclose(result["chain"].std(axis=0), 1, atol=0.15)
+
+        # Loading the saved chain uses the burn in found while sampling
+        loaded = sampler.load_file(str(tmp_path / "adaptive_ens.chain.bin"))
+        assert loaded["chain"].shape == result["chain"].shape
+        assert loaded["diagnostics"] == diagnostics
+
+    def test_adaptive_resume(self, tmp_path):
+        np.random.seed(2)
+        first = EnsembleSampler(num_walkers=16, num_steps=300, temp_dir=str(tmp_path), adaptive=True, save_interval=0)
+        assert not first.fit(log_posterior, start, 2, None, uid="resume")["diagnostics"]["converged"]
+
+        # Raising the maximum carries on from the saved chain until it converges
+        second = EnsembleSampler(num_walkers=16, num_steps=20000, temp_dir=str(tmp_path), adaptive=True, save_interval=0)
+        diagnostics = second.fit(log_posterior, start, 2, None, uid="resume")["diagnostics"]
+        assert diagnostics["converged"] and 300 < diagnostics["num_steps"] < 20000
+
+    def test_resuming_converged_chain_takes_no_steps(self, tmp_path):
+        np.random.seed(4)
+        sampler = EnsembleSampler(num_walkers=16, num_steps=20000, temp_dir=str(tmp_path), adaptive=True, save_interval=0)
+        diagnostics = sampler.fit(log_posterior, start, 2, None, uid="converged")["diagnostics"]
+        assert diagnostics["converged"]
+
+        # Pretend the job was killed after writing the final step, but before its diagnostics
+        (tmp_path / "converged_ens.diagnostics.json").unlink()
+        again = EnsembleSampler(num_walkers=16, num_steps=20000, temp_dir=str(tmp_path), adaptive=True, save_interval=0)
+        assert again.fit(log_posterior, start, 2, None, uid="converged")["diagnostics"] == diagnostics
+        assert get_num_rows(str(tmp_path / "converged_ens.chain.bin")) == 16 * diagnostics["num_steps"]
+
+    def test_smaller_rerun_keeps_saved_steps(self, tmp_path):
+        np.random.seed(3)
+        first = EnsembleSampler(num_walkers=16, num_steps=400, num_burn=50, temp_dir=str(tmp_path), save_interval=0)
+        full = first.fit(log_posterior, start, 2, None, uid="shorter")
+        assert get_num_rows(str(tmp_path / "shorter_ens.chain.bin")) == 16 * 400
+
+        # Asking for fewer steps uses the start of the saved chain, without deleting the rest from disk
+        shorter = EnsembleSampler(num_walkers=16, num_steps=200, num_burn=50, temp_dir=str(tmp_path), save_interval=0)
+        assert shorter.fit(log_posterior, start, 2, None, uid="shorter")["chain"].shape == (16 * 150, 2)
+        assert get_num_rows(str(tmp_path / "shorter_ens.chain.bin")) == 16 * 400
+
+        again = EnsembleSampler(num_walkers=16, num_steps=400, num_burn=50, temp_dir=str(tmp_path), save_interval=0)
+        assert np.array_equal(again.fit(log_posterior, start, 2, None, uid="shorter")["chain"], full["chain"])
@@ -0,0 +1,177 @@
+import os
+from functools import partial
+
+import numpy as np
+
+from barry.fitter import Fitter
+from barry.models.test import TestModel as GaussianModel
+from barry.samplers import LaplaceSampler
+from barry.samplers.metropolisHastings import MetropolisHastings
+from barry.utils import get_model_comparison_dataframe
+
+cosmology = {"om": 0.31, "h0": 0.676, "z": 0.61, "ob": 0.04814, "ns": 0.97, "reconsmoothscale": 15}
+
+
+class MockRealisations:
+    """ Mimics the realisation interface of the power spectrum and correlation function datasets """
+
+    def __init__(self, num_mocks=4):
+        self.mocks = np.random.normal(loc=0.3, scale=1.0, size=(num_mocks, 200))
+        self.realisation = None
+        self.num_calls = 0
+
+    def set_realisation(self, realisation):
+        self.realisation = realisation
+
+    def get_data(self):
+        self.num_calls += 1
+        return [{"data": self.mocks[self.realisation], "name": f"Mock {self.realisation}", "cosmology": cosmology}]
+
+
+class TestFitter:
+    def test_lazy_model_and_dataset(self, tmp_path):
+        fitter = Fitter(str(tmp_path))
+        dataset = MockRealisations()
+        created = []
+
+        def get_model():
+            created.append(GaussianModel())
+            return created[-1]
+
+        for i in range(4):
+            fitter.add_model_and_dataset(get_model, (dataset, i), realisation=i)
+        assert dataset.num_calls == 0 and not created
+
+        model, data, extra = fitter.get_model_and_data(2)
+        assert extra["realisation"] == 2 and data[0]["name"] == "Mock 2"
+        assert np.all(data[0]["data"] == dataset.mocks[2])
+        assert dataset.num_calls == 1
+
+        # The model factory is shared, so only one model is ever created
+        assert fitter.get_model_and_data(3)[0] is model
+        assert len(created) == 1
+
+    def test_task_indexes_cover_all_jobs(self, tmp_path):
+        fitter = Fitter(str(tmp_path))
+        dataset = MockRealisations(num_mocks=7)
+        for i in range(7):
+            fitter.add_model_and_dataset(GaussianModel, (dataset, i))
+        fitter.set_num_walkers(2)
+        for strided in [False, True]:
+            fitter.set_num_fits_per_task(4, strided=strided)
+            assert fitter.get_num_tasks() == 4
+            indexes = [i for t in range(fitter.get_num_tasks()) for i in fitter.get_task_indexes(t)]
+            assert sorted(indexes) == list(range(fitter.get_num_jobs()))
+        assert fitter.get_task_indexes(1) == [1, 5, 9, 13]
+
+    def test_run_local(self, tmp_path):
+        fitter = Fitter(str(tmp_path))
+        dataset = MockRealisations(num_mocks=3)
+        for i in range(3):
+            fitter.add_model_and_dataset(GaussianModel, (dataset, i), realisation=i)
+        fitter.set_num_walkers(1)
+        fitter.set_sampler(MetropolisHastings(num_burn=300, num_steps=300, temp_dir=str(tmp_path)))
+        fitter.set_num_concurrent(2)
+        results = fitter.run_local(return_results=True)
+        assert sorted(results.keys()) == [(0, 0), (1, 0), (2, 0)]
+        assert all(fitter.is_complete(i) for i in range(3))
+
+        loaded = fitter.load()
+        assert [r[6]["realisation"] for r in loaded] == [0, 1, 2]
+        assert all(r[2].shape == (300, 2) for r in loaded)
+        assert np.allclose(loaded[1][2], results[(1, 0)]["chain"], rtol=1e-5)
+        assert loaded[1][0].dtype == np.float64 and loaded[1][2].dtype == np.float64
+
+        # The samplers own files are consolidated into the chain store
+        assert not [f for f in os.listdir(str(tmp_path)) if f.startswith("chain_")]
+        selected = list(fitter.load(model_indexes=[2], lazy=True))
+        assert len(selected) == 1 and selected[0][6]["realisation"] == 2
+
+        # The summaries match the chains
+        summary = fitter.summarise()
+        assert list(summary["realisation"]) == [0, 1, 2]
+        for (posterior, weight, chain, *_), (_, row) in zip(loaded, summary.iterrows()):
+            assert np.isclose(row["alpha_mean"], np.average(chain[:, 1], weights=weight))
+            assert np.isclose(row["max_posterior"], posterior.max())
+            assert row["alpha_q2.5"] < row["alpha_q50"] < row["alpha_q97.5"]
+            assert row["wall_time"] > 0
+
+        # Everything is complete, so a rerun does nothing
+        assert fitter.run_local(return_results=True) == {}
+
+    def test_warm_start(self, tmp_path):
+        np.random.seed(0)
+        fitter = Fitter(str(tmp_path))
+
+        class SameName(MockRealisations):
+            # Like the real datasets, the name does not change with the realisation
+            def get_data(self):
+                return [{**super().get_data()[0], "name": "Mock"}]
+
+        dataset = SameName(num_mocks=3)
+        for i in range(3):
+            fitter.add_model_and_dataset(GaussianModel, (dataset, i), realisation=i)
+        fitter.set_num_walkers(1)
+        fitter.set_sampler(MetropolisHastings(num_burn=1000, num_steps=300, temp_dir=str(tmp_path)))
+        fitter.set_warm_start(burn_fraction=0.2)
+        fitter.run_local(num_processes=1)
+
+        # Every realisation shares one cache entry
+        model, data, _ = fitter.get_model_and_data(0)
+        warm_start = fitter.warm_start_cache.get(model, data)
+        assert warm_start.num_fits == 3 and warm_start.get_num_burn(1000) == 200
+        assert len([f for f in os.listdir(fitter.warm_start_cache.directory) if f.endswith(".json")]) == 1
+        means = np.array([np.mean(chain, axis=0) for _, _, chain, *_ in fitter.load()])
+        assert np.allclose(warm_start.best_fit, means.mean(axis=0), atol=0.1)
+        assert np.all(np.linalg.eigvalsh(warm_start.covariance) > 0)
+
+        # Warm started fits only run the shortened burn in
+        model.set_data(data)
+        sampler = MetropolisHastings(num_burn=1000, num_steps=300, temp_dir=str(tmp_path / "mh"))
+        result = sampler.fit(model.get_posterior, partial(model.get_start, warm_start=warm_start), 2, None, uid="warm", warm_start=warm_start)
+        assert np.load(sampler.position_file)["num_burn"] == 200
+        assert np.allclose(np.average(result["chain"], weights=result["weights"], axis=0), means[0], atol=0.1)
+
+    def test_reweight(self, tmp_path):
+        np.random.seed(2)
+        fitter = Fitter(str(tmp_path))
+        dataset = MockRealisations(num_mocks=2)
+        fitter.add_model_and_dataset(GaussianModel, (dataset, 0))
+        fitter.set_num_walkers(2)
+        fitter.set_sampler(MetropolisHastings(num_burn=500, num_steps=2000, temp_dir=str(tmp_path)))
+        fitter.run_local(num_processes=1)
+
+        # Shifting the data a little moves the mean of om with it
+        model, data, _ = fitter.get_model_and_data(0)
+        shifted = [{**data[0], "data": data[0]["data"] + 0.02}]
+        result = fitter.reweight(0, dataset=shifted)
+        _, weight, chain, *_ = fitter.load()[0]
+        assert not result["diagnostics"]["rerun"]
+        assert result["chain"].shape == chain.shape
+        old_mean = np.average(chain[:, 0], weights=weight)
+        assert np.isclose(np.average(result["chain"][:, 0], weights=result["weights"]), old_mean + 0.02, atol=0.01)
+
+        # Fixing a parameter drops it from the chain
+        fixed = GaussianModel()
+        fixed.set_fix_params(["alpha"])
+        assert fitter.reweight(0, model=fixed)["chain"].shape[1] == 1
+
+        # A completely different dataset cannot be reweighted to
+        assert fitter.reweight(0, dataset=[{**data[0], "data": data[0]["data"] + 1}])["diagnostics"]["rerun"]
+
+    def test_model_comparison_with_diagnostics(self, tmp_path):
+        np.random.seed(3)
+        fitter = Fitter(str(tmp_path))
+        dataset = MockRealisations(num_mocks=2)
+        for i in range(2):
+            fitter.add_model_and_dataset(GaussianModel, (dataset, i), name="Mock", realisation=i)
+        fitter.set_num_walkers(1)
+        # The Laplace sampler records per parameter diagnostics, whose summary columns come before the parameters
+        fitter.set_sampler(LaplaceSampler(num_samples=2000))
+        fitter.run_local(num_processes=1)
+
+        model_results, summary = get_model_comparison_dataframe(fitter)
+        fits = fitter.summarise()
+        assert np.allclose(model_results["Mock"]["avg"], fits["om_mean"])
+        assert np.allclose(model_results["Mock"]["max"], fits["om_best"])
+        assert np.allclose(get_model_comparison_dataframe(fitter, param="alpha")[0]["Mock"]["avg"], fits["alpha_mean"])
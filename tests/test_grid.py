@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from barry.samplers import GridSampler
+from tests.utils import CorrelatedGaussian
+
+
+def get_model():
+    return CorrelatedGaussian([1.0, 0.2], [[0.04, 0.01], [0.01, 0.01]], mins=[0.0, -1.0], maxes=[2.0, 1.0])
+
+
+class TestGridSampler:
+    def test_integrates_gaussian(self):
+        model = get_model()
+        result = GridSampler(num_points=10).fit(model.get_posterior, None, 2, model.unscale)
+        assert result["diagnostics"]["converged"]
+        # One batch for the initial grid and each level
+        assert model.num_batches == 1 + result["diagnostics"]["num_levels"]
+
+        chain, weights = result["chain"], result["weights"]
+        mean = np.average(chain, weights=weights, axis=0)
+        assert np.allclose(mean, model.mean, atol=1e-3)
+        assert np.allclose(np.cov(chain.T, aweights=weights), model.cov, rtol=0.05)
+        # The density is normalised, so the evidence is the inverse of the prior volume
+        assert np.allclose(result["evidence"], -np.log(4), atol=0.01)
+
+    def test_is_deterministic(self):
+        model = get_model()
+        first = GridSampler(num_points=10, max_levels=2).fit(model.get_posterior, None, 2, model.unscale)
+        second = GridSampler(num_points=10, max_levels=2).fit(model.get_posterior, None, 2, model.unscale)
+        assert np.all(first["chain"] == second["chain"]) and np.all(first["weights"] == second["weights"])
+
+    def test_too_many_dimensions(self):
+        with pytest.raises(ValueError):
+            GridSampler().fit(lambda x: 0, None, 5, lambda x: x)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from barry.samplers import LaplaceSampler
+from barry.samplers.laplace import get_hessian
+from tests.utils import CorrelatedGaussian
+
+
+def get_model():
+    cov = [[1.0, 0.3, 0.0], [0.3, 0.5, -0.1], [0.0, -0.1, 0.2]]
+    return CorrelatedGaussian([1.0, -2.0, 0.5], cov, mins=np.full(3, -10.0), maxes=np.full(3, 10.0), normalised=False)
+
+
+class TestLaplaceSampler:
+    def test_hessian_of_quadratic(self):
+        model = get_model()
+        hessian, values = get_hessian(model.get_posterior_batch, model.mean, 0.0, np.full(3, 0.1))
+        assert values.size == 2 * 3 + 4 * 3
+        assert np.allclose(hessian, -model.icov)
+
+    def test_recovers_gaussian(self):
+        np.random.seed(0)
+        model = get_model()
+        result = LaplaceSampler(num_samples=20000).fit(model.get_posterior, model.get_start, 3, model.unscale)
+        diagnostics = result["diagnostics"]
+        assert diagnostics["positive_definite"]
+        assert np.allclose(diagnostics["laplace_mean"], model.mean, atol=1e-4)
+        assert np.allclose(diagnostics["laplace_std"], np.sqrt(np.diag(model.cov)), rtol=1e-3)
+        assert np.allclose(np.cov(result["chain"].T), model.cov, atol=0.03)
+        # The batched posterior is used for both passes of the Hessian
+        assert model.num_batches == 2
+
+        # The Gaussian is well inside the prior, so the evidence is just its normalisation over the prior volume
+        expected = 0.5 * np.log(np.linalg.det(2 * np.pi * model.cov)) - 3 * np.log(20)
+        assert np.allclose(result["evidence"], expected, atol=1e-3)
+        assert np.allclose(result["posterior"].max(), 0, atol=0.1)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from barry.samplers import MultiChainMetropolisHastings
+from barry.samplers.multi_chain_mh import compress_chain, get_rhat
+from tests.utils import CorrelatedGaussian
+
+
+class Interrupt(Exception):
+    pass
+
+
+class BatchedGaussian(CorrelatedGaussian):
+    """ A standard normal, which can be made to raise part way through a fit """
+
+    def __init__(self):
+        super().__init__(np.zeros(2), np.identity(2), normalised=False, start_scale=3)
+        self.interrupt_after = None
+
+    def get_posterior_batch(self, xs):
+        if self.interrupt_after is not None and self.num_batches >= self.interrupt_after:
+            raise Interrupt()
+        return super().get_posterior_batch(xs)
+
+
+class TestMultiChainMetropolisHastings:
+    def test_rhat_matches_definition(self):
+        chains = np.random.normal(size=(4, 100, 2)) + np.array([0, 0.5, 1, 1.5])[:, None, None]
+        rhat = get_rhat(100, chains.mean(axis=1), chains.var(axis=1, ddof=1))
+        within = chains.var(axis=1, ddof=1).mean(axis=0)
+        between = 100 * chains.mean(axis=1).var(axis=0, ddof=1)
+        assert np.allclose(rhat, np.sqrt((99 / 100 * within + between / 100) / within))
+        assert np.all(rhat > 1.1)
+
+    def test_compress_chain(self):
+        chain = np.array([[[0.0], [0.0], [1.0], [1.0], [1.0], [2.0]]])
+        c, w, p = compress_chain(chain, chain[:, :, 0])
+        assert np.all(c[:, 0] == [0, 1, 2]) and np.all(w == [2, 3, 1]) and np.all(p == [0, 1, 2])
+
+    def test_converges_early_with_batched_posterior(self):
+        np.random.seed(0)
+        model = BatchedGaussian()
+        sampler = MultiChainMetropolisHastings(num_chains=6, num_burn=1000, num_steps=50000, check_interval=200)
+        result = sampler.fit(model.get_posterior, model.get_start, 2, None)
+        diagnostics = result["diagnostics"]
+        assert diagnostics["converged"] and diagnostics["num_steps"] < 50000
+        assert max(diagnostics["rhat"]) < 1.01
+        # One batched call per step, plus the initial evaluation
+        assert model.num_batches == 1 + 1000 + diagnostics["num_steps"]
+        assert result["weights"].sum() == 6 * diagnostics["num_steps"]
+        mean = np.average(result["chain"], weights=result["weights"], axis=0)
+        std = np.sqrt(np.average((result["chain"] - mean) ** 2, weights=result["weights"], axis=0))
+        assert np.allclose(mean, 0, atol=0.1) and np.allclose(std, 1, atol=0.1)
+
+    def test_resume(self, tmp_path):
+        np.random.seed(1)
+        model = BatchedGaussian()
+        model.interrupt_after = 1500
+        sampler = MultiChainMetropolisHastings(num_chains=4, num_burn=1000, num_steps=2000, rhat_target=0, temp_dir=str(tmp_path), save_interval=0)
+        with pytest.raises(Interrupt):
+            sampler.fit(model.get_posterior, model.get_start, 2, None, uid="resume")
+
+        model.interrupt_after, model.num_batches = None, 0
+        result = sampler.fit(model.get_posterior, model.get_start, 2, None, uid="resume")
+        # Only the remaining steps are run
+        assert model.num_batches == 1 + 2000 - 499
+        assert result["weights"].sum() == 4 * 2000
+        loaded = sampler.load_file(str(tmp_path / "resume_mhk_chain.bin"))
+        assert loaded["weights"].sum() == 4 * 2000
+        assert loaded["diagnostics"]["num_steps"] == 2000
@@ -0,0 +1,51 @@
+import pickle
+
+import numpy as np
+
+from barry.models.test import TestModel as GaussianModel
+from barry.samplers import MetropolisHastings, ProcessPool, SerialPool, ThreadPool
+
+cosmology = {"om": 0.31, "h0": 0.676, "z": 0.61, "ob": 0.04814, "ns": 0.97, "reconsmoothscale": 15}
+
+
+def get_model():
+    model = GaussianModel()
+    np.random.seed(0)
+    model.set_data([{"data": np.random.normal(loc=0.3, scale=1.0, size=200), "name": "Gaussian", "cosmology": cosmology}])
+    return model
+
+
+class TestPool:
+    def test_model_pickles_without_camb(self):
+        model = get_model()
+        assert model.camb is not None
+        copy = pickle.loads(pickle.dumps(model))
+        assert copy.camb is None and copy.cosmology is None
+        copy.set_data(copy.data)
+        assert copy.get_posterior([0.3, 1.0]) == model.get_posterior([0.3, 1.0])
+
+    def test_pools_agree_with_serial(self):
+        model = get_model()
+        points = [[0.2 + 0.01 * i, 1.0] for i in range(10)]
+        expected = SerialPool().map(model.get_posterior, points)
+        for pool in [ThreadPool(2), ProcessPool(2)]:
+            with pool:
+                posterior = pool.wrap(model.get_posterior)
+                assert pool.map(posterior, points) == expected
+
+    def test_process_pool_rebuilds_on_new_data(self):
+        model = get_model()
+        with ProcessPool(2) as pool:
+            first = pool.map(pool.wrap(model.get_posterior), [[0.3, 1.0]])
+            model.set_data([{"data": np.zeros(10), "name": "Zeros", "cosmology": cosmology}])
+            second = pool.map(pool.wrap(model.get_posterior), [[0.3, 1.0]])
+        assert first[0] != second[0]
+        assert second[0] == model.get_posterior([0.3, 1.0])
+
+    def test_metropolis_hastings_with_pool(self):
+        model = get_model()
+        with ProcessPool(2) as pool:
+            sampler = MetropolisHastings(num_burn=200, num_steps=300, pool=pool)
+            result = sampler.fit(model.get_posterior, model.get_start, model.get_num_dim(), model.unscale)
+        assert result["chain"].shape == (300, 2)
+        assert np.all(np.isfinite(result["posterior"]))
@@ -0,0 +1,55 @@
+import numpy as np
+from scipy import integrate
+
+from barry.cosmology.camb_generator import CambGenerator
+from barry.models.model import Model
+from tests.utils import get_concrete
+
+
+def get_fake_camb(om_resolution=5, store=None):
+    """ Creates a CambGenerator with smooth, analytic data so that no CAMB run is required.
+
+    If a store is given, the data is saved and registered in it like a real CAMB run would be.
+    """
+    camb = CambGenerator(om_resolution=om_resolution)
+    ks = camb.ks
+    data = np.zeros((camb.om_resolution, camb.h0_resolution, 1 + 3 * camb.k_num))
+    for i, omch2 in enumerate(camb.omch2s):
+        r_s = 150.0 - 100.0 * omch2
+        pk = 2e4 * ks / (1.0 + (ks / (0.1 * omch2 + 0.01)) ** 2) ** 1.5 * (1.0 + 0.05 * np.sin(ks * r_s) * np.exp(-((ks / 0.3) ** 2)))
+        data[i, 0, 0] = r_s
+        data[i, 0, 1:] = np.tile(pk, 3)
+    camb.data = data
+    if store is not None:
+        camb.store = store
+        camb.filename = store.get_path(camb.key, "camb", ".npy")
+        np.save(camb.filename, data)
+        store.register(camb.key, camb.filename, camb.config)
+    return camb
+
+
+class TestPrecomputeBatch:
+    classes = [c for c in get_concrete(Model) if "precompute_batch" in c.__dict__]
+
+    def test_batch_matches_single_precompute(self):
+        assert len(self.classes) > 0
+        camb = get_fake_camb()
+        for c in self.classes:
+            for recon in [True, False]:
+                model = c(recon=recon)
+                model.camb = camb
+                batch = model.generate_precomputed_data_batch()
+                # Every om index is checked, including the last, where an off by one in the grid would show up
+                for i in range(camb.om_resolution):
+                    omch2, h0 = camb.omch2s[i], camb.h0s[0]
+                    single = model.precompute(camb, omch2 / (h0 * h0) + camb.omega_b, h0)
+                    for key, value in single.items():
+                        assert np.allclose(batch[key][i, 0], value, rtol=1e-8, atol=0), f"{c.__name__} batch mismatch for {key}"
+
+    def test_simpson_weights_follow_camb(self):
+        model = self.classes[0]()
+        model.camb = get_fake_camb()
+        ks = model.camb.ks
+        assert np.isclose(model.get_simpson_weights() @ ks, integrate.simps(ks, ks))
+        model.camb.ks = ks[::2]
+        assert model.get_simpson_weights().shape == (ks[::2].size,)
@@ -0,0 +1,81 @@
+import os
+import pickle
+
+import numpy as np
+
+from barry.artifacts import ArtifactStore
+from barry.generate import generate_pregen
+from barry.models import PowerDing2018
+from barry.pregenerate import PregenRunner, combine_precomputed_data
+from tests.test_precompute_batch import get_fake_camb
+
+
+class TestPregenRunner:
+    def get_model(self, tmp_path):
+        model = PowerDing2018(recon=True)
+        model.store = ArtifactStore(tmp_path)
+        model.camb = get_fake_camb(om_resolution=4, store=model.store)
+        model.pregen_path = os.path.join(model.store.root, model.get_unique_cosmo_name())
+        return model
+
+    def test_pool_matches_batch_and_resumes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(PowerDing2018, "_has_batch_precompute", lambda self: False)
+        model = self.get_model(tmp_path)
+        runner = PregenRunner(model, num_processes=2)
+
+        # Pretend a previous run died after computing the first grid point
+        os.makedirs(runner.part_dir)
+        partial = model.generate_precomputed_data([(0, 0)])[0][2]
+        with open(os.path.join(runner.part_dir, "0_0.pkl"), "wb") as f:
+            pickle.dump(partial, f)
+        assert len(runner.get_missing_indexes()) == 3
+
+        assert model.get_pregen_status() == model.store.MISSING
+        combined = runner.run()
+        assert model.get_pregen_status() == model.store.VALID
+        assert not os.path.exists(runner.part_dir)
+
+        batch = model.generate_precomputed_data_batch()
+        for key, value in batch.items():
+            assert combined[key].shape == value.shape
+            assert np.allclose(combined[key][:-1], value[:-1], rtol=1e-8, atol=0)
+
+    def test_spawned_workers_restore_the_model(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(PowerDing2018, "_has_batch_precompute", lambda self: False)
+        model = self.get_model(tmp_path)
+
+        # Spawned workers get a pickled model, which has had its CAMB generator stripped
+        combined = PregenRunner(model, num_processes=2, mp_context="spawn").run()
+        assert model.get_pregen_status() == model.store.VALID
+        expected = combine_precomputed_data(model, model.generate_precomputed_data(PregenRunner(model).get_all_indexes()))
+        for key, value in expected.items():
+            assert np.allclose(combined[key], value, rtol=1e-10, atol=0, equal_nan=True)
+
+    def test_generate_pregen_resumes_parts(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(PowerDing2018, "_has_batch_precompute", lambda self: False)
+        model = self.get_model(tmp_path)
+        monkeypatch.setattr(model, "set_cosmology", lambda c, load_pregen=True: None)
+        runner = PregenRunner(model)
+
+        # A killed run left the first grid point behind. Mark it, so we can tell whether it was reused.
+        os.makedirs(runner.part_dir)
+        partial = model.generate_precomputed_data([(0, 0)])[0][2]
+        partial["sigma"] = -1.0
+        with open(os.path.join(runner.part_dir, "0_0.pkl"), "wb") as f:
+            pickle.dump(partial, f)
+
+        assert generate_pregen(lambda: model, model.cosmology, num_processes=2) == model.get_pregen_key()
+        with open(model.pregen_path, "rb") as f:
+            assert pickle.load(f)["sigma"][0, 0] == -1.0
+
+    def test_adopts_legacy_pregen(self, tmp_path):
+        model = self.get_model(tmp_path)
+        legacy = model.get_legacy_pregen_path()
+        assert os.path.basename(legacy) == f"PowerDing2018_{model.camb.legacy_name}.pkl"
+        with open(legacy, "wb") as f:
+            pickle.dump({"sigma": np.full((4, 1), -1.0)}, f)
+
+        # The old style file is registered under its new name, rather than being regenerated
+        assert model.get_pregen_status() == model.store.VALID
+        model._load_precomputed_data()
+        assert np.all(model.pregen["sigma"] == -1.0)
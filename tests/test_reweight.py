@@ -0,0 +1,22 @@
+import numpy as np
+
+from barry.reweight import get_importance_weights, reweight_chain
+
+
+class TestReweight:
+    def test_importance_weights(self):
+        np.random.seed(0)
+        x = np.random.normal(size=100000)
+        weights, log_evidence_ratio = get_importance_weights(-0.5 * (x - 0.2) ** 2, -0.5 * x ** 2, np.ones(x.size))
+        assert np.isclose(weights.sum(), x.size)
+        assert np.isclose(np.average(x, weights=weights), 0.2, atol=0.01)
+        # Both posteriors have the same normalisation
+        assert np.isclose(log_evidence_ratio, 0, atol=0.01)
+
+    def test_collapse_recommends_rerun(self):
+        np.random.seed(1)
+        x = np.random.normal(size=(5000, 1))
+        close = reweight_chain(lambda p: -0.5 * (p[0] - 0.1) ** 2, x, np.ones(5000), -0.5 * x[:, 0] ** 2)
+        assert not close["diagnostics"]["rerun"] and close["diagnostics"]["ess_fraction"] > 0.9
+        far = reweight_chain(lambda p: -0.5 * ((p[0] - 3) / 0.1) ** 2, x, np.ones(5000), -0.5 * x[:, 0] ** 2)
+        assert far["diagnostics"]["rerun"] and far["diagnostics"]["new_ess"] < 10
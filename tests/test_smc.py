@@ -0,0 +1,32 @@
+import numpy as np
+
+from barry.samplers import SMCSampler
+from barry.samplers.smc import get_ess, systematic_resample
+from tests.utils import CorrelatedGaussian
+
+
+class TestSMCSampler:
+    def test_resampling(self):
+        np.random.seed(0)
+        log_weights = np.array([np.log(0.1), np.log(0.2), np.log(0.7), -np.inf])
+        assert np.isclose(get_ess(log_weights), 1 / (0.01 + 0.04 + 0.49))
+        counts = np.bincount(systematic_resample(log_weights), minlength=4)
+        assert counts.sum() == 4 and counts[3] == 0 and counts[2] >= 2
+
+    def test_recovers_gaussian_and_evidence(self):
+        np.random.seed(1)
+        model = CorrelatedGaussian([0.5, -1.0], [[0.01, 0.004], [0.004, 0.04]], mins=[-2.0, -4.0], maxes=[2.0, 4.0])
+        result = SMCSampler(num_particles=2000).fit(model.get_posterior, None, 2, model.unscale)
+        diagnostics = result["diagnostics"]
+        # Only the proposals inside the prior are evaluated, and the initial population and every move are one batch each
+        assert model.num_points == diagnostics["num_evaluations"]
+        assert model.num_batches * 2000 > diagnostics["num_evaluations"]
+        assert diagnostics["num_temperatures"] > 1
+
+        chain = result["chain"]
+        assert np.allclose(chain.mean(axis=0), model.mean, atol=0.02)
+        assert np.allclose(np.cov(chain.T), model.cov, atol=0.005)
+        # The likelihood is normalised, so the evidence is the inverse of the prior volume
+        expected = -np.log(np.prod(model.maxes - model.mins))
+        assert np.allclose(result["evidence"], result["evidence"][0])
+        assert abs(result["evidence"][0] - expected) < max(0.1, 3 * diagnostics["logz_error"])
@@ -1,4 +1,11 @@
+import os
 import abc
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from barry.datasets import dataset
 
 
 def get_concrete(baseclass):
@@ -7,3 +14,58 @@ def get_concrete(baseclass):
         classes += c.__subclasses__()
     final_classes = [c for c in classes if abc.ABC not in c.__bases__]
     return final_classes
+
+
+def write_fake_data(tmp_path):
+    ks = np.linspace(0.005, 0.4, 80)
+    dfs = [pd.DataFrame({"k": ks, "pk": 1e4 * (1 + 0.1 * np.random.normal(size=ks.size)), "nk": np.arange(ks.size) + 1.0}) for _ in range(200)]
+    winfit = {}
+    for step_size in [1, 2]:
+        ks_output = ks.reshape((-1, step_size)).mean(axis=1)
+        winfit[step_size] = {"w_ks_input": ks, "w_k0_scale": np.zeros(ks.size), "w_transform": np.ones((ks.size, ks_output.size)), "w_ks_output": ks_output}
+    winpk = np.vstack((np.arange(ks.size), ks, np.zeros(ks.size), np.ones(ks.size))).T
+    data = {"name": "Fake", "cosmology": {"om": 0.31}, "pre-recon": dfs, "post-recon": dfs, "winfit": winfit, "winpk": winpk}
+    filename = str(tmp_path / "fake_pk.pkl")
+    with open(filename, "wb") as f:
+        pickle.dump(data, f)
+    data_dir = os.path.join(os.path.dirname(dataset.__file__), "..", "data")
+    return os.path.relpath(filename, data_dir)
+
+
+class CorrelatedGaussian:
+    """ A Gaussian posterior within a flat prior box, with a vectorised `get_posterior_batch` like a model.
+
+    Counts how many batches and points it is asked to evaluate, so tests can check how a sampler uses it.
+    """
+
+    def __init__(self, mean, cov, mins=None, maxes=None, normalised=True, start_scale=0.0):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.cov = np.asarray(cov, dtype=np.float64)
+        self.icov = np.linalg.inv(self.cov)
+        self.mins = np.full(self.mean.size, -np.inf) if mins is None else np.asarray(mins, dtype=np.float64)
+        self.maxes = np.full(self.mean.size, np.inf) if maxes is None else np.asarray(maxes, dtype=np.float64)
+        self.log_norm = -0.5 * np.log(np.linalg.det(2 * np.pi * self.cov)) if normalised else 0.0
+        self.start_scale = start_scale
+        self.num_batches = 0
+        self.num_points = 0
+
+    def _get_log_posterior(self, xs):
+        xs = np.atleast_2d(xs)
+        diff = xs - self.mean
+        log_posterior = self.log_norm - 0.5 * np.einsum("ij,jk,ik->i", diff, self.icov, diff)
+        log_posterior[np.any((xs < self.mins) | (xs > self.maxes), axis=1)] = -np.inf
+        return log_posterior
+
+    def get_posterior(self, x):
+        return self._get_log_posterior(x)[0]
+
+    def get_posterior_batch(self, xs):
+        self.num_batches += 1
+        self.num_points += len(xs)
+        return self._get_log_posterior(xs)
+
+    def unscale(self, scaled):
+        return self.mins + np.asarray(scaled) * (self.maxes - self.mins)
+
+    def get_start(self, num_walkers=1):
+        return np.random.normal(scale=self.start_scale, size=(num_walkers, self.mean.size))